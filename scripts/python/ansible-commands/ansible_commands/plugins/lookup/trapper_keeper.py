@@ -0,0 +1,76 @@
+"""Ansible lookup plugin reading passwords from the trapper-keeper Keepass database."""
+
+from __future__ import annotations
+
+from ansible.errors import AnsibleLookupError
+from ansible.plugins.lookup import LookupBase
+
+from ansible_commands.tk_secrets import secrets_for
+
+DOCUMENTATION = r"""
+name: trapper_keeper
+short_description: Read passwords from the trapper-keeper Keepass database
+description:
+  - Returns the password of every referenced entry, in the order of the terms.
+  - A reference is an entry title in the bootstrap group, or C(group/path/title) for any other group.
+  - The database is opened once per process and every term not cached yet is fetched in one batch.
+    References the C(trapper_keeper) vars plugin prefetched are served without opening it at all.
+options:
+  _terms:
+    description: The entry references.
+    required: true
+  db:
+    description: The Keepass database. Defaults to the trapper-keeper bootstrap database.
+    type: path
+    env:
+      - name: TK_LOOKUP_DB
+  token:
+    description: The token file unlocking the database. Defaults to the trapper-keeper bootstrap token.
+    type: path
+    env:
+      - name: TK_LOOKUP_TOKEN
+  key:
+    description: The key file of the database.
+    type: path
+    env:
+      - name: TK_LOOKUP_KEY
+"""
+
+EXAMPLES = r"""
+- name: Read the Proxmox API token
+  ansible.builtin.debug:
+    msg: "{{ lookup('trapper_keeper', 'proxmox/api_token') }}"
+
+- name: Read many passwords with one batch
+  ansible.builtin.set_fact:
+    db_passwords: "{{ query('trapper_keeper', 'db/web1', 'db/web2', 'db/web3') }}"
+"""
+
+RETURN = r"""
+_raw:
+  description: The passwords of the referenced entries.
+  type: list
+  elements: str
+"""
+
+
+class LookupModule(LookupBase):
+    """Look up trapper-keeper passwords by entry reference."""
+
+    def run(self, terms, variables=None, **kwargs):
+        """Return the password of every term.
+
+        Raises:
+            AnsibleLookupError: If the database cannot be read or an entry does not exist.
+        """
+        self.set_options(var_options=variables, direct=kwargs)
+        refs = [str(term) for term in terms]
+        try:
+            secrets = secrets_for(self.get_option("db"), self.get_option("token"), self.get_option("key"))
+            found = secrets.get_many(refs)
+        except (OSError, ValueError, KeyError) as e:
+            raise AnsibleLookupError(f"trapper_keeper lookup failed: {e}") from e
+        missing = [ref for ref in refs if ref not in found]
+        if missing:
+            raise AnsibleLookupError(f"No trapper-keeper entries {', '.join(missing)} in {secrets.fp_kp_db}")
+        return [found[ref] for ref in refs]
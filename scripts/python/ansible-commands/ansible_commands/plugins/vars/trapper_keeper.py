@@ -0,0 +1,131 @@
+"""Ansible vars plugin setting host and group variables from the trapper-keeper Keepass database."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from ansible.errors import AnsibleParserError
+from ansible.inventory.group import Group
+from ansible.inventory.host import Host
+from ansible.plugins.vars import BaseVarsPlugin
+from ansible.utils.unsafe_proxy import wrap_var
+
+from ansible_commands.tk_secrets import secrets_for
+
+DOCUMENTATION = r"""
+name: trapper_keeper
+short_description: Set host and group variables from the trapper-keeper Keepass database
+requirements:
+  - Enabled in C(vars_plugins_enabled).
+description:
+  - Reads C(trapper_keeper.yaml) next to every inventory source. It maps host and group names to
+    variable names and entry references, an entry title in the bootstrap group or C(group/path/title).
+  - Every reference in the file is fetched in one batch the first time any host or group asks,
+    in the controller process, so forked workers and the C(trapper_keeper) lookup reuse the values.
+  - Values are marked unsafe, so secrets are never templated.
+options:
+  db:
+    description: The Keepass database. Defaults to the trapper-keeper bootstrap database.
+    type: path
+    env:
+      - name: TK_LOOKUP_DB
+  token:
+    description: The token file unlocking the database. Defaults to the trapper-keeper bootstrap token.
+    type: path
+    env:
+      - name: TK_LOOKUP_TOKEN
+  key:
+    description: The key file of the database.
+    type: path
+    env:
+      - name: TK_LOOKUP_KEY
+extends_documentation_fragment:
+  - vars_plugin_staging
+"""
+
+EXAMPLES = r"""
+# inventory/trapper_keeper.yaml
+groups:
+  all:
+    proxmox_api_token: proxmox/api_token
+hosts:
+  web1:
+    db_password: db/web1
+"""
+
+MAPPING_FILE: str = "trapper_keeper.yaml"
+_SECTIONS: tuple[str, ...] = ("hosts", "groups")
+
+# parsed mapping files by path, with the modification time they were read at
+_MAPPINGS: dict[Path, tuple[int, dict[str, dict[str, dict[str, str]]]]] = {}
+
+
+def _mapping_file(path: str) -> Path:
+    """Return the mapping file of an inventory source, a file or a directory."""
+    source = Path(path)
+    return (source if source.is_dir() else source.parent) / MAPPING_FILE
+
+
+class VarsModule(BaseVarsPlugin):
+    """Set host and group variables from trapper-keeper entries."""
+
+    REQUIRES_ENABLED = True
+
+    def _load(self, loader, fp: Path) -> dict[str, dict[str, dict[str, str]]]:
+        """Parse a mapping file once per change and prefetch every reference it holds.
+
+        Raises:
+            AnsibleParserError: If the file is not a mapping of sections, names and variables.
+        """
+        mtime = fp.stat().st_mtime_ns
+        cached = _MAPPINGS.get(fp)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        data = loader.load_from_file(str(fp)) or {}
+        mapping: dict[str, dict[str, dict[str, str]]] = {}
+        for section in _SECTIONS:
+            names = data.get(section) or {}
+            if not isinstance(names, dict) or not all(isinstance(v, dict) for v in names.values()):
+                raise AnsibleParserError(f"{fp}: {section} must map names to variables and entry references")
+            mapping[section] = {str(name): {str(k): str(v) for k, v in variables.items()} for name, variables in names.items()}
+        refs = {ref for names in mapping.values() for variables in names.values() for ref in variables.values()}
+        self._secrets().prefetch(refs)
+        _MAPPINGS[fp] = (mtime, mapping)
+        return mapping
+
+    def _secrets(self):
+        return secrets_for(self.get_option("db"), self.get_option("token"), self.get_option("key"))
+
+    def get_vars(self, loader, path, entities, cache=True):
+        """Return the variables the mapping file next to ``path`` sets for ``entities``.
+
+        Raises:
+            AnsibleParserError: If the mapping is invalid, the database cannot be read or an entry does not exist.
+        """
+        if not isinstance(entities, list):
+            entities = [entities]
+        super().get_vars(loader, path, entities)
+
+        fp = _mapping_file(os.path.realpath(path))
+        if not fp.is_file():
+            return {}
+        try:
+            mapping = self._load(loader, fp)
+            found: dict = {}
+            for entity in entities:
+                if isinstance(entity, Host):
+                    variables = mapping["hosts"].get(entity.name, {})
+                elif isinstance(entity, Group):
+                    variables = mapping["groups"].get(entity.name, {})
+                else:
+                    raise AnsibleParserError(f"Supplied entity must be Host or Group, got {type(entity)} instead")
+                if variables:
+                    values = self._secrets().get_many(variables.values())
+                    missing = sorted({ref for ref in variables.values() if ref not in values})
+                    if missing:
+                        raise AnsibleParserError(f"{fp}: no trapper-keeper entries {', '.join(missing)}")
+                    found.update({name: wrap_var(values[ref]) for name, ref in variables.items()})
+        except (OSError, ValueError, KeyError) as e:
+            raise AnsibleParserError(f"trapper_keeper vars from {fp} failed: {e}") from e
+        return found
@@ -0,0 +1,141 @@
+"""Trapper-keeper secrets for Ansible plugins, decrypted once per process.
+
+Opening the Keepass database runs its KDF, so the ``trapper_keeper`` vars and lookup plugins share
+one `TrapperKeeperSecrets` per database through `secrets_for`.  It opens the store only when asked
+for a reference it has not seen, and then fetches every missing reference in one batch.  The vars
+plugin prefetches everything an inventory references in the controller process before Ansible forks
+its workers, so the workers inherit the decrypted values instead of unlocking the database again.
+
+A reference is an entry title in the bootstrap group, or ``group/path/title`` for any other group.
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+
+from trapper_keeper.tk import DbTypes, get_store
+
+# separator between the group path and the entry title of a reference
+REF_SEP: str = "/"
+
+
+def split_ref(ref: str) -> tuple[str | None, str]:
+    """Split a reference into its group path, None for the bootstrap group, and entry title."""
+    group, _, title = ref.strip(REF_SEP).rpartition(REF_SEP)
+    return group or None, title
+
+
+class TrapperKeeperSecrets:
+    """The decrypted secrets of one Keepass database, cached for the life of the process."""
+
+    def __init__(self, fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None):
+        """Initialize the cache without opening the database.
+
+        Args:
+            fp_kp_db (Path): The Keepass database.
+            fp_token (Path): The token unlocking it.
+            fp_key (Path | None, optional): The key file. Defaults to None.
+        """
+        self.fp_kp_db = fp_kp_db
+        self.fp_token = fp_token
+        self.fp_key = fp_key
+        self.values: dict[str, str] = {}
+        # references looked up and not found, so they are not fetched again
+        self.missing: set[str] = set()
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    def prefetch(self, refs: Iterable[str]) -> int:
+        """Fetch every reference not cached yet with one store open and one query per group.
+
+        Args:
+            refs (Iterable[str]): The references.
+
+        Returns:
+            int: The number of references fetched.
+
+        Raises:
+            FileNotFoundError: If the database does not exist.
+        """
+        with self._lock:
+            wanted = {ref for ref in refs if ref not in self.values and ref not in self.missing}
+            if not wanted:
+                return 0
+            if not self.fp_kp_db.exists():
+                raise FileNotFoundError(f"Keepass database {self.fp_kp_db} does not exist")
+            by_group: dict[str | None, dict[str, str]] = defaultdict(dict)
+            for ref in wanted:
+                group, title = split_ref(ref)
+                by_group[group][title] = ref
+            with get_store(
+                DbTypes.KP, fp_kp_db=self.fp_kp_db, fp_token=self.fp_token, fp_key=self.fp_key, agent=True
+            ) as store:
+                self.opens += 1
+                for group, titles in by_group.items():
+                    try:
+                        found = store.get_many(titles, group=group)
+                    except KeyError:
+                        found = {}
+                    for title, ref in titles.items():
+                        if title in found:
+                            self.values[ref] = found[title]
+                        else:
+                            self.missing.add(ref)
+            return len(wanted)
+
+    def get_many(self, refs: Iterable[str]) -> dict[str, str]:
+        """Return the found references mapped to their passwords, fetching the uncached ones in one batch."""
+        refs = list(refs)
+        self.prefetch(refs)
+        return {ref: self.values[ref] for ref in refs if ref in self.values}
+
+    def get(self, ref: str) -> str:
+        """Return the password of one reference.
+
+        Raises:
+            KeyError: If the entry does not exist.
+        """
+        found = self.get_many([ref])
+        if ref not in found:
+            raise KeyError(f"No trapper-keeper entry {ref!r} in {self.fp_kp_db}")
+        return found[ref]
+
+
+def default_credentials() -> tuple[Path, Path, Path | None]:
+    """Return the bootstrap database and token configured for trapper-keeper."""
+    from trapper_keeper.stores.keepass_store import tk_settings  # noqa: PLC0415 - backends load on first use
+
+    settings = tk_settings()
+    return Path(settings.get("bootstrap_db")), Path(settings.get("bootstrap_token")), None
+
+
+@functools.cache
+def _secrets(fp_kp_db: Path, fp_token: Path, fp_key: Path | None) -> TrapperKeeperSecrets:
+    return TrapperKeeperSecrets(fp_kp_db, fp_token, fp_key)
+
+
+def secrets_for(
+    fp_kp_db: str | Path | None = None, fp_token: str | Path | None = None, fp_key: str | Path | None = None
+) -> TrapperKeeperSecrets:
+    """Return the process wide secrets of a database, the configured bootstrap database by default.
+
+    Args:
+        fp_kp_db (str | Path | None, optional): The Keepass database. Defaults to the bootstrap database.
+        fp_token (str | Path | None, optional): Its token. Defaults to the bootstrap token.
+        fp_key (str | Path | None, optional): Its key file. Defaults to None.
+
+    Returns:
+        TrapperKeeperSecrets: The same instance for every call with the same files.
+    """
+    if fp_kp_db is None or fp_token is None:
+        default_db, default_token, _ = default_credentials()
+        fp_kp_db, fp_token = fp_kp_db or default_db, fp_token or default_token
+    return _secrets(
+        Path(fp_kp_db).expanduser().resolve(),
+        Path(fp_token).expanduser().resolve(),
+        Path(fp_key).expanduser().resolve() if fp_key else None,
+    )
@@ -0,0 +1,66 @@
+"""Unit tests for the trapper-keeper secrets shared by the Ansible plugins."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from trapper_keeper.stores.keepass_store import KeepassStore, create_kp_db
+
+from ansible_commands.tk_secrets import TrapperKeeperSecrets, secrets_for, split_ref
+
+
+class TestTrapperKeeperSecrets(unittest.TestCase):
+    """Unit tests for the trapper-keeper secrets cache."""
+
+    def setUp(self):
+        """Create a Keepass database with entries in the bootstrap group and a subgroup."""
+        tmpdir = Path(tempfile.mkdtemp())
+        self.creds = (tmpdir / "kp.kdbx", tmpdir / "token", tmpdir / "key")
+        self.creds[1].write_text("token-password")
+        self.creds[2].write_text("key-material")
+        create_kp_db(*self.creds).save()
+        with KeepassStore(*self.creds) as store:
+            store.put_many({f"host{i}": f"pw{i}" for i in range(200)})
+            store.add_entry(store.add_group(store.root_group, "proxmox"), "api_token", "root", "pve-token")
+            store.save()
+        # never reach an agent a developer may be running
+        env = patch.dict(os.environ, {"TK_AGENT_SOCK": str(tmpdir / "agent.sock")})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_split_ref(self):
+        """Test that references split into a group path and a title."""
+        self.assertEqual(split_ref("host1"), (None, "host1"))
+        self.assertEqual(split_ref("/apps/db/web1"), ("apps/db", "web1"))
+
+    def test_prefetch_opens_the_store_once(self):
+        """Test that many references across groups are fetched with a single store open and then cached."""
+        secrets = TrapperKeeperSecrets(*self.creds)
+        refs = [f"host{i}" for i in range(200)]
+        self.assertEqual(secrets.prefetch([*refs, "proxmox/api_token", "missing", "nogroup/x"]), 203)
+        self.assertEqual(secrets.opens, 1)
+
+        self.assertEqual(secrets.get("host42"), "pw42")
+        self.assertEqual(secrets.get_many(["proxmox/api_token", "missing"]), {"proxmox/api_token": "pve-token"})
+        with self.assertRaises(KeyError):
+            secrets.get("nogroup/x")
+        self.assertEqual(secrets.opens, 1)
+
+        self.assertEqual(secrets.get("host7"), "pw7")
+        secrets.get_many(["host199", "host0"])
+        self.assertEqual(secrets.opens, 1)
+
+    def test_secrets_for_is_shared(self):
+        """Test that the same files share one cache per process."""
+        db, token, key = self.creds
+        self.assertIs(secrets_for(db, token, key), secrets_for(str(db), str(token), str(key)))
+        self.assertIsNot(secrets_for(db, token, key), secrets_for(db, token))
+
+    def test_missing_database(self):
+        """Test that a missing database is reported instead of created."""
+        secrets = TrapperKeeperSecrets(self.creds[0].with_name("absent.kdbx"), self.creds[1])
+        with self.assertRaises(FileNotFoundError):
+            secrets.prefetch(["host1"])
+        self.assertFalse(secrets.fp_kp_db.exists())
@@ -1,15 +1,43 @@
 """Tests for the trapper_keeper module."""
+import base64
+import contextlib
+import io
+import json
+import os
 import shutil
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import mock_open, patch
 
 from faker import Faker
+from lxml import etree as lxml_etree
+from pykeepass import PyKeePass
 from resources.configs.tk_conf import TkSettings
 
-from trapper_keeper.stores.keepass_store import create_kp_db
-from trapper_keeper.tk import _get_bolt_store
+from trapper_keeper import bench, keegen, tracing
+from trapper_keeper.agent import AgentClient, AgentKeepassStore, KeepassAgent
+from trapper_keeper.bundle import ShippedChunks, read_bundle, write_bundle, write_delta_bundle
+from trapper_keeper.migrate import bolt_writer, migrate, store_writer
+from trapper_keeper.provision import provision, read_hosts
+from trapper_keeper.stores.bolt_kvstore import BoltPool
+from trapper_keeper.stores.dict_store import PersistentDict
+from trapper_keeper.stores.indexed_dict import IndexedDict
+from trapper_keeper.stores.keepass_export import export_attachments, export_kp_db
+from trapper_keeper.stores.keepass_index import EntryQuery
+from trapper_keeper.stores.keepass_merge import MergeOp
+from trapper_keeper.stores.keepass_store import KeepassStore, create_kp_db, store_attachments, view_kp_db
+from trapper_keeper.stores.protocol import BulkStore
+from trapper_keeper.stores.sqlite_store import SqlitePool
+from trapper_keeper.tk import DbTypes, _get_bolt_store, get_store
+
+# cumulative microseconds ``import trapper_keeper.cli`` may take under ``-X importtime``
+IMPORT_BUDGET_US = int(os.environ.get("TK_IMPORT_BUDGET_US", 350_000))
 
 
 class TestTrapperKeeper(unittest.TestCase):
@@ -44,6 +72,7 @@ class TestTrapperKeeper(unittest.TestCase):
             settings.set("sqlite_db", self.prop_path)
             settings.set("bolt_db", self.bolt_path)
             settings.save()
+            self.creds = (Path(kp_db), Path(fp_token), Path(fp_key))
 
             self.settings = settings
 
@@ -82,6 +111,655 @@ class TestTrapperKeeper(unittest.TestCase):
             script_state = tx.bucket(b"scriptState")
             self.assertIsNotNone(script_state)
 
+    def test_kv_store_bulk_ops(self):
+        """Test the batched get/put/delete/scan API of the key/value store."""
+        kv_path = self.parent_dir / "kv.json"
+
+        with get_store(DbTypes.KV, db_fp=kv_path) as store:
+            self.assertIsInstance(store, BulkStore)
+            self.assertEqual(store.put_many({"host/a": "1", "host/b": "2", "other": "3"}), 3)
+
+        with get_store(DbTypes.KV, db_fp=kv_path) as store:
+            self.assertEqual(store.get_many(["host/a", "missing"]), {"host/a": "1"})
+            self.assertEqual(sorted(store.scan("host/")), [("host/a", "1"), ("host/b", "2")])
+            self.assertEqual(store.delete_many(["host/a", "missing"]), 1)
+
+        with get_store(DbTypes.KV, db_fp=kv_path, readonly=True) as store:
+            self.assertEqual(dict(store.scan()), {"host/b": "2", "other": "3"})
+
+    def test_kv_store_journal_replay(self):
+        """Test that journaled writes survive without a snapshot rewrite and are replayed on open."""
+        kv_path = self.parent_dir / "journal.json"
+
+        store = PersistentDict(kv_path, file_format="json", journal=True)
+        store.put_many({"a": 1, "b": 2})
+        del store["a"]
+        store.sync()
+        self.assertFalse(kv_path.exists())
+        self.assertTrue(Path(f"{kv_path}.log").exists())
+
+        # a crash mid-append leaves a torn record behind which must be ignored
+        with open(f"{kv_path}.log", "ab") as log:
+            log.write(b'["s","torn"')
+
+        journaled = PersistentDict(kv_path, file_format="json", journal=True)
+        self.assertEqual(dict(journaled), {"b": 2})
+        journaled["c"] = 3
+        journaled.compact()
+        journaled.close()
+
+        reopened = PersistentDict(kv_path, file_format="json")
+        self.assertEqual(dict(reopened), {"b": 2, "c": 3})
+        reopened.close()
+        self.assertTrue(kv_path.exists())
+        self.assertFalse(Path(f"{kv_path}.log").exists())
+
+    def test_kv_store_lazy_index(self):
+        """Test that the lazy key/value store finds keys through the mapped index."""
+        kv_path = self.parent_dir / "kv.idx"
+
+        with get_store(DbTypes.KV, db_fp=kv_path, lazy=True) as store:
+            store.put_many({f"host/{i:03d}": {"id": i} for i in range(200)})
+
+        with get_store(DbTypes.KV, db_fp=kv_path, lazy=True) as store:
+            self.assertEqual(len(store), 200)
+            self.assertEqual(store["host/042"], {"id": 42})
+            self.assertNotIn("host/999", store)
+            self.assertEqual([k for k, _ in store.scan("host/19")], [f"host/{i}" for i in range(190, 200)])
+            del store["host/000"]
+            store["host/0000"] = {"id": -1}
+
+        with get_store(DbTypes.KV, db_fp=kv_path, readonly=True, lazy=True) as store:
+            self.assertEqual(store.get_many(["host/000", "host/0000"]), {"host/0000": {"id": -1}})
+
+    def test_kv_store_lazy_and_eager_share_files(self):
+        """Test that lazy and eager key/value stores convert each other's files and that flag n empties them."""
+        kv_path = self.parent_dir / "kv.json"
+
+        with get_store(DbTypes.KV, db_fp=kv_path) as store:
+            store.put_many({"a": 1, "b": 2})
+        with get_store(DbTypes.KV, db_fp=kv_path, readonly=True, lazy=True) as store:
+            self.assertEqual(dict(store.scan()), {"a": 1, "b": 2})
+        with get_store(DbTypes.KV, db_fp=kv_path, lazy=True) as store:
+            store["c"] = 3
+        self.assertTrue(kv_path.read_bytes().startswith(b"TKIDX"))
+
+        with get_store(DbTypes.KV, db_fp=kv_path, journal=True) as store:
+            self.assertEqual(dict(store), {"a": 1, "b": 2, "c": 3})
+            del store["a"]
+        self.assertTrue(Path(f"{kv_path}.log").exists())
+        with get_store(DbTypes.KV, db_fp=kv_path, lazy=True) as store:
+            self.assertEqual(dict(store.scan()), {"b": 2, "c": 3})
+        self.assertFalse(Path(f"{kv_path}.log").exists())
+        with get_store(DbTypes.KV, db_fp=kv_path) as store:
+            self.assertEqual(dict(store), {"b": 2, "c": 3})
+        self.assertTrue(kv_path.read_bytes().startswith(b"%TKPD"))
+
+        IndexedDict(kv_path, flag="n").close()
+        self.assertEqual(len(IndexedDict(kv_path, flag="r")), 0)
+        with get_store(DbTypes.KV, db_fp=kv_path, lazy=True) as store:
+            store["d"] = 4
+        PersistentDict(kv_path, flag="n", file_format="json").close()
+        self.assertEqual(dict(PersistentDict(kv_path, flag="r")), {})
+
+    def test_kv_store_format_detection(self):
+        """Test that headered and legacy store files load with the format they were written in."""
+        legacy = self.parent_dir / "legacy.json"
+        legacy.write_text('{"a": [1, 2.5e3], "b": {"c": null}}')
+        self.assertEqual(dict(PersistentDict(legacy, flag="r")), {"a": [1, 2.5e3], "b": {"c": None}})
+
+        headered = self.parent_dir / "headered.csv"
+        with PersistentDict(headered, file_format="csv") as store:
+            store["a"] = "1"
+        self.assertTrue(headered.read_bytes().startswith(b"%TKPD 1 csv\n"))
+        self.assertEqual(dict(PersistentDict(headered, flag="r")), {"a": "1"})
+
+        legacy.write_text('{"a": ')
+        with self.assertRaises(ValueError):
+            PersistentDict(legacy, flag="r")
+
+    def test_kv_store_dirty_tracking(self):
+        """Test that clean closes skip I/O and the background flusher commits pending writes."""
+        kv_path = self.parent_dir / "dirty.json"
+
+        with PersistentDict(kv_path, file_format="json") as store:
+            store["a"] = 1
+        mtime = kv_path.stat().st_mtime_ns
+
+        with PersistentDict(kv_path, file_format="json") as store:
+            self.assertFalse(store.dirty)
+        self.assertEqual(store.stats.commits, 0)
+        self.assertEqual(kv_path.stat().st_mtime_ns, mtime)
+
+        store = PersistentDict(kv_path, file_format="json", flush_interval=60, max_dirty=10)
+        store.put_many({str(i): i for i in range(10)})
+        for _ in range(100):
+            if store.stats.commits:
+                break
+            time.sleep(0.05)
+        self.assertEqual(store.stats.commits, 1)
+        self.assertEqual(len(PersistentDict(kv_path, flag="r")), 11)
+        store.close()
+
+    def test_keepass_store_index(self):
+        """Test that the Keepass lookup index follows entries as they are added, moved and deleted."""
+        with KeepassStore(*self.creds) as store:
+            bootstrap = store.get_bootstrap_group()
+            sub_group = store.add_group(bootstrap, "hosts")
+            entry = store.add_entry(sub_group, "web", "root", "secret", tags=["lxc"])
+
+            self.assertEqual(store.lookup_entries(tag="lxc"), [entry])
+            self.assertEqual(store.get_bootstrap_entry(entry.uuid), entry)
+            self.assertIn(entry, store.lookup_entries(group=bootstrap, recursive=True))
+            with self.assertRaises(Exception):
+                store.add_entry(sub_group, "web", "root", "other")
+
+            store.move_entry(entry, bootstrap)
+            self.assertEqual(store.lookup_entries(group=sub_group), [])
+            self.assertIn(entry, store.lookup_entries(group=bootstrap))
+
+            store.delete_entry(entry)
+            self.assertEqual(store.lookup_entries(tag="lxc"), [])
+
+    def test_keepass_store_batch(self):
+        """Test that a batch saves once on success and rolls back on error."""
+        with KeepassStore(*self.creds) as store, patch.object(PyKeePass, "save") as save:
+            with store.batch():
+                store.put_many({"web": "secret"})
+                store.delete_many(["web"])
+                store.put_many({"db": "other"})
+            self.assertEqual(save.call_count, 1)
+
+            with self.assertRaises(RuntimeError), store.batch():
+                store.put_many({"web": "lost"})
+                raise RuntimeError("abort")
+            self.assertEqual(save.call_count, 1)
+            self.assertEqual(store.get_many(["web"]), {})
+
+    def test_store_attachments_dedup(self):
+        """Test that identical attachments share one binary and existing binaries are reused."""
+        files = []
+        for name, content in (("a", b"same"), ("b", b"same"), ("c", b"other")):
+            fp = self.parent_dir / name
+            fp.write_bytes(content)
+            files.append(fp)
+
+        with KeepassStore(*self.creds) as store:
+            before = len(store.binaries)
+            entry = store.add_entry(store.get_bootstrap_group(), "files", "", "")
+            stats = store_attachments(entry, store, files + [self.parent_dir / "missing"])
+            self.assertEqual((stats.binaries_added, stats.binaries_reused, stats.skipped), (2, 1, 1))
+            self.assertEqual(stats.bytes_read, 13)
+            self.assertEqual(len(store.binaries), before + 2)
+            self.assertEqual([a.data for a in entry.attachments], [b"same", b"same", b"other"])
+
+            again = store_attachments(store.add_entry(store.get_bootstrap_group(), "more", "", ""), store, files)
+            self.assertEqual((again.binaries_added, again.binaries_reused), (0, 3))
+
+    def test_bundle_round_trip(self):
+        """Test that a bundle streams back out intact and that corrupted members are rejected."""
+        src = [Path(self.settings.get(name)) for name in ("db", "token", "key")]
+        bundle = self.parent_dir / "trapper_keeper.zst"
+        stats = write_bundle(bundle, ((fp.name, fp) for fp in src))
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(stats.bytes_raw, sum(fp.stat().st_size for fp in src))
+
+        out_dir = self.parent_dir / "out"
+        out_dir.mkdir()
+        targets = {fp.name: out_dir / fp.name for fp in src}
+        read_bundle(bundle, targets)
+        for fp in src:
+            self.assertEqual((out_dir / fp.name).read_bytes(), fp.read_bytes())
+            self.assertEqual((out_dir / fp.name).stat().st_mode & 0o777, 0o600)
+
+        with self.assertRaises(ValueError):
+            read_bundle(bundle, {"missing": out_dir / "missing"})
+        self.assertEqual(sorted(p.name for p in out_dir.iterdir()), sorted(targets))
+
+    def test_delta_bundle_ships_changed_chunks(self):
+        """Test that a delta bundle ships only the chunks its destination lacks and rebuilds with its base."""
+        src = self.parent_dir / "attachment"
+        content = self.fake.binary(length=256 * 1024)
+        src.write_bytes(content)
+        ledgers = self.parent_dir / "shipped"
+
+        base = write_delta_bundle(self.parent_dir / "base.zst", [("attachment", src)], ShippedChunks("web1", ledgers))
+        src.write_bytes(content[:1000] + b"changed" + content[1000:])
+        delta = write_delta_bundle(self.parent_dir / "delta.zst", [("attachment", src)], ShippedChunks("web1", ledgers))
+        self.assertEqual(delta.chunks_sent, 1)
+        self.assertEqual(delta.chunks_reused, base.chunks_sent - 1)
+        other = write_delta_bundle(self.parent_dir / "other.zst", [("attachment", src)], ShippedChunks("web2", ledgers))
+        self.assertEqual(other.chunks_reused, 0)
+
+        ledger = ledgers / "web1.json"
+        self.assertEqual(ledger.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(len(json.loads(ledger.read_text())["chunks"]), base.chunks_sent + 1)
+
+        out = self.parent_dir / "out"
+        read_bundle(self.parent_dir / "base.zst", {"attachment": out}, deltas=[self.parent_dir / "delta.zst"])
+        self.assertEqual(out.read_bytes(), src.read_bytes())
+
+        with self.assertRaises(ValueError):
+            read_bundle(self.parent_dir / "delta.zst", {"attachment": out})
+
+    def test_delta_bundle_ships_keepass_payload(self):
+        """Test that database deltas ship the changed payload only and re-encrypt it with the credentials shipped whole."""
+        db, token, key = self.creds
+        with KeepassStore(*self.creds) as store:
+            store.put_many({f"host{i}": self.fake.password() for i in range(1000)})
+            store.save()
+        members = [(fp.name, fp) for fp in self.creds]
+        databases = {db.name: (token.name, key.name)}
+        ledgers = self.parent_dir / "shipped"
+
+        base = write_delta_bundle(self.parent_dir / "base.zst", members, ShippedChunks("web1", ledgers), databases)
+        with KeepassStore(*self.creds) as store:
+            store.put_many({"host7": "changed"})
+            store.save()
+        delta = write_delta_bundle(self.parent_dir / "delta.zst", members, ShippedChunks("web1", ledgers), databases)
+        self.assertLess(delta.chunks_sent * 4, base.chunks_sent)
+
+        out_dir = self.parent_dir / "out"
+        out_dir.mkdir()
+        targets = {fp.name: out_dir / fp.name for fp in self.creds}
+        read_bundle(self.parent_dir / "base.zst", targets, deltas=[self.parent_dir / "delta.zst"])
+        self.assertEqual(targets[token.name].read_bytes(), token.read_bytes())
+        self.assertEqual(targets[db.name].stat().st_mode & 0o777, 0o600)
+        unpacked = PyKeePass(targets[db.name], token.read_text(), keyfile=targets[key.name])
+        self.assertEqual(unpacked.find_entries(title="host7", first=True).password, "changed")
+        self.assertEqual(len(unpacked.entries), len(PyKeePass(db, token.read_text(), keyfile=key).entries))
+
+        with self.assertRaises(ValueError):
+            read_bundle(self.parent_dir / "delta.zst", {db.name: out_dir / "only.kdbx"})
+
+    def test_keepass_merge_by_uuid(self):
+        """Test that repeated merges pair entries by UUID instead of duplicating them."""
+        other = (self.parent_dir / "other.kdbx", self.parent_dir / "other.token", None)
+        other[1].write_text(self.fake.password())
+        with KeepassStore(*self.creds) as dst, create_kp_db(*other) as src:
+            hosts = src.add_group(src.get_bootstrap_group(), "hosts")
+            web = src.add_entry(hosts, "web", "root", "secret")
+            src.add_entry(src.get_bootstrap_group(), "db", "root", "secret")
+
+            plan = dst.copy_bootstrap_entries(src)
+            self.assertEqual(plan.count(MergeOp.INSERT), 2)
+            self.assertEqual(dst.lookup_entries(uuid=web.uuid)[0].parentgroup.name, "hosts")
+
+            again = dst.copy_bootstrap_entries(src)
+            self.assertEqual((again.actions, again.unchanged), ([], 2))
+
+            web.password = "rotated"
+            web.touch(modify=True)
+            dry = dst.copy_bootstrap_entries(src, dry_run=True)
+            self.assertEqual([a.op for a in dry.actions], [MergeOp.UPDATE])
+            self.assertEqual(dst.index.entries[web.uuid].password, "secret")
+
+            dst.copy_bootstrap_entries(src)
+            self.assertEqual(dst.index.entries[web.uuid].password, "rotated")
+            self.assertEqual(len(dst.lookup_entries(title="web")), 1)
+
+            kept = dst.copy_bootstrap_entries(src, policy="target", delete=True)
+            self.assertEqual(kept.count(MergeOp.DELETE), 0)
+
+            dst.move_entry(dst.index.entries[web.uuid], dst.root_group)
+            moved = dst.copy_bootstrap_entries(src)
+            self.assertEqual([a.op for a in moved.actions], [MergeOp.UPDATE])
+            self.assertEqual(len(dst.lookup_entries(title="web")), 1)
+            self.assertEqual(dst.index.entries[web.uuid].parentgroup.name, "hosts")
+
+    def test_gen_utf8_many(self):
+        """Test that batch key generation draws letters from the cached table."""
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.parent_dir / "cache")}):
+            keegen.unicode_letters.cache_clear()
+            keys = keegen.gen_utf8_many(20, length=64)
+            self.assertTrue(keegen._letter_table_path(True).is_file())
+            keegen.unicode_letters.cache_clear()
+            letters = set(keegen.unicode_letters(True))
+            keegen.unicode_letters.cache_clear()
+
+            # a truncated table fails its checksum and is rebuilt
+            table = keegen._letter_table_path(True)
+            table.write_text(table.read_text("utf-8")[:100], "utf-8")
+            self.assertEqual(set(keegen.unicode_letters(True)), letters)
+            self.assertEqual(set(table.read_text("utf-8")), letters)
+            keegen.unicode_letters.cache_clear()
+
+        self.assertEqual(len(keys), 20)
+        self.assertEqual(len(set(keys)), 20)
+        for key in keys:
+            self.assertEqual(len(key), 64)
+            self.assertTrue(set(key) <= letters)
+        self.assertEqual(len(keegen.gen_utf8(32, smp=False)), 32)
+
+    def test_gen_passphrases(self):
+        """Test that batch passphrases keep the complexity suffix and reuse the memoized wordlist."""
+        words = keegen.wordlist()
+        self.assertIs(keegen.wordlist(), words)
+
+        passphrases = keegen.gen_passphrases(50, length=4)
+        self.assertEqual(len(set(passphrases)), 50)
+        for passphrase in passphrases:
+            self.assertIn(passphrase[-1], keegen.PASSPHRASE_SYMBOLS)
+            self.assertRegex(passphrase, r"^([a-z-]+[0-9]){4}[A-Z-]+.$")
+
+    def test_provision_hosts(self):
+        """Test that provisioning writes one entry per host with a single save and rotates on rerun."""
+        fp_hosts = self.parent_dir / "hosts.txt"
+        fp_hosts.write_text("web\n# comment\n\ndb  # primary\nweb\n")
+        hosts = read_hosts(fp_hosts)
+        self.assertEqual(hosts, ["web", "db"])
+
+        with KeepassStore(*self.creds) as store, patch.object(PyKeePass, "save") as save:
+            timings = provision(store, hosts, key_length=32, workers=2)
+            self.assertEqual(timings["hosts"], 2)
+            self.assertEqual(save.call_count, 1)
+
+            web = store.lookup_entries(title="web")[0]
+            self.assertTrue(web.custom_properties["ssh_public_key"].startswith("ssh-ed25519 "))
+            self.assertEqual(len(web.custom_properties["keyfile"]), 32)
+            token = web.password
+
+            provision(store, ["web"], workers=1)
+            self.assertEqual(len(store.lookup_entries(title="web")), 1)
+            self.assertNotEqual(store.lookup_entries(title="web")[0].password, token)
+
+    def test_bolt_store_range_scan(self):
+        """Test nested bucket paths and cursor range scans of the Bolt adapter."""
+        Path(self.bolt_path).touch()
+        with _get_bolt_store(self.bolt_path, readonly=False) as store:
+            self.assertEqual(store.put_many({f"k{i:03}".encode(): b"%d" % i for i in range(300)}, "state/entries"), 300)
+            store.put(b"other", b"x", bucket=(b"state", b"config"))
+
+        with self.assertRaises(RuntimeError), _get_bolt_store(self.bolt_path, readonly=False) as store:
+            store.put(b"k000", b"lost", bucket="state/entries")
+            raise RuntimeError("abort")
+
+        with _get_bolt_store(self.bolt_path) as store:
+            self.assertEqual(list(store.buckets("state")), [b"config", b"entries"])
+            self.assertIsNone(store.bucket("state/missing"))
+            self.assertEqual(store.get(b"k000", "state/entries"), b"0")
+            self.assertEqual(store.get(b"other", "state/config"), b"x")
+            keys = [k for k, _ in store.range(b"k100", b"k110", bucket="state/entries")]
+            self.assertEqual(keys, [b"k%03d" % i for i in range(100, 110)])
+            self.assertEqual(len(list(store.prefix(b"k29", bucket="state/entries"))), 10)
+            self.assertEqual(sum(1 for _ in store.scan(bucket="state/entries")), 300)
+            self.assertEqual(list(store.range(b"z", bucket="state/entries")), [])
+
+    def test_bolt_pool_snapshot_readers(self):
+        """Test that pooled readers keep their snapshot while a writer commits."""
+
+        def write(generation: int) -> None:
+            with pool.writer() as store:
+                store.put_many({b"k%03d" % i: b"%d" % generation for i in range(200)}, "state")
+
+        def read(_) -> set[bytes]:
+            with pool.reader() as store:
+                return {v for _, v in store.scan(bucket="state")}
+
+        with BoltPool(self.bolt_path) as pool, ThreadPoolExecutor(max_workers=8) as executor:
+            write(0)
+            with pool.reader() as snapshot:
+                executor.submit(write, 1).result(timeout=30)
+                # every reader sees one generation, never a mix of two
+                self.assertEqual(set(map(frozenset, executor.map(read, range(16)))), {frozenset({b"1"})})
+                self.assertEqual({v for _, v in snapshot.scan(bucket="state")}, {b"0"})
+                # reusing the pages the first commit freed waits for the older snapshot
+                second = executor.submit(write, 2)
+                time.sleep(0.2)
+                self.assertFalse(second.done())
+            second.result(timeout=30)
+            self.assertEqual(read(None), {b"2"})
+            self.assertEqual(pool.stats.writers_total, 3)
+            self.assertEqual(pool.stats.readers_total, 18)
+            self.assertEqual(pool.stats.readers_open, 0)
+            self.assertEqual(pool.stats.remaps, 1)
+
+    def test_sqlite_store_catalog(self):
+        """Test that the sqlite store persists to its file and catalogs Keepass metadata."""
+        with get_store(DbTypes.SQLITE, db_fp=Path(self.prop_path)) as store:
+            self.assertEqual(store.put_many({"host/a": "1", "host/b": "2"}), 2)
+            self.assertEqual(store.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            with KeepassStore(*self.creds) as kp_store:
+                bootstrap = kp_store.get_bootstrap_group()
+                web = kp_store.add_entry(bootstrap, "web", "root", "secret", tags=["prod", "http"])
+                web.set_custom_property("api_key", "hidden")
+                kp_store.add_entry(bootstrap, "db", "root", "secret", tags=["prod"])
+                kp_store.index.reindex_entry(web)
+                self.assertEqual(store.catalog(kp_store)["written"], len(kp_store.index.entries))
+
+        with get_store(DbTypes.SQLITE, db_fp=Path(self.prop_path), readonly=True) as store:
+            self.assertEqual(dict(store.scan("host/")), {"host/a": "1", "host/b": "2"})
+            self.assertEqual([row[2] for row in store.find_secrets(tag="prod")], ["db", "web"])
+            self.assertEqual([row[0] for row in store.find_secrets(prop="api_key")], [str(web.uuid)])
+            self.assertEqual([row[2] for row in store.search_secrets("http")], ["web"])
+            self.assertNotIn("hidden", str(store.execute("SELECT * FROM [secrets_fts]").fetchall()))
+
+        with SqlitePool(Path(self.prop_path), size=2) as pool:
+
+            def lookup(key: str) -> dict:
+                with pool.store() as store:
+                    return store.get_many([key])
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                found = list(executor.map(lookup, ["host/a", "host/b"] * 4))
+            self.assertEqual(found[:2], [{"host/a": "1"}, {"host/b": "2"}])
+            self.assertLessEqual(len(pool._stores), 2)
+
+    def test_migrate_resumes_between_stores(self):
+        """Test that a migration streams batches between stores and resumes after an interruption."""
+        kv_path = self.parent_dir / "migrate.json"
+        checkpoint = (kv_path, self.parent_dir / "bolt.db.migrate.json")
+        with get_store(DbTypes.KV, db_fp=kv_path) as store:
+            store.put_many({f"host/{i:04d}": {"id": i} for i in range(250)})
+
+        with BoltPool(self.bolt_path) as pool:
+            write = bolt_writer(pool)
+            batches = []
+
+            def interrupted(batch):
+                if len(batches) == 2:
+                    raise KeyboardInterrupt
+                batches.append(batch)
+                return write(batch)
+
+            with get_store(DbTypes.KV, db_fp=kv_path, readonly=True) as src, self.assertRaises(KeyboardInterrupt):
+                migrate(src.scan(), interrupted, DbTypes.BOLT, batch_size=100, checkpoint=checkpoint)
+            self.assertTrue(checkpoint[1].exists())
+
+            with get_store(DbTypes.KV, db_fp=kv_path, readonly=True) as src:
+                stats = migrate(src.scan(), write, DbTypes.BOLT, batch_size=100, checkpoint=checkpoint)
+            self.assertEqual((stats.resumed, stats.records, stats.batches), (200, 50, 1))
+            self.assertFalse(checkpoint[1].exists())
+
+        with get_store(DbTypes.BOLT, db_fp=self.bolt_path, readonly=True) as src, get_store(
+            DbTypes.SQLITE, db_fp=Path(self.prop_path)
+        ) as dst:
+            stats = migrate(src.scan(), store_writer(dst), DbTypes.SQLITE, batch_size=64)
+            self.assertEqual((stats.records, stats.batches), (250, 4))
+            self.assertEqual(dst.get_many(["host/0042"]), {"host/0042": b'{"id": 42}'})
+
+    def test_benchmark_compare(self):
+        """Test that every store is benchmarked and that a slower run fails the comparison."""
+        results = bench.run(sizes=(20,), repeat=1, workdir=self.parent_dir)
+        for db_type in DbTypes:
+            for op in ("put", "open", "get", "scan", "save"):
+                self.assertIn(f"{db_type}/20/{op}", results["results"])
+        self.assertEqual(results["results"]["kv/20/get"]["ops"], 20)
+
+        baseline_fp = self.parent_dir / "baseline.json"
+        bench.save_baseline(results, baseline_fp)
+        baseline = bench.load_baseline(baseline_fp)
+        self.assertEqual(bench.compare(results, baseline), [])
+
+        slower = {**results, "results": {k: {**v, "seconds": v["seconds"] * 2} for k, v in results["results"].items()}}
+        compared = [k for k, v in slower["results"].items() if v["seconds"] >= bench.MIN_SECONDS]
+        self.assertTrue(compared)
+        regressions = bench.compare(slower, baseline, threshold=0.5)
+        self.assertEqual([r.split(":")[0] for r in regressions], sorted(compared))
+        self.assertEqual(bench.compare(slower, baseline, threshold=1.5), [])
+
+    def test_tracing_spans(self):
+        """Test that traced operations record spans with byte counts only while tracing is on."""
+        self.assertIsNone(tracing.active())
+        with tracing.span("off") as off:
+            off.set(bytes=1)
+
+        trace_fp = self.parent_dir / "trace.json"
+        tracer = tracing.enable(trace_fp)
+        try:
+            keegen.gen_utf8_many(4, 16)
+            with get_store(DbTypes.KP, fp_kp_db=self.creds[0], fp_token=self.creds[1], fp_key=self.creds[2]) as store:
+                store.put_many({"traced": "value"})
+            with self.assertRaises(KeyError), tracing.span("failing"):
+                raise KeyError("x")
+        finally:
+            self.assertIs(tracing.disable(), tracer)
+
+        names = [s.name for s in tracer.spans]
+        for name in ("keegen.gen_utf8_many", "tk.get_store", "keepass.read", "keepass.save"):
+            self.assertIn(name, names)
+        self.assertNotIn("off", names)
+        save = next(s for s in tracer.spans if s.name == "keepass.save")
+        self.assertEqual(save.attrs["bytes"], self.creds[0].stat().st_size)
+        self.assertEqual(tracer.spans[-1].attrs["error"], "KeyError")
+        self.assertTrue(any(line.startswith("keepass.read") for line in tracer.summary()))
+
+        events = json.loads(trace_fp.read_text())["traceEvents"]
+        self.assertEqual(len(events), len(tracer.spans))
+        self.assertEqual({e["ph"] for e in events}, {"X"})
+        tracer.fmt = tracing.JSONL
+        lines = tracer.write(self.parent_dir / "trace.jsonl").read_text().splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines], names)
+
+    def test_cli_import_budget(self):
+        """Test that importing the CLI loads no store backend and stays within the import time budget."""
+        backends = ("pykeepass", "lxml", "boltdb", "sqlite_utils")
+        code = f"import sys, trapper_keeper.cli; print(*[m for m in {backends!r} if m in sys.modules])"
+        timings = []
+        for _ in range(3):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code],
+                cwd=Path(__file__).parents[1],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            self.assertEqual(proc.stdout.strip(), "")
+            cli_line = next(line for line in proc.stderr.splitlines() if line.endswith("| trapper_keeper.cli"))
+            timings.append(int(cli_line.split("|")[1]))
+        self.assertLess(min(timings), IMPORT_BUDGET_US)
+
+    def test_keepass_export_streams_without_keepassxc(self):
+        """Test the native XML and JSON lines exports and the batched attachment export."""
+        with KeepassStore(*self.creds) as store:
+            group = store.add_group(store.root_group, "apps")
+            entry = store.add_entry(group, "api", "svc", "s3cret")
+            entry.add_attachment(store.add_binary(b"cert-bytes"), "cert.pem")
+            entry.add_attachment(store.add_binary(b"key-bytes"), "key.pem")
+            store.save()
+
+            xml_fp = self.parent_dir / "export.xml"
+            stats = export_kp_db(store, xml_fp)
+            self.assertEqual(stats.entries, len(store.entries))
+            self.assertEqual(xml_fp.stat().st_mode & 0o777, 0o600)
+            tree = lxml_etree.parse(str(xml_fp))
+            password = tree.xpath("//Entry[String[Key='Title']/Value='api']/String[Key='Password']/Value")[0]
+            self.assertEqual(password.text, "s3cret")
+            self.assertEqual(password.get("ProtectInMemory"), "True")
+            binaries = tree.xpath("/KeePassFile/Meta/Binaries/Binary")
+            self.assertIn(b"cert-bytes", [base64.b64decode(b.text) for b in binaries])
+
+            jsonl_fp = self.parent_dir / "export.jsonl"
+            export_kp_db(store, jsonl_fp, fmt="jsonl")
+            records = [json.loads(line) for line in jsonl_fp.read_text().splitlines()]
+            api = next(r for r in records if r["title"] == "api")
+            self.assertEqual((api["path"], api["password"], api["attachments"]), ("apps", "s3cret", ["cert.pem", "key.pem"]))
+
+            out = self.parent_dir / "attachments"
+            stats = export_attachments(store, [("apps/api", "cert.pem", out / "cert.pem"), ("/apps/api", "key.pem", out / "key.pem")])
+            self.assertEqual((stats.files, stats.bytes_written), (2, len(b"cert-byteskey-bytes")))
+            self.assertEqual((out / "key.pem").read_bytes(), b"key-bytes")
+            self.assertEqual((out / "cert.pem").stat().st_mode & 0o777, 0o600)
+            with self.assertRaises(ValueError):
+                export_attachments(store, [("apps/api", "missing.pem", out / "missing.pem"), ("apps/api", "cert.pem", out / "x")])
+            self.assertFalse((out / "x").exists())
+
+    def test_view_kp_db_filters_and_pages(self):
+        """Test that viewing filters, pages, hides passwords and only reads attachments on request."""
+        with KeepassStore(*self.creds) as store:
+            ssh = store.add_group(store.root_group, "ssh")
+            for i in range(5):
+                entry = store.add_entry(ssh, f"id_{i}", "user", f"pw-{i}", tags=["prod"] if i % 2 else None)
+                entry.set_custom_property("host", f"host{i}")
+            store.add_entry(store.add_group(ssh, "old"), "id_old", "user", "pw-old")
+            store.add_entry(ssh, "known_hosts", "user", "pw-kh").add_attachment(store.add_binary(b"hosts"), "known_hosts")
+            store.save()
+
+        def view(query: EntryQuery, fmt: str = "jsonl") -> list:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                view_kp_db(*self.creds, query=query, fmt=fmt)
+            return [json.loads(line) for line in out.getvalue().splitlines()] if fmt == "jsonl" else out.getvalue()
+
+        titles = [r["title"] for r in view(EntryQuery(group="/ssh/", title="id_*"))]
+        self.assertEqual(sorted(titles), ["id_0", "id_1", "id_2", "id_3", "id_4", "id_old"])
+        self.assertNotIn("id_old", [r["title"] for r in view(EntryQuery(group="ssh", title="id_*", recursive=False))])
+        self.assertEqual(sorted(r["title"] for r in view(EntryQuery(tag="prod"))), ["id_1", "id_3"])
+        self.assertEqual(len(view(EntryQuery(prop="host"))), 5)
+
+        pages = [view(EntryQuery(title="id_?", offset=offset, limit=2)) for offset in (0, 2, 4)]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sorted(r["title"] for page in pages for r in page), [f"id_{i}" for i in range(5)])
+
+        (known_hosts,) = view(EntryQuery(title="known_hosts"))
+        self.assertNotIn("password", known_hosts)
+        self.assertEqual(known_hosts["attachments"], [{"id": 0, "name": "known_hosts"}])
+        (known_hosts,) = view(EntryQuery(title="known_hosts", attachments=True))
+        self.assertEqual(known_hosts["attachments"][0]["size"], len(b"hosts"))
+
+        text = view(EntryQuery(group="ssh"), fmt="text")
+        self.assertIn("Group: ssh/old", text)
+        self.assertNotIn("pw-", text)
+        with self.assertRaises(ValueError):
+            view(EntryQuery(), fmt="xml")
+
+    def test_agent_serves_bulk_ops(self):
+        """Test that the unlock agent serves the bulk API and picks up changes made outside it."""
+        sock = self.parent_dir / "agent" / "agent.sock"
+        agent = KeepassAgent(sock, idle_timeout=60)
+        server = threading.Thread(target=agent.serve_forever, daemon=True)
+        server.start()
+        client = AgentClient(sock)
+        for _ in range(50):
+            if client.available():
+                break
+            time.sleep(0.1)
+
+        try:
+            store = AgentKeepassStore(client, *self.creds)
+            self.assertEqual(store.put_many({"web": "secret"}), 1)
+            self.assertEqual(store.get_many(["web", "missing"]), {"web": "secret"})
+            self.assertEqual(sock.stat().st_mode & 0o777, 0o600)
+
+            with KeepassStore(*self.creds) as local:
+                local.put_many({"db": "other"})
+            self.assertEqual(store.get_many(["db"]), {"db": "other"})
+            with self.assertRaises(KeyError):
+                store.get_many(["web"], group="missing/group")
+            with self.assertRaises(AttributeError):
+                store.copy_bootstrap_entries
+
+            with patch.dict(os.environ, {"TK_AGENT_SOCK": str(sock)}):
+                fp_kp_db, fp_token, fp_key = self.creds
+                with get_store(DbTypes.KP, fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key, agent=True) as served:
+                    self.assertIsInstance(served, AgentKeepassStore)
+                with get_store(DbTypes.KP, fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key) as local:
+                    self.assertIsInstance(local, KeepassStore)
+        finally:
+            client.call("stop")
+            server.join(timeout=5)
+        self.assertFalse(sock.exists())
+
     @patch("trapper_keeper.conf.Path.mkdir")
     @patch("trapper_keeper.conf.Path.exists", return_value=False)
     @patch("trapper_keeper.conf.Path.stat")
@@ -0,0 +1,329 @@
+"""Unlock agent that keeps Keepass databases decrypted between trapper-keeper calls, like ssh-agent.
+
+Opening a ``.kdbx`` runs the KDF, decrypts the payload and parses the XML, which costs seconds per
+CLI call.  `KeepassAgent` pays that once and then serves the bulk store API over a Unix socket
+that only the owning user can reach.  After ``idle_timeout`` seconds without a request it locks,
+dropping every decrypted database from memory.
+
+Requests and responses are single JSON lines::
+
+    {"op": "get_many", "db": "/path/db.kdbx", "token": "/path/token", "key": null, "keys": ["a"]}
+    {"ok": true, "result": {"a": "secret"}}
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Any
+
+SOCKET_ENV: str = "TK_AGENT_SOCK"
+IDLE_TIMEOUT: int = 900
+# largest request line the agent accepts
+MAX_REQUEST_BYTES: int = 16 * 1024 * 1024
+CONNECT_TIMEOUT: float = 5.0
+
+
+class AgentError(Exception):
+    """Raised when the agent rejects or fails a request."""
+
+
+def socket_path() -> Path:
+    """Return the agent socket path.
+
+    ``$TK_AGENT_SOCK`` wins, then ``$XDG_RUNTIME_DIR/trapper_keeper/agent.sock``, then a per-user
+    folder in the system temp dir.
+    """
+    if os.environ.get(SOCKET_ENV):
+        return Path(os.environ[SOCKET_ENV])
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or f"{tempfile.gettempdir()}/trapper_keeper-{os.getuid()}"
+    return Path(runtime) / "trapper_keeper" / "agent.sock"
+
+
+def _version(fp: Path) -> tuple[int, int]:
+    """Return what tells the agent a database changed on disk behind its back."""
+    stat = fp.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _peer_uid(conn: socket.socket) -> int | None:
+    """Return the uid of the process on the other end of a Unix socket, where the OS tells us."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Serve JSON line requests for one client connection."""
+
+    def handle(self):
+        """Answer requests until the client hangs up."""
+        agent: KeepassAgent = self.server.agent
+        uid = _peer_uid(self.connection)
+        if uid is not None and uid != os.getuid():
+            self._reply({"ok": False, "error": "permission denied"})
+            return
+        while line := self.rfile.readline(MAX_REQUEST_BYTES):
+            try:
+                response = {"ok": True, "result": agent.dispatch(json.loads(line))}
+            except Exception as exc:
+                response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            self._reply(response)
+
+    def _reply(self, response: dict) -> None:
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class KeepassAgent:
+    """Keep Keepass databases unlocked and serve their bulk API over a Unix socket."""
+
+    def __init__(self, sock_path: Path | None = None, idle_timeout: int = IDLE_TIMEOUT):
+        """Initialize the agent.
+
+        Args:
+            sock_path (Path | None): The socket to listen on. Defaults to `socket_path`.
+            idle_timeout (int): Seconds without requests before every database is locked.
+        """
+        self.sock_path = Path(sock_path or socket_path())
+        self.idle_timeout = idle_timeout
+        self._stores: dict[str, tuple[Any, tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+        self._last_request = time.monotonic()
+        self._server: _Server | None = None
+
+    def unlock(self, db: str, token: str, key: str | None = None):
+        """Return the open store for ``db``, unlocking it if needed or if it changed on disk.
+
+        Args:
+            db (str): The path to the Keepass database file.
+            token (str): The path to the token file.
+            key (str | None): The path to the key file.
+
+        Returns:
+            KeepassStore: The unlocked store.
+        """
+        from trapper_keeper.stores.keepass_store import KeepassStore  # noqa: PLC0415 - backends load on first use
+
+        fp_kp_db = Path(db).resolve()
+        cached = self._stores.get(str(fp_kp_db))
+        if cached is not None and cached[1] == _version(fp_kp_db):
+            return cached[0]
+        store = KeepassStore(fp_kp_db, Path(token), Path(key) if key else None)
+        # bootstrapping a fresh database may have saved it
+        self._stores[str(fp_kp_db)] = (store, _version(fp_kp_db))
+        return store
+
+    def lock(self) -> int:
+        """Drop every unlocked database.
+
+        Returns:
+            int: The number of databases locked.
+        """
+        with self._lock:
+            locked = len(self._stores)
+            self._stores.clear()
+            return locked
+
+    def dispatch(self, request: dict) -> Any:
+        """Run one request against the unlocked databases."""
+        op = request.get("op")
+        self._last_request = time.monotonic()
+        if op == "ping":
+            return {"pid": os.getpid(), "unlocked": len(self._stores)}
+        if op == "lock":
+            return self.lock()
+        if op == "stop":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return True
+        if op not in ("unlock", "get_many", "put_many", "delete_many", "scan"):
+            raise AgentError(f"Unsupported op: {op!r}")
+        with self._lock:
+            store = self.unlock(request["db"], request["token"], request.get("key"))
+            group = request.get("group")
+            match op:
+                case "unlock":
+                    result = True
+                case "get_many":
+                    result = store.get_many(request["keys"], group=group)
+                case "put_many":
+                    result = store.put_many(request["items"], group=group)
+                case "delete_many":
+                    result = store.delete_many(request["keys"], group=group)
+                case _:
+                    result = list(store.scan(request.get("prefix"), group=group))
+            if op in ("put_many", "delete_many"):
+                # our own save must not look like a change made by someone else
+                fp_kp_db = Path(request["db"]).resolve()
+                self._stores[str(fp_kp_db)] = (store, _version(fp_kp_db))
+            return result
+
+    def _watch_idle(self) -> None:
+        """Lock every database once the agent has been idle for ``idle_timeout`` seconds."""
+        while self._server is not None:
+            time.sleep(min(self.idle_timeout, 5))
+            if self._stores and time.monotonic() - self._last_request >= self.idle_timeout:
+                self.lock()
+
+    def serve_forever(self, preload: list[tuple[str, str, str | None]] | None = None) -> None:
+        """Listen on the socket until stopped.
+
+        Args:
+            preload (list[tuple] | None): ``(db, token, key)`` paths to unlock before serving.
+        """
+        self.sock_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.sock_path.parent.chmod(0o700)
+        if self.sock_path.exists():
+            if AgentClient(self.sock_path).available():
+                raise AgentError(f"An agent is already listening on {self.sock_path}")
+            self.sock_path.unlink()
+        for db, token, key in preload or ():
+            self.unlock(db, token, key)
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(str(self.sock_path), _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.agent = self
+        self.sock_path.chmod(0o600)
+        threading.Thread(target=self._watch_idle, name="tk-agent-idle", daemon=True).start()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.shutdown, daemon=True).start())
+        print(f"{SOCKET_ENV}={self.sock_path}; export {SOCKET_ENV};")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            self.lock()
+            with contextlib.suppress(FileNotFoundError):
+                self.sock_path.unlink()
+
+    def shutdown(self) -> None:
+        """Stop serving and lock every database."""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class AgentClient:
+    """Client side of the agent socket."""
+
+    def __init__(self, sock_path: Path | None = None):
+        """Initialize the client for ``sock_path``, defaulting to `socket_path`."""
+        self.sock_path = Path(sock_path or socket_path())
+
+    def available(self) -> bool:
+        """Return True if an agent answers on the socket."""
+        if not self.sock_path.exists():
+            return False
+        try:
+            self.call("ping")
+        except (OSError, AgentError):
+            return False
+        return True
+
+    def call(self, op: str, **params) -> Any:
+        """Send one request and return its result.
+
+        Raises:
+            AgentError: If the agent reports a failure.
+            OSError: If the agent cannot be reached.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CONNECT_TIMEOUT)
+            conn.connect(str(self.sock_path))
+            conn.settimeout(None)
+            conn.sendall(json.dumps({"op": op, **params}).encode() + b"\n")
+            with conn.makefile("rb") as reader:
+                line = reader.readline()
+        if not line:
+            raise AgentError("The agent closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise AgentError(response.get("error"))
+        return response.get("result")
+
+
+class AgentKeepassStore(AbstractContextManager):
+    """Stand-in for `KeepassStore` that serves the bulk API from a running agent.
+
+    Only ``get_many``, ``put_many``, ``delete_many`` and ``scan`` are served, which is why
+    `trapper_keeper.tk.get_store` hands it out only to callers passing ``agent=True``.  Anything else
+    raises AttributeError instead of quietly unlocking the database locally.
+    """
+
+    def __init__(self, client: AgentClient, fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None):
+        """Initialize the store.
+
+        Args:
+            client (AgentClient): The client for the running agent.
+            fp_kp_db (Path): The path to the Keepass database file.
+            fp_token (Path): The path to the token file.
+            fp_key (Path | None, optional): The path to the key file. Defaults to None.
+        """
+        self.client = client
+        self.fp_kp_db = fp_kp_db
+        self.fp_token = fp_token
+        self.fp_key = fp_key
+
+    def _call(self, op: str, group=None, **params) -> Any:
+        """Run ``op`` on the agent, raising KeyError for an unknown group like `KeepassStore` does."""
+        from trapper_keeper.stores.keepass_index import group_path  # noqa: PLC0415 - backends load on first use
+
+        try:
+            return self.client.call(
+                op,
+                db=str(Path(self.fp_kp_db).resolve()),
+                token=str(Path(self.fp_token).resolve()),
+                key=str(Path(self.fp_key).resolve()) if self.fp_key else None,
+                group=group if group is None or isinstance(group, str) else group_path(group),
+                **params,
+            )
+        except AgentError as e:
+            if str(e).startswith(f"{KeyError.__name__}: "):
+                raise KeyError(str(e).partition(": ")[2]) from e
+            raise
+
+    def get_many(self, keys, group=None) -> dict[str, str]:
+        """Fetch entry passwords by title through the agent, see `KeepassStore.get_many`."""
+        return self._call("get_many", group=group, keys=list(keys))
+
+    def put_many(self, items, group=None) -> int:
+        """Write entries through the agent, see `KeepassStore.put_many`."""
+        from trapper_keeper.stores.protocol import iter_items  # noqa: PLC0415 - backends load on first use
+
+        return self._call("put_many", group=group, items=dict(iter_items(items)))
+
+    def delete_many(self, keys, group=None) -> int:
+        """Delete entries through the agent, see `KeepassStore.delete_many`."""
+        return self._call("delete_many", group=group, keys=list(keys))
+
+    def scan(self, prefix=None, group=None):
+        """Iterate over entries through the agent, see `KeepassStore.scan`."""
+        yield from (tuple(pair) for pair in self._call("scan", group=group, prefix=prefix))
+
+    def __getattr__(self, item):
+        """Refuse anything the agent does not serve, rather than running the KDF locally."""
+        raise AttributeError(
+            f"{type(self).__name__} only serves the bulk API; open the store with agent=False to use {item!r}"
+        )
+
+    def __exit__(self, __exc_type, __exc_value, __traceback):
+        """Context manager exit.  The agent keeps the database open."""
@@ -0,0 +1,227 @@
+"""Benchmarks of the stores `trapper_keeper.tk.get_store` opens and of key generation.
+
+Every store type is filled with a synthetic store of ``size`` records in a scratch directory, then
+timed on the operations the CLI depends on: open, ``put_many`` of the whole store, ``get_many`` of
+every key, a full ``scan`` and the save of a single changed record.  Key generation is timed on
+`trapper_keeper.keegen` and `create_kp_db`.  Results are written as a JSON baseline, and a later
+run compared against it reports every measurement that got slower than the threshold allows.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import platform
+import tempfile
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from trapper_keeper.keegen import gen_passphrase, gen_passphrases, gen_utf8_many
+from trapper_keeper.migrate import convert
+from trapper_keeper.tk import DbTypes, get_store
+
+SIZES: tuple[int, ...] = (1_000, 10_000, 100_000)
+DEFAULT_REPEAT: int = 3
+# a measurement may be this much slower than its baseline before it counts as a regression
+DEFAULT_THRESHOLD: float = 0.25
+# measurements faster than this on both sides are timer noise and never compared
+MIN_SECONDS: float = 0.001
+BASELINE_VERSION: int = 1
+
+_SUFFIXES = {DbTypes.KP: ".kdbx", DbTypes.SQLITE: ".sqlite", DbTypes.BOLT: ".db", DbTypes.KV: ".json"}
+
+
+@dataclass
+class Measurement:
+    """The best time of one benchmark over its repeats."""
+
+    name: str
+    seconds: float
+    ops: int = 1
+
+    @property
+    def rate(self) -> float:
+        """Operations per second."""
+        return self.ops / self.seconds if self.seconds else 0.0
+
+
+def best_of(fn: Callable[[], object], repeat: int, timed: bool = False) -> float:
+    """Return the fastest of ``repeat`` calls of ``fn``.
+
+    With ``timed`` ``fn`` returns the seconds it measured itself, to leave its setup out of the time.
+    """
+    times = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        measured = fn()
+        times.append(measured if timed else time.perf_counter() - start)
+    return min(times)
+
+
+def synthetic_records(size: int, db_type: DbTypes) -> list[tuple]:
+    """Return ``size`` ordered ``(key, value)`` pairs of the types ``db_type`` takes."""
+    return list(convert(((f"key/{i:07d}", f"value-{i:07d}") for i in range(size)), db_type))
+
+
+def _opener(db_type: DbTypes, fp: Path, fp_token: Path) -> Callable[[bool], contextlib.AbstractContextManager]:
+    """Return a function opening the benchmark store at ``fp``, read only or writable."""
+    if db_type == DbTypes.KP:
+        return lambda readonly: get_store(DbTypes.KP, fp_kp_db=fp, fp_token=fp_token, fp_key=None)
+    return lambda readonly: get_store(db_type, db_fp=fp, readonly=readonly)
+
+
+def bench_store(db_type: DbTypes, size: int, workdir: Path, repeat: int = DEFAULT_REPEAT) -> list[Measurement]:
+    """Fill a new store of ``size`` records and time its operations.
+
+    Args:
+        db_type (DbTypes): The store type.
+        size (int): The number of records.
+        workdir (Path): The directory receiving the store file.
+        repeat (int, optional): Runs of every read benchmark, the best is kept. Defaults to 3.
+
+    Returns:
+        list[Measurement]: ``put``, ``open``, ``get``, ``scan`` and ``save``, named ``<type>/<size>/<op>``.
+    """
+    fp = workdir / f"{db_type}-{size}{_SUFFIXES[db_type]}"
+    fp_token = workdir / "token"
+    if not fp_token.exists():
+        fp_token.write_text(gen_passphrase(), "utf-8")
+    if db_type == DbTypes.BOLT:
+        fp.touch()
+    open_store = _opener(db_type, fp, fp_token)
+    records = synthetic_records(size, db_type)
+    keys = [k for k, _ in records]
+    name = f"{db_type}/{size}"
+
+    start = time.perf_counter()
+    with open_store(False) as store:
+        store.put_many(records)
+    put = time.perf_counter() - start
+
+    def reopen() -> None:
+        with open_store(True):
+            pass
+
+    def save() -> float:
+        with contextlib.ExitStack() as stack:
+            store = stack.enter_context(open_store(False))
+            start = time.perf_counter()
+            store.put_many(records[:1])
+            stack.close()
+            return time.perf_counter() - start
+
+    measurements = [Measurement(f"{name}/put", put, size), Measurement(f"{name}/open", best_of(reopen, repeat))]
+    with open_store(True) as store:
+        measurements.append(Measurement(f"{name}/get", best_of(lambda: store.get_many(keys), repeat), size))
+        measurements.append(Measurement(f"{name}/scan", best_of(lambda: deque(store.scan(), maxlen=0), repeat), size))
+    measurements.append(Measurement(f"{name}/save", best_of(save, repeat, timed=True)))
+    return measurements
+
+
+def bench_keygen(count: int, workdir: Path, repeat: int = DEFAULT_REPEAT) -> list[Measurement]:
+    """Time the generation of ``count`` keys and passphrases, and the creation of a Keepass database."""
+    from trapper_keeper.stores.keepass_store import create_kp_db  # noqa: PLC0415 - backends load on first use
+
+    fp_token = workdir / "token"
+    if not fp_token.exists():
+        fp_token.write_text(gen_passphrase(), "utf-8")
+
+    def create() -> None:
+        fp_kp_db = workdir / "create.kdbx"
+        fp_kp_db.unlink(missing_ok=True)
+        create_kp_db(fp_kp_db, fp_token)
+
+    return [
+        Measurement(f"keygen/{count}/utf8", best_of(lambda: gen_utf8_many(count), repeat), count),
+        Measurement(f"keygen/{count}/passphrase", best_of(lambda: gen_passphrases(count), repeat), count),
+        Measurement("keygen/create_kp_db", best_of(create, repeat)),
+    ]
+
+
+def run(
+    sizes: Iterable[int] = SIZES,
+    db_types: Iterable[DbTypes] = tuple(DbTypes),
+    repeat: int = DEFAULT_REPEAT,
+    workdir: Path | None = None,
+) -> dict:
+    """Run every benchmark and return the results as a baseline.
+
+    Args:
+        sizes (Iterable[int], optional): The store sizes. Defaults to 1k, 10k and 100k records.
+        db_types (Iterable[DbTypes], optional): The store types. Defaults to all of them.
+        repeat (int, optional): Runs of every benchmark, the best is kept. Defaults to 3.
+        workdir (Path | None, optional): The scratch directory. Defaults to a temporary one.
+
+    Returns:
+        dict: The baseline, see `save_baseline`.
+    """
+    sizes, db_types = tuple(sizes), tuple(db_types)
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="tk-bench-")))
+        measurements = bench_keygen(min(sizes), workdir, repeat)
+        for db_type in db_types:
+            for size in sizes:
+                measurements.extend(bench_store(db_type, size, workdir, repeat))
+    return {
+        "version": BASELINE_VERSION,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {m.name: {**asdict(m), "rate": m.rate} for m in measurements},
+    }
+
+
+def save_baseline(results: dict, fp: Path) -> None:
+    """Write benchmark results to ``fp`` as JSON."""
+    fp.write_text(json.dumps(results, indent=2, sort_keys=True), "utf-8")
+
+
+def load_baseline(fp: Path) -> dict:
+    """Read a baseline written by `save_baseline`.
+
+    Raises:
+        ValueError: If the file holds another baseline version.
+    """
+    baseline = json.loads(fp.read_text("utf-8"))
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{fp} is not a version {BASELINE_VERSION} benchmark baseline")
+    return baseline
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Return a line for every measurement slower than its baseline by more than ``threshold``.
+
+    Measurements missing from either side, and those under `MIN_SECONDS` on both, are skipped.
+
+    Args:
+        results (dict): The current results.
+        baseline (dict): The baseline results.
+        threshold (float, optional): The allowed slowdown, 0.25 is 25% slower. Defaults to 0.25.
+
+    Returns:
+        list[str]: The regressions, empty if there are none.
+    """
+    regressions = []
+    for name, current in sorted(results["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None or max(current["seconds"], base["seconds"]) < MIN_SECONDS:
+            continue
+        if current["seconds"] > base["seconds"] * (1 + threshold):
+            slower = current["seconds"] / base["seconds"] - 1 if base["seconds"] else float("inf")
+            regressions.append(
+                f"{name}: {current['seconds']:.4f}s against {base['seconds']:.4f}s ({slower:+.0%}, allowed {threshold:+.0%})"
+            )
+    return regressions
+
+
+def report(results: dict) -> Sequence[str]:
+    """Return one formatted line per measurement."""
+    return [
+        f"{name:<32} {m['seconds']:>10.4f}s {m['rate']:>14,.0f} ops/s"
+        for name, m in sorted(results["results"].items())
+    ]
@@ -0,0 +1,602 @@
+"""Streaming tar+zstd bundles used to ship a Trapper Keeper to a new system.
+
+Members are streamed from their source files through ``tarfile`` into a multithreaded zstd
+compressor, and back out of the decompressor into their destination files, one chunk at a time.
+Nothing is staged in a temporary directory and no file is ever held in memory whole.
+
+A manifest with the size and SHA-256 of every member is written as the last member of the bundle.
+Unpacking writes each member to a ``.part`` file next to its destination and only moves them into
+place once every checksum matched.
+
+Incremental bundles (manifest version 3) split members into content-defined chunks instead and
+carry only the chunks the `ShippedChunks` ledger of their destination has not recorded yet.  A
+Keepass database is re-encrypted with fresh seeds on every save, so its decrypted payload is
+chunked rather than the file, and re-encrypted on unpack with the credentials shipped next to it.
+Those credentials are always shipped whole, they are never chunked or recorded.  Unpacking a base
+bundle followed by its deltas rebuilds the members from the chunks of all of them, collected in a
+private temporary folder that is removed once the members are in place.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import tarfile
+import tempfile
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+MANIFEST_NAME: str = ".trapper_keeper.manifest.json"
+MANIFEST_VERSION: int = 1
+CHUNK_SIZE: int = 1024 * 1024
+# zstd level 3 is the zstd default; threads=-1 uses one worker per CPU
+COMPRESSION_LEVEL: int = 3
+COMPRESSION_THREADS: int = -1
+
+DELTA_MANIFEST_VERSION: int = 3
+# version 2 chunked every member whole, credentials and database ciphertext included
+DELTA_MANIFEST_VERSIONS: frozenset[int] = frozenset({2, DELTA_MANIFEST_VERSION})
+CHUNK_DIR: str = "chunks"
+SHIPPED_DIR: str = "shipped"
+DEFAULT_DESTINATION: str = "default"
+# how a delta manifest stores a member
+INLINE: str = "file"
+CHUNKED: str = "chunks"
+KEEPASS: str = "keepass"
+# content-defined chunk bounds, the average must be a power of two
+CHUNK_MIN: int = 2 * 1024
+CHUNK_AVG: int = 8 * 1024
+CHUNK_MAX: int = 64 * 1024
+# gear table of the rolling hash, seeded so every version cuts at the same points
+_GEAR: tuple[int, ...] = tuple(map(random.Random(0x746B).getrandbits, [64] * 256))
+_MASK64: int = (1 << 64) - 1
+
+
+def _zstd():
+    """Import zstandard lazily, it is only needed to pack and unpack."""
+    try:
+        import zstandard  # noqa: PLC0415 - only pack and unpack need it
+    except ImportError as exc:  # pragma: no cover - depends on the environment
+        raise RuntimeError("Bundles require the zstandard package") from exc
+    return zstandard
+
+
+@dataclass
+class BundleStats:
+    """Counters describing one pack or unpack run."""
+
+    files: int = 0
+    bytes_raw: int = 0
+    bytes_compressed: int = 0
+    seconds: float = 0.0
+    chunks_sent: int = 0
+    chunks_reused: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """Return the uncompressed throughput in MiB/s."""
+        return self.bytes_raw / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+    def report(self, action: str) -> str:
+        """Return a one line summary of the run."""
+        ratio = self.bytes_raw / self.bytes_compressed if self.bytes_compressed else 0.0
+        report = (
+            f"{action} {self.files} files, {self.bytes_raw} bytes ({self.bytes_compressed} compressed, "
+            f"{ratio:.2f}x) in {self.seconds:.3f}s at {self.throughput:.1f} MiB/s"
+        )
+        if self.chunks_sent or self.chunks_reused:
+            report += f", {self.chunks_sent} chunks shipped, {self.chunks_reused} reused"
+        return report
+
+
+def default_shipped_dir() -> Path:
+    """Return the folder of the `ShippedChunks` ledgers under ``$XDG_CACHE_HOME``."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "trapper_keeper" / SHIPPED_DIR
+
+
+class ShippedChunks:
+    """The digests of the chunks already shipped to one destination.
+
+    Only digests are recorded, never chunk data.  Every destination has its own ledger, so a bundle
+    packed for one host never leaves out a chunk only another host received.  Removing the ledger
+    makes the next incremental bundle a complete base bundle again.
+    """
+
+    def __init__(self, destination: str = DEFAULT_DESTINATION, root: Path | None = None):
+        """Load the ledger of ``destination`` from ``root``, defaulting to `default_shipped_dir`.
+
+        Raises:
+            ValueError: If ``destination`` is not a plain file name.
+        """
+        if not destination or destination.startswith(".") or Path(destination).name != destination:
+            raise ValueError(f"Invalid destination {destination!r}, expected a plain name")
+        self.path = Path(root or default_shipped_dir()) / f"{destination}.json"
+        self.digests: set[str] = set(json.loads(self.path.read_bytes())["chunks"]) if self.path.is_file() else set()
+
+    def __contains__(self, digest: object) -> bool:
+        """Return True if the chunk was shipped to this destination."""
+        return digest in self.digests
+
+    def save(self, digests: Iterable[str]) -> None:
+        """Record ``digests`` as shipped and replace the ledger file."""
+        self.digests.update(digests)
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.part")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as out:
+            json.dump({"chunks": sorted(self.digests)}, out)
+        tmp.replace(self.path)
+
+
+class ChunkCache:
+    """Content-addressed store of chunks, one file per SHA-256 digest.
+
+    Chunks hold plain member data, so the folders are created 0700 and the files 0600.
+    """
+
+    def __init__(self, root: Path):
+        """Initialize the cache at ``root``."""
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def __contains__(self, digest: object) -> bool:
+        """Return True if the chunk is cached."""
+        return isinstance(digest, str) and self._path(digest).is_file()
+
+    def put(self, data: bytes, digest: str | None = None) -> str:
+        """Store a chunk unless it is already cached.
+
+        Args:
+            data (bytes): The chunk.
+            digest (str | None): The expected SHA-256, checked when given.
+
+        Returns:
+            str: The chunk digest.
+
+        Raises:
+            ValueError: If ``data`` does not match ``digest``.
+        """
+        actual = hashlib.sha256(data).hexdigest()
+        if digest is not None and digest != actual:
+            raise ValueError(f"Checksum mismatch for chunk {digest}")
+        path = self._path(actual)
+        if not path.is_file():
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            tmp = path.with_name(f"{actual}.part")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            tmp.replace(path)
+        return actual
+
+    def get(self, digest: str) -> bytes:
+        """Return a cached chunk.
+
+        Raises:
+            KeyError: If the chunk is not cached.
+        """
+        try:
+            return self._path(digest).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+
+def _cut_point(buf: bytes | bytearray, start: int, end: int, mask: int) -> int:
+    """Return where the chunk starting at ``start`` ends, using a gear rolling hash."""
+    i = start + CHUNK_MIN
+    if i >= end:
+        return end
+    h = 0
+    for i in range(start + CHUNK_MIN, end):
+        h = ((h << 1) + _GEAR[buf[i]]) & _MASK64
+        if not h & mask:
+            return i + 1
+    return end
+
+
+def iter_chunks(fileobj) -> Iterator[bytes]:
+    """Split a stream into content-defined chunks.
+
+    Cut points depend only on the bytes around them, so an edit only changes the chunks it touches
+    and the chunks before and after it stay identical between versions of a file.
+
+    Args:
+        fileobj: A binary file object.
+
+    Yields:
+        bytes: Chunks of ``CHUNK_MIN`` to ``CHUNK_MAX`` bytes, the last one possibly shorter.
+    """
+    # test the top bits, which depend on the last 64 bytes, the low bits only on the last few
+    mask = (CHUNK_AVG - 1) << (64 - CHUNK_AVG.bit_length() + 1)
+    pending = b""
+    while True:
+        data = fileobj.read(CHUNK_SIZE)
+        pending += data
+        start = 0
+        while len(pending) - start >= CHUNK_MAX or (not data and start < len(pending)):
+            cut = _cut_point(pending, start, min(len(pending), start + CHUNK_MAX), mask)
+            yield pending[start:cut]
+            start = cut
+        pending = pending[start:]
+        if not data:
+            return
+
+
+class _HashingReader(io.RawIOBase):
+    """File wrapper that hashes everything read through it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+@contextlib.contextmanager
+def _tar_writer(out_file: Path, level: int, threads: int) -> Iterator[tarfile.TarFile]:
+    """Open a streaming tar writer on top of a multithreaded zstd compressor."""
+    compressor = _zstd().ZstdCompressor(level=level, threads=threads)
+    with (
+        open(out_file, "wb") as raw,
+        compressor.stream_writer(raw, closefd=False) as writer,
+        tarfile.open(fileobj=writer, mode="w|", bufsize=CHUNK_SIZE) as tar,
+    ):
+        yield tar
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    """Add an in-memory member to a tar stream."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_file(tar: tarfile.TarFile, name: str, src: Path) -> dict:
+    """Stream a file into a tar stream, returning its size and SHA-256."""
+    info = tar.gettarinfo(src, arcname=name)
+    with open(src, "rb") as fileobj:
+        reader = _HashingReader(fileobj)
+        tar.addfile(info, reader)
+    return {"size": reader.size, "sha256": reader.digest.hexdigest()}
+
+
+def _manifest(version: int, files: dict[str, dict]) -> bytes:
+    return json.dumps({"version": version, "files": files}, indent=2).encode()
+
+
+def write_bundle(
+    out_file: Path,
+    members: Iterable[tuple[str, Path]],
+    level: int = COMPRESSION_LEVEL,
+    threads: int = COMPRESSION_THREADS,
+) -> BundleStats:
+    """Stream files into a tar+zstd bundle.
+
+    Args:
+        out_file (Path): The bundle to write.
+        members (Iterable[tuple[str, Path]]): ``(name in bundle, source file)`` pairs.
+        level (int, optional): The zstd compression level. Defaults to 3.
+        threads (int, optional): The zstd worker threads, -1 for one per CPU. Defaults to -1.
+
+    Returns:
+        BundleStats: What was written.
+    """
+    stats = BundleStats()
+    start = time.perf_counter()
+    manifest: dict[str, dict] = {}
+    with _tar_writer(out_file, level, threads) as tar:
+        for name, src in members:
+            manifest[name] = _add_file(tar, name, src)
+            stats.files += 1
+            stats.bytes_raw += manifest[name]["size"]
+        _add_bytes(tar, MANIFEST_NAME, _manifest(MANIFEST_VERSION, manifest))
+    stats.bytes_compressed = Path(out_file).stat().st_size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+@dataclass
+class _DeltaWriter:
+    """Adds the chunks of an incremental bundle that its destination has not received yet."""
+
+    tar: tarfile.TarFile
+    shipped: ShippedChunks
+    stats: BundleStats
+    sent: set[str] = field(default_factory=set)
+
+    def add(self, chunks: Iterable[bytes], content) -> tuple[list[str], int]:
+        """Ship the new ``chunks``, feeding every chunk to the ``content`` hash.
+
+        Returns:
+            tuple[list[str], int]: The digest of every chunk, in order, and their total size.
+        """
+        digests: list[str] = []
+        size = 0
+        for chunk in chunks:
+            content.update(chunk)
+            size += len(chunk)
+            digest = hashlib.sha256(chunk).hexdigest()
+            if digest in self.sent:
+                pass
+            elif digest in self.shipped:
+                self.stats.chunks_reused += 1
+            else:
+                _add_bytes(self.tar, f"{CHUNK_DIR}/{digest}", chunk)
+                self.sent.add(digest)
+            digests.append(digest)
+        return digests, size
+
+
+def _keepass_member(writer: _DeltaWriter, sources: Mapping[str, Path], name: str, credentials: tuple[str, str | None]) -> dict:
+    """Ship the payload chunks of a Keepass database, returning its manifest entry."""
+    from trapper_keeper.stores.keepass_store import read_kp_payload  # noqa: PLC0415 - backends load on first use
+
+    token, key = credentials
+    missing = [member for member in credentials if member is not None and member not in sources]
+    if missing:
+        raise ValueError(f"{name} needs {', '.join(missing)} in the same bundle")
+    xml, binaries = read_kp_payload(sources[name], sources[token], sources[key] if key else None)
+    content = hashlib.sha256()
+    xml_chunks, size = writer.add(iter_chunks(io.BytesIO(xml)), content)
+    binary_chunks: list[list[str]] = []
+    for data in binaries:
+        chunks, binary_size = writer.add(iter_chunks(io.BytesIO(data)), content)
+        binary_chunks.append(chunks)
+        size += binary_size
+    return {
+        "kind": KEEPASS,
+        "size": size,
+        "sha256": content.hexdigest(),
+        "xml": xml_chunks,
+        "binaries": binary_chunks,
+        "token": token,
+        "key": key,
+    }
+
+
+def write_delta_bundle(  # noqa: PLR0913 - the write_bundle options plus the destination state
+    out_file: Path,
+    members: Iterable[tuple[str, Path]],
+    shipped: ShippedChunks,
+    databases: Mapping[str, tuple[str, str | None]] | None = None,
+    *,
+    level: int = COMPRESSION_LEVEL,
+    threads: int = COMPRESSION_THREADS,
+) -> BundleStats:
+    """Write an incremental bundle that ships only the chunks ``shipped`` has not recorded.
+
+    Databases ship the chunks of their decrypted payload and their token and key files ship whole.
+    Every chunk written is recorded in ``shipped`` once the bundle is complete, so the next bundle
+    for the same destination only carries what changed since.  The first bundle written against an
+    empty ledger is a complete base bundle.
+
+    Args:
+        out_file (Path): The bundle to write.
+        members (Iterable[tuple[str, Path]]): ``(name in bundle, source file)`` pairs.
+        shipped (ShippedChunks): The chunks already shipped to the destination.
+        databases (Mapping[str, tuple[str, str | None]] | None, optional): Keepass database members
+            mapped to the names of their token and key members. Defaults to None.
+        level (int, optional): The zstd compression level. Defaults to 3.
+        threads (int, optional): The zstd worker threads, -1 for one per CPU. Defaults to -1.
+
+    Returns:
+        BundleStats: What was written.
+
+    Raises:
+        ValueError: If the token or key of a database is not a member.
+    """
+    databases = databases or {}
+    credentials = {member for pair in databases.values() for member in pair if member is not None}
+    sources = dict(members)
+    stats = BundleStats()
+    start = time.perf_counter()
+    manifest: dict[str, dict] = {}
+    with _tar_writer(out_file, level, threads) as tar:
+        writer = _DeltaWriter(tar, shipped, stats)
+        for name, src in sources.items():
+            if name in credentials:
+                manifest[name] = {"kind": INLINE, **_add_file(tar, name, src)}
+            elif name in databases:
+                manifest[name] = _keepass_member(writer, sources, name, databases[name])
+            else:
+                content = hashlib.sha256()
+                with open(src, "rb") as fileobj:
+                    chunks, size = writer.add(iter_chunks(fileobj), content)
+                manifest[name] = {"kind": CHUNKED, "size": size, "sha256": content.hexdigest(), "chunks": chunks}
+            stats.files += 1
+            stats.bytes_raw += manifest[name]["size"]
+        _add_bytes(tar, MANIFEST_NAME, _manifest(DELTA_MANIFEST_VERSION, manifest))
+    shipped.save(writer.sent)
+    stats.chunks_sent = len(writer.sent)
+    stats.bytes_compressed = Path(out_file).stat().st_size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+@dataclass
+class _Unpacker:
+    """The members written so far while a base bundle and its deltas are unpacked."""
+
+    targets: Mapping[str, Path]
+    mode: int
+    stack: contextlib.ExitStack
+    # member name -> (part file, sha256, size)
+    written: dict[str, tuple[Path, str, int]] = field(default_factory=dict)
+    parts: list[Path] = field(default_factory=list)
+    cache: ChunkCache | None = None
+
+    def part(self, name: str) -> Path:
+        """Return the part file written before a member is moved into place, remembering it for cleanup."""
+        dest = self.targets[name]
+        part = dest.with_name(f"{dest.name}.part")
+        self.parts.append(part)
+        return part
+
+    def read(self, bundle: Path, stats: BundleStats) -> dict | None:
+        """Write the targeted members of one bundle to their part files and collect its chunks.
+
+        Returns:
+            dict | None: The manifest of the bundle.
+        """
+        manifest = None
+        with (
+            open(bundle, "rb") as raw,
+            _zstd().ZstdDecompressor().stream_reader(raw, closefd=False) as reader,
+            tarfile.open(fileobj=reader, mode="r|", bufsize=CHUNK_SIZE) as tar,
+        ):
+            for info in tar:
+                if not info.isfile():
+                    continue
+                if info.name == MANIFEST_NAME:
+                    manifest = json.loads(tar.extractfile(info).read())
+                elif info.name.startswith(f"{CHUNK_DIR}/"):
+                    if self.cache is None:
+                        # chunks are plain member data, kept in a 0700 folder only until the members are rebuilt
+                        self.cache = ChunkCache(
+                            Path(self.stack.enter_context(tempfile.TemporaryDirectory(prefix="tk-chunks-")))
+                        )
+                    self.cache.put(tar.extractfile(info).read(), info.name.rpartition("/")[2])
+                    stats.chunks_sent += 1
+                elif info.name in self.targets:
+                    fileobj = tar.extractfile(info)
+                    part = self.part(info.name)
+                    digest, size = _write_part(part, iter(lambda f=fileobj: f.read(CHUNK_SIZE), b""), self.mode)
+                    self.written[info.name] = (part, digest, size)
+        stats.bytes_compressed += bundle.stat().st_size
+        return manifest
+
+    def chunks(self, name: str, digests: Iterable[str]) -> Iterator[bytes]:
+        """Yield the chunks of a member from the collected chunks."""
+        for digest in digests:
+            if self.cache is None or digest not in self.cache:
+                raise ValueError(f"Chunk {digest} of {name} is missing, unpack the base bundle together with every delta")
+            yield self.cache.get(digest)
+
+    def rebuild(self, files: Mapping[str, dict]) -> None:
+        """Rebuild the targeted members a delta manifest lists as chunks."""
+        for name in self.targets:
+            expected = files.get(name)
+            kind = expected.get("kind", CHUNKED) if expected else None
+            if kind == CHUNKED:
+                part = self.part(name)
+                self.written[name] = (part, *_write_part(part, self.chunks(name, expected["chunks"]), self.mode))
+            elif kind == KEEPASS:
+                self.rebuild_keepass(name, expected)
+
+    def rebuild_keepass(self, name: str, expected: dict) -> None:
+        """Verify the payload chunks of a database and encrypt them with its unpacked credentials.
+
+        Raises:
+            ValueError: If a credential or chunk is missing or the payload checksum does not match.
+        """
+        from trapper_keeper.stores.keepass_store import write_kp_payload  # noqa: PLC0415 - backends load on first use
+
+        credentials: list[Path | None] = []
+        for member in (expected["token"], expected["key"]):
+            if member is not None and member not in self.written:
+                raise ValueError(f"{name} needs {member}, unpack them together")
+            credentials.append(self.written[member][0] if member is not None else None)
+        xml = b"".join(self.chunks(name, expected["xml"]))
+        binaries = [b"".join(self.chunks(name, chunks)) for chunks in expected["binaries"]]
+        content = hashlib.sha256(xml)
+        for data in binaries:
+            content.update(data)
+        size = len(xml) + sum(map(len, binaries))
+        if content.hexdigest() != expected["sha256"] or size != expected["size"]:
+            raise ValueError(f"Checksum mismatch for the payload of {name}")
+        part = self.part(name)
+        write_kp_payload(part, credentials[0], credentials[1], xml, binaries)
+        part.chmod(self.mode)
+        self.written[name] = (part, content.hexdigest(), size)
+
+
+def read_bundle(
+    in_file: Path,
+    targets: Mapping[str, Path],
+    mode: int = 0o600,
+    deltas: Iterable[Path] = (),
+) -> BundleStats:
+    """Stream the members named in ``targets`` out of a bundle and verify them against its manifest.
+
+    Members that are not in ``targets`` are skipped without being written.  For incremental bundles
+    the chunks of ``in_file`` and every delta are collected in a private temporary folder and the
+    members are rebuilt from the manifest of the last delta.
+
+    Args:
+        in_file (Path): The bundle to read, or the base bundle of ``deltas``.
+        targets (Mapping[str, Path]): Bundle member names mapped to their destination files.
+        mode (int, optional): The permissions of the written files. Defaults to 0o600.
+        deltas (Iterable[Path], optional): Incremental bundles to apply on top of ``in_file``, oldest first.
+
+    Returns:
+        BundleStats: What was read.
+
+    Raises:
+        ValueError: If the manifest is missing, a member or chunk is missing or a checksum does not match.
+    """
+    stats = BundleStats()
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        unpacker = _Unpacker(targets, mode, stack)
+        try:
+            manifest: dict | None = None
+            for bundle in (Path(in_file), *map(Path, deltas)):
+                manifest = unpacker.read(bundle, stats) or manifest
+            if manifest is None:
+                raise ValueError(f"{in_file} has no manifest, it was not written by this version of trapper-keeper")
+            if manifest.get("version") in DELTA_MANIFEST_VERSIONS:
+                unpacker.rebuild(manifest["files"])
+
+            for name in targets:
+                expected = manifest["files"].get(name)
+                if expected is None or name not in unpacker.written:
+                    raise ValueError(f"{name} is missing from {in_file}")
+                _, digest, size = unpacker.written[name]
+                if digest != expected["sha256"] or size != expected["size"]:
+                    raise ValueError(f"Checksum mismatch for {name} in {in_file}")
+        except BaseException:
+            for part in unpacker.parts:
+                with contextlib.suppress(FileNotFoundError):
+                    part.unlink()
+            raise
+
+    for name, (part, _, size) in unpacker.written.items():
+        part.replace(targets[name])
+        stats.files += 1
+        stats.bytes_raw += size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _write_part(part: Path, chunks: Iterable[bytes], mode: int) -> tuple[str, int]:
+    """Write ``chunks`` to ``part`` one at a time, returning its SHA-256 and size."""
+    digest = hashlib.sha256()
+    size = 0
+    fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "wb") as out:
+        for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    return digest.hexdigest(), size
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import os
 import subprocess
 import tempfile
@@ -12,8 +14,12 @@ from homeops_utils import file
 from homeops_utils.file import pathify
 from resources.configs.tk_conf import TgtSettings, TkSettings
 
+from . import bench, tracing
+from .agent import IDLE_TIMEOUT, AgentClient, KeepassAgent
+from .bundle import DEFAULT_DESTINATION, ShippedChunks, read_bundle, write_bundle, write_delta_bundle
 from .keegen import gen_passphrase, gen_utf8
-from .stores.keepass_store import view_kp_db
+from .migrate import CHECKPOINT_SUFFIX, DEFAULT_BATCH_SIZE, bolt_writer, migrate, store_writer
+from .provision import PROVISION_GROUP, provision, read_hosts
 from .tk import DbTypes, get_store
 
 
@@ -50,7 +56,7 @@ class TrapperKeeper:
     update(key: str, value: str):
         Update a key/value pair in the Trapper Keeper.
 
-    unpack():
+    unpack(src_file: str, view: bool = False):
         Unpack the Trapper Keeper.
 
     passphrase(length: int = 5):
@@ -59,31 +65,68 @@ class TrapperKeeper:
     gen_key(file: str, length: int = 64):
         Generate a random key.
 
-    pack():
+    pack(incremental: bool = False, destination: str = "default", view: bool = False):
         Pack the Trapper Keeper.
+
+    merge(src_db: str, src_token: str):
+        Merge the bootstrap entries of another database by UUID.
+
+    provision(hosts: str):
+        Generate and store credentials for every host in a hosts file.
+
+    agent(idle_timeout: int = 900):
+        Keep the bootstrap database unlocked for later calls.
+
+    agent_stop():
+        Stop the running agent.
+
+    migrate(to: str, --from: str):
+        Stream the records of one store type into another.
+
+    view(group: str | None = None, limit: int | None = None, fmt: str = "text"):
+        List the bootstrap entries matching a filter, a page at a time.
+
+    catalog(query: str | None = None):
+        Refresh and search the metadata catalog of the bootstrap database.
+
+    benchmark(sizes: str = "1000,10000,100000", baseline: str | None = None):
+        Benchmark the stores and key generation, failing on regressions against a baseline.
+
+    profile(command: str, *args, **kwargs):
+        Run another command and print where its time went.
     """
 
-    def __init__(self):
+    def __init__(self, trace: str | None = None):
         """Initialize the Trapper Keeper CLI.
 
-        Settings will either be loaded or generated if they do not exist.
+        Settings will either be loaded or generated if they do not exist, on first use.
+
+        Args:
+            trace (str | None): Write timing spans to this file, a Chrome trace if it ends in ``.json``
+                and JSON lines otherwise. Defaults to ``$TK_TRACE``.
         """
-        self.settings: TkSettings = TkSettings.get_instance(
-            "trapper_keeper", xdg_config=True, auto_create=True
-        )
+        if trace:
+            tracing.enable(Path(trace))
+
+    @functools.cached_property
+    def settings(self) -> TkSettings:
+        """The trapper_keeper settings, loaded by the first command that needs them."""
+        return TkSettings.get_instance("trapper_keeper", xdg_config=True, auto_create=True)
 
     def backup(self):
         """Backup Trapper Keeper."""
 
-    def unpack(self, src_file: Path):
-        """Unpack Trapper Keeper."""
-        # Create a random folder in the system temp folder
-        temp_dir = tempfile.mkdtemp()
-        os.chdir(temp_dir)
+    def unpack(self, src_file: Path, *deltas: Path, view: bool = False):
+        """Unpack Trapper Keeper.
 
-        # Unpack the files
-        file.unpack(in_file=src_file, out_dir=Path(temp_dir))
+        The bundle is streamed straight into the configured db, token and key files, which are only
+        moved into place once their checksums match the bundle manifest.
 
+        Args:
+            src_file (Path): The bundle, or the base bundle of an incremental chain.
+            *deltas (Path): Incremental bundles packed after ``src_file``, oldest first.
+            view (bool): List the unpacked entries, without passwords. Defaults to False.
+        """
         db, token, key = pathify(
             self.settings.get("db"),
             self.settings.get("token"),
@@ -91,29 +134,26 @@ class TrapperKeeper:
         )
         if db.exists() or token.exists() or key.exists():
             raise Exception("Files already exist. Please remove them before unpacking.")
+        for parent in {db.parent, token.parent, key.parent}:
+            parent.mkdir(mode=int(self.settings.get("user_dir_mode")), exist_ok=True, parents=True)
 
-        src_db, src_token, src_key = pathify(
-            f"{temp_dir}/{db.name}",
-            f"{temp_dir}/{token.name}",
-            f"{temp_dir}/{key.name}",
-        )
-
-        with (
-            src_db.open("rb") as src_db,
-            src_token.open("rb") as src_token,
-            src_key.open("rb") as src_key,
-        ):
-            db.write_bytes(src_db.read())
-            token.write_bytes(src_token.read())
-            key.write_bytes(src_key.read())
-
-        view_kp_db(
-            fp_kp_db=Path(self.settings.get("db")),
-            fp_token=Path(self.settings.get("token")),
-            fp_key=Path(self.settings.get("key")),
-        )
-
-    def pack(self, sync: bool = False):
+        with tracing.span("bundle.unpack", deltas=len(deltas)) as traced:
+            stats = read_bundle(
+                Path(src_file), {db.name: db, token.name: token, key.name: key}, deltas=[Path(d) for d in deltas]
+            )
+            traced.set(bytes=stats.bytes_raw, compressed=stats.bytes_compressed)
+        print(stats.report("Unpacked"))
+        if view:
+            self._view(db, token, key)
+
+    def pack(
+        self,
+        *,
+        sync: bool = False,
+        incremental: bool = False,
+        view: bool = False,
+        destination: str = DEFAULT_DESTINATION,
+    ):
         """Pack the Trapper Keeper.
 
         This method creates a temporary directory, generates necessary keys and tokens,
@@ -121,6 +161,11 @@ class TrapperKeeper:
 
         Args:
             sync (bool): Sync the packed file back to the bootstrap database. Defaults to False.
+            incremental (bool): Only ship the chunks no earlier incremental pack for ``destination`` has
+                shipped. The token and key are always shipped whole. Defaults to False.
+            view (bool): List the packed entries, without passwords. Defaults to False.
+            destination (str): The host the incremental bundles are unpacked on, each keeps its own
+                record of the chunks it received. Defaults to "default".
         """
         # Create a random folder in the system temp folder
         temp_dir = tempfile.mkdtemp()
@@ -157,13 +202,19 @@ class TrapperKeeper:
             tgt_store.copy_bootstrap_entries(src_store)
 
         pack_dir = Path(temp_dir)
-        file.pack(src_dir=pack_dir, out_file=pack_dir / "trapper_keeper.zst")
-        view_kp_db(
-            fp_kp_db=Path(tgt_settings.get("db")),
-            fp_token=Path(tgt_settings.get("token")),
-            fp_key=Path(tgt_settings.get("key")),
-        )
-        print(f"Trapper Keeper packed to {pack_dir / 'trapper_keeper.zst'}")
+        pack_file = pack_dir / ("trapper_keeper.delta.zst" if incremental else "trapper_keeper.zst")
+        members = [(Path(tgt_settings.get(name)).name, Path(tgt_settings.get(name))) for name in ("db", "token", "key")]
+        with tracing.span("bundle.pack", incremental=incremental) as traced:
+            if incremental:
+                (db, _), (token, _), (key, _) = members
+                stats = write_delta_bundle(pack_file, members, ShippedChunks(destination), {db: (token, key)})
+            else:
+                stats = write_bundle(pack_file, members)
+            traced.set(bytes=stats.bytes_raw, compressed=stats.bytes_compressed)
+        print(stats.report("Packed"))
+        if view:
+            self._view(*pathify(tgt_settings.get("db"), tgt_settings.get("token"), tgt_settings.get("key")))
+        print(f"Trapper Keeper packed to {pack_file}")
 
         if sync:
             print("Syncing back to bootstrap db")
@@ -189,9 +240,9 @@ class TrapperKeeper:
       with (
           get_store(
               DbTypes.KP,
-              fp_kp_db=self.fp_kp_db,
-              fp_token=self.fp_token,
-              fp_key=self.fp_key,
+              fp_kp_db=fp_kp_db,
+              fp_token=fp_token,
+              fp_key=fp_key,
           ) as src_store,
           get_store(
               DbTypes.KP,
@@ -200,7 +251,7 @@ class TrapperKeeper:
               fp_key=None,
           ) as tgt_store,
       ):
-          tgt_store.copy_bootstrap_entries(src_store, invert=True)
+          print(tgt_store.copy_bootstrap_entries(src_store).diff())
 
 
     @staticmethod
@@ -236,41 +287,373 @@ class TrapperKeeper:
         else:
             print(_fp_token)
 
-    def export_attachment_from_origin(
-        self, entry_path: str, attachment_name: str, export_file: Path
-    ):
-        """Get a binary from Trapper Keeper.
+    def export_attachment_from_origin(self, entry_path: str, attachment_name: str, export_file: Path):
+        """Export one attachment of the origin database, see `export_attachments_from_origin`.
 
         Args:
             entry_path (str): The path to the entry in the KeePass database.
             attachment_name (str): The name of the attachment to export.
             export_file (Path): The file path to save the exported attachment.
         """
-        # Prompt for a password
-        password = Path(self.settings.get("src_token")).read_text("utf-8")
+        self.export_attachments_from_origin(f"{entry_path}/{attachment_name}={export_file}")
+
+    def export_attachments_from_origin(self, *exports: str):
+        """Export many attachments of the origin database with a single unlock.
+
+        Without a YubiKey the database is opened in process and the files are written in parallel.
+        A YubiKey challenge needs keepassxc-cli, so every export then runs in one ``keepassxc-cli open``
+        session instead of one process per attachment.
 
-        # Define the command to open the Keepass database
+        Args:
+            *exports (str): ``<entry path>/<attachment name>=<export file>`` specifications.
+        """
+        triples = []
+        for spec in exports:
+            source, sep, export_file = spec.rpartition("=")
+            entry_path, _, attachment_name = source.rpartition("/")
+            if not sep or not entry_path or not attachment_name:
+                raise ValueError(f"Expected <entry path>/<attachment name>=<export file>, got {spec!r}")
+            triples.append((entry_path, attachment_name, Path(export_file).expanduser()))
+
+        from .stores.keepass_export import export_attachments  # noqa: PLC0415 - backends load on first use
+
+        if self.settings.get("src_yubikey_slot"):
+            self._export_attachments_keepassxc(triples)
+            return
+        with get_store(
+            DbTypes.KP,
+            fp_kp_db=Path(self.settings.get("src_db")),
+            fp_token=Path(self.settings.get("src_token")),
+            fp_key=Path(self.settings.get("src_key")) if self.settings.get("src_key") else None,
+        ) as src_store:
+            print(export_attachments(src_store, triples).report("Exported"))
+
+    def _export_attachments_keepassxc(self, triples: list[tuple[str, str, Path]]):
+        """Run every attachment export through one unlocked ``keepassxc-cli open`` shell."""
+        password = Path(self.settings.get("src_token")).read_text("utf-8")
         command = [
             "keepassxc-cli",
-            "attachment-export",
+            "open",
             "--key-file",
             self.settings.get("src_key"),
             "--yubikey",
             f"{self.settings.get('src_yubikey_slot')}:{self.settings.get('src_yubikey_serial')}",
             self.settings.get("src_db"),
-            entry_path,
-            attachment_name,
-            export_file,
         ]
+        lines = [password.rstrip("\r\n")]
+        for entry_path, attachment_name, export_file in triples:
+            # a file left from an earlier run would hide a failed export
+            export_file.unlink(missing_ok=True)
+            args = (entry_path, attachment_name, str(export_file))
+            lines.append("attachment-export " + " ".join('"{}"'.format(arg.replace('"', '\\"')) for arg in args))
+        lines.append("quit")
+        process = subprocess.run(command, input="\n".join(lines) + "\n", capture_output=True, text=True, check=False)
+        failed = [f"{e}/{a}" for e, a, export_file in triples if not export_file.exists()]
+        if process.returncode != 0 or failed:
+            raise RuntimeError(f"keepassxc-cli could not export {', '.join(failed) or 'the attachments'}: {process.stderr}")
+        for _, _, export_file in triples:
+            export_file.chmod(0o600)
+        print(f"Exported {len(triples)} attachments")
+
+    def merge(  # noqa: PLR0913 - every option is a command line flag
+        self,
+        src_db: str,
+        src_token: str,
+        src_key: str | None = None,
+        *,
+        policy: str = "newer",
+        delete: bool = False,
+        dry_run: bool = False,
+    ):
+        """Merge the bootstrap entries of another database into the bootstrap database.
+
+        Entries are paired by UUID, so merging the same database again only applies what changed.
+
+        Args:
+            src_db (str): The path to the database merged from.
+            src_token (str): The path to its token file.
+            src_key (str | None): The path to its key file. Defaults to None.
+            policy (str): ``newer``, ``source`` or ``target``, who wins when an entry differs. Defaults to newer.
+            delete (bool): Delete bootstrap entries that are not in the source. Defaults to False.
+            dry_run (bool): Print the changes without applying them. Defaults to False.
+        """
+        with (
+            get_store(
+                DbTypes.KP,
+                fp_kp_db=Path(src_db),
+                fp_token=Path(src_token),
+                fp_key=Path(src_key) if src_key else None,
+            ) as src_store,
+            get_store(
+                DbTypes.KP,
+                fp_kp_db=Path(self.settings.get("bootstrap_db")),
+                fp_token=Path(self.settings.get("bootstrap_token")),
+                fp_key=None,
+            ) as tgt_store,
+        ):
+            plan = tgt_store.copy_bootstrap_entries(src_store, policy=policy, delete=delete, dry_run=dry_run)
+        print(plan.diff())
 
-        # Run the command and pipe the password into stdin
-        process = subprocess.Popen(
-            command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+    def provision(self, hosts: str, workers: int | None = None, group: str = PROVISION_GROUP):
+        """Generate an ed25519 keypair, token and keyfile for every host and store them in one save.
+
+        Args:
+            hosts (str): A file with one host name per line. Blank lines and ``#`` comments are skipped.
+            workers (int | None): Worker processes generating credentials. Defaults to the CPU count.
+            group (str): The group below the bootstrap group receiving one entry per host. Defaults to hosts.
+        """
+        host_names = read_hosts(Path(hosts))
+        with get_store(
+            DbTypes.KP,
+            fp_kp_db=Path(self.settings.get("bootstrap_db")),
+            fp_token=Path(self.settings.get("bootstrap_token")),
+            fp_key=None,
+        ) as store:
+            timings = provision(
+                store,
+                host_names,
+                passphrase_length=self.settings.get("passphrase_length"),
+                key_length=self.settings.get("key_length"),
+                workers=workers,
+                group=group,
+            )
+        total = timings["generate_seconds"] + timings["save_seconds"]
+        print(
+            f"Provisioned {timings['hosts']} hosts in {total:.3f}s "
+            f"(generate {timings['generate_seconds']:.3f}s, save {timings['save_seconds']:.3f}s)"
         )
-        stdout, stderr = process.communicate(input=password.encode())
+
+    def get(self, *titles: str):
+        """Print the passwords of bootstrap entries by title.
+
+        Served by the unlock agent when one is running.
+
+        Args:
+            *titles (str): The entry titles to look up.
+        """
+        with get_store(
+            DbTypes.KP,
+            fp_kp_db=Path(self.settings.get("bootstrap_db")),
+            fp_token=Path(self.settings.get("bootstrap_token")),
+            fp_key=None,
+            agent=True,
+        ) as store:
+            found = store.get_many(titles)
+        for title in titles:
+            print(f"{title}: {found.get(title, '')}")
+
+    def migrate(
+        self, to: str, src: str | None = None, dst: str | None = None, batch_size: int = DEFAULT_BATCH_SIZE, **options
+    ):
+        """Stream every record of one store into another, e.g. ``migrate --from kp --to sqlite``.
+
+        Records move in batches of ``batch_size`` through the bulk API of the target, and each
+        batch is durable before the next is read.  Progress is kept in ``<dst>.migrate.json``, so
+        running the same migration again after an interruption resumes where it stopped.
+
+        Args:
+            to (str): The target store type: ``kp``, ``sqlite``, ``kv`` or ``bolt``.
+            src (str | None): The source file. Defaults to the configured file of its type.
+            dst (str | None): The target file. Defaults to the configured file of its type.
+            batch_size (int): Records per batch. Defaults to 1000.
+            **options: ``--from``, the source store type, and ``--token``, the token of a Keepass
+                file given as ``src`` or ``dst``. Defaults to the bootstrap token.
+        """
+        from .stores.bolt_kvstore import BoltPool  # noqa: PLC0415 - backends load on first use
+
+        src_type, dst_type = DbTypes(options.pop("from")), DbTypes(to)
+        token = Path(options.pop("token", None) or self.settings.get("bootstrap_token"))
+        if options:
+            raise ValueError(f"Unknown options: {', '.join(options)}")
+        src_fp = Path(src) if src else self._store_path(src_type)
+        dst_fp = Path(dst) if dst else self._store_path(dst_type)
+        if not src_fp.exists():
+            raise FileNotFoundError(src_fp)
+        if src_fp.resolve() == dst_fp.resolve():
+            raise ValueError(f"{src_fp} is both the source and the target")
+
+        with contextlib.ExitStack() as stack:
+            match src_type:
+                case DbTypes.KP:
+                    src_store = stack.enter_context(
+                        get_store(DbTypes.KP, fp_kp_db=src_fp, fp_token=token, fp_key=None)
+                    )
+                case _:
+                    src_store = stack.enter_context(get_store(src_type, db_fp=src_fp, readonly=True))
+            match dst_type:
+                case DbTypes.BOLT:
+                    write = bolt_writer(stack.enter_context(BoltPool(dst_fp)))
+                case DbTypes.KP:
+                    dst_store = get_store(DbTypes.KP, fp_kp_db=dst_fp, fp_token=token, fp_key=None)
+                    write = store_writer(stack.enter_context(dst_store))
+                case _:
+                    write = store_writer(stack.enter_context(get_store(dst_type, db_fp=dst_fp, journal=True)))
+            checkpoint = dst_fp.with_name(f"{dst_fp.name}{CHECKPOINT_SUFFIX}")
+            stats = migrate(src_store.scan(), write, dst_type, batch_size=batch_size, checkpoint=(src_fp, checkpoint))
+        print(stats.report())
+
+    def _store_path(self, db_type: DbTypes) -> Path:
+        """Return the configured file of a store type."""
+        setting = {DbTypes.KP: "bootstrap_db", DbTypes.SQLITE: "sqlite_db", DbTypes.BOLT: "bolt_db"}.get(db_type, "kv_db")
+        if not self.settings.get(setting):
+            raise ValueError(f"No {setting} is configured, pass the file explicitly")
+        return Path(self.settings.get(setting))
+
+    @staticmethod
+    def _view(fp_kp_db: Path, fp_token: Path, fp_key: Path | None, query=None, fmt: str = "text") -> int:
+        """Print the entries of a database matching ``query``, see `view_kp_db`."""
+        from .stores.keepass_store import view_kp_db  # noqa: PLC0415 - backends load on first use
+
+        with tracing.span("keepass.view", fmt=fmt) as traced:
+            printed = view_kp_db(fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key, query=query, fmt=fmt)
+            traced.set(entries=printed)
+        return printed
+
+    def view(  # noqa: PLR0913 - every option is a command line flag
+        self,
+        group: str | None = None,
+        *,
+        title: str | None = None,
+        tag: str | None = None,
+        prop: str | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+        fmt: str = "text",
+        attachments: bool = False,
+    ):
+        """List the entries of the bootstrap database, without passwords.
+
+        Entries are printed as they are found, so ``--limit`` stops the walk early.  Attachments are
+        listed by name, and only with ``--attachments`` are their bytes loaded to show size and digest.
+
+        Args:
+            group (str | None): Only entries under this group path. Defaults to every group.
+            title (str | None): Only entries with this title, or matching this glob. Defaults to None.
+            tag (str | None): Only entries carrying this tag. Defaults to None.
+            prop (str | None): Only entries with this custom property key. Defaults to None.
+            offset (int): Skip this many matching entries. Defaults to 0.
+            limit (int | None): Print at most this many entries. Defaults to all of them.
+            fmt (str): ``text`` or ``jsonl``. Defaults to text.
+            attachments (bool): Show the size and SHA-256 of every attachment. Defaults to False.
+        """
+        from .stores.keepass_index import EntryQuery  # noqa: PLC0415 - backends load on first use
+
+        query = EntryQuery(
+            group=group, title=title, tag=tag, prop=prop, offset=offset, limit=limit, attachments=attachments
+        )
+        self._view(Path(self.settings.get("bootstrap_db")), Path(self.settings.get("bootstrap_token")), None, query, fmt)
+
+    def catalog(self, query: str | None = None, tag: str | None = None, prop: str | None = None, refresh: bool = False):
+        """Search the metadata catalog of the bootstrap database without decrypting it.
+
+        The catalog is a sqlite file next to the bootstrap database holding entry paths, titles,
+        tags, custom property keys and attachment hashes.  It is built on first use and rebuilt with
+        ``--refresh``.
+
+        Args:
+            query (str | None): An FTS5 full text query, used instead of ``tag`` and ``prop``. Defaults to None.
+            tag (str | None): Only entries carrying this tag. Defaults to None.
+            prop (str | None): Only entries with this custom property key. Defaults to None.
+            refresh (bool): Rebuild the catalog from the bootstrap database first. Defaults to False.
+        """
+        fp_kp_db = Path(self.settings.get("bootstrap_db"))
+        fp_catalog = fp_kp_db.with_suffix(".catalog.sqlite")
+        with get_store(DbTypes.SQLITE, db_fp=fp_catalog) as catalog:
+            if refresh or not catalog.execute("SELECT 1 FROM [secrets] LIMIT 1").fetchone():
+                with get_store(
+                    DbTypes.KP,
+                    fp_kp_db=fp_kp_db,
+                    fp_token=Path(self.settings.get("bootstrap_token")),
+                    fp_key=None,
+                ) as kp_store:
+                    counts = catalog.catalog(kp_store)
+                print(f"Catalogued {counts['written']} entries, dropped {counts['deleted']}")
+            rows = catalog.search_secrets(query) if query else catalog.find_secrets(tag=tag, prop=prop)
+        for uuid, path, title in rows:
+            print(f"{uuid}  {path}/{title}")
+
+    @staticmethod
+    def benchmark(  # noqa: PLR0913 - every option is a command line flag
+        sizes: int | str | tuple = bench.SIZES,
+        *,
+        types: str | tuple | None = None,
+        repeat: int = bench.DEFAULT_REPEAT,
+        save: str | None = None,
+        baseline: str | None = None,
+        threshold: float = bench.DEFAULT_THRESHOLD,
+    ):
+        """Benchmark every store type and key generation, e.g. ``benchmark --sizes 1000,10000 --baseline bench.json``.
+
+        Args:
+            sizes (int | str | tuple): Records in each synthetic store. Defaults to 1000,10000,100000.
+            types (str | tuple | None): The store types to run. Defaults to all of them.
+            repeat (int): Runs of every benchmark, the best is kept. Defaults to 3.
+            save (str | None): Write the results to this JSON baseline. Defaults to None.
+            baseline (str | None): Compare the results with this baseline. Defaults to None.
+            threshold (float): The slowdown against ``baseline`` that fails the run. Defaults to 0.25.
+
+        Raises:
+            SystemExit: If a measurement regressed past ``threshold``.
+        """
+        # fire hands comma separated values over as a tuple, a single value as a scalar
+        if isinstance(sizes, int | str):
+            sizes = str(sizes).split(",")
+        if isinstance(types, str):
+            types = types.split(",")
+        sizes = tuple(int(size) for size in sizes)
+        db_types = tuple(DbTypes) if types is None else tuple(DbTypes(t) for t in types)
+        results = bench.run(sizes, db_types, repeat=repeat)
+        print("\n".join(bench.report(results)))
+        if save:
+            bench.save_baseline(results, Path(save))
+        if baseline:
+            regressions = bench.compare(results, bench.load_baseline(Path(baseline)), threshold)
+            if regressions:
+                raise SystemExit("Regressions against {}:\n{}".format(baseline, "\n".join(regressions)))
+            print(f"No regressions against {baseline}")
+
+    def profile(self, command: str, *args, **kwargs):
+        """Run another command with tracing on and print its spans, e.g. ``profile pack --incremental``.
+
+        Args:
+            command (str): The command to run.
+            *args: The positional arguments of the command.
+            **kwargs: The flags of the command.
+        """
+        run = getattr(self, command, None) if not command.startswith("_") and command != "profile" else None
+        if not callable(run):
+            raise ValueError(f"Unknown command: {command}")
+        tracer = tracing.active() or tracing.enable()
+        try:
+            with tracing.span(f"cli.{command}"):
+                run(*args, **kwargs)
+        finally:
+            print("\n".join(tracer.summary()))
+
+    def agent(self, idle_timeout: int = IDLE_TIMEOUT):
+        """Run the unlock agent in the foreground, similar to ssh-agent.
+
+        The bootstrap database is unlocked once and served over a Unix socket to later
+        trapper-keeper calls until the agent has been idle for ``idle_timeout`` seconds.  Only
+        commands reading or writing entries by title, such as ``get``, use it; commands that walk
+        the tree, such as ``pack``, ``merge`` and ``provision``, unlock the database themselves.
+
+        Args:
+            idle_timeout (int): Seconds without requests before the databases are locked. Defaults to 900.
+        """
+        KeepassAgent(idle_timeout=idle_timeout).serve_forever(
+            preload=[(self.settings.get("bootstrap_db"), self.settings.get("bootstrap_token"), None)]
+        )
+
+    @staticmethod
+    def agent_stop():
+        """Stop the running unlock agent."""
+        client = AgentClient()
+        if not client.available():
+            print(f"No agent is listening on {client.sock_path}")
+            return
+        client.call("stop")
+        print("Agent stopped")
 
     def refresh_config(self) -> None:
         """Refresh the configuration settings.
@@ -286,52 +669,30 @@ class TrapperKeeper:
             "trapper_keeper", xdg_config=True, auto_create=True
         )
 
-    def export_bootstrap_kpdb(self, tmp_dir: Path) -> Path:
-        """Export the bootstrap KeePass database.
+    def export_bootstrap_kpdb(self, tmp_dir: Path, fmt: str = "xml") -> Path:
+        """Export the bootstrap KeePass database, decrypted, without keepassxc-cli.
+
+        The file is streamed out of the open database entry by entry and created with 0600 permissions.
 
         Args:
             tmp_dir (Path): The temporary directory to save the exported database.
+            fmt (str): ``xml``, the KeePass 2.x XML keepassxc-cli exports, or ``jsonl``. Defaults to xml.
 
         Returns:
             Path: The path to the exported database file.
         """
-        # Open the new keepass db and print the version
-        # Prompt for a password
-        password = Path(self.settings.get("bootstrap_token")).read_text("utf-8")
+        from .stores.keepass_export import export_kp_db  # noqa: PLC0415 - backends load on first use
 
-        # Define the command to open the Keepass database
-        command = [
-            "keepassxc-cli",
-            "export",
-            "--format",
-            "xml",
-            self.settings.get("bootstrap_db"),
-        ]
-
-        # Run the command and pipe the password into stdin
-        process = subprocess.Popen(
-            command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        stdout, stderr = process.communicate(input=password.encode())
-
-        # Check for errors
-        if process.returncode != 0:
-            print(f"Error opening Keepass database: {stderr.decode()}")
-            raise Exception(f"Error opening Keepass database: {stderr.decode()}")
-
-        # Define the output file path
+        tmp_dir = Path(tmp_dir)
         tmp_dir.mkdir(parents=True, exist_ok=True)
-        output_file = tmp_dir / "bootstrap.xml"
-
-        # Save stdout to the output file
-        with open(output_file, "wb") as f:
-            f.write(stdout)
-
-        # Set file permissions to 0600
-        output_file.chmod(0o600)
+        output_file = tmp_dir / f"bootstrap.{fmt}"
+        with get_store(
+            DbTypes.KP,
+            fp_kp_db=Path(self.settings.get("bootstrap_db")),
+            fp_token=Path(self.settings.get("bootstrap_token")),
+            fp_key=None,
+        ) as store:
+            print(export_kp_db(store, output_file, fmt).report("Exported"))
         return output_file
 
 
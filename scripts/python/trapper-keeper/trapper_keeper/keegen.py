@@ -3,13 +3,19 @@
 Methods from [fauxfactory](https://github.com/omaciel/fauxfactory/tree/master)
 """
 
-import secrets
+import functools
+import hashlib
+import os
 import string
 import unicodedata
+from array import array
 from collections import namedtuple
+from pathlib import Path
 
 from xkcdpass import xkcd_password as xp
 
+from trapper_keeper.tracing import span
+
 # num words
 TOKEN_SIZE: int = 5
 KEY_SIZE: int = 190
@@ -19,6 +25,10 @@ BMP = UnicodePlane(int("0x0000", 16), int("0xffff", 16))
 SMP = UnicodePlane(int("0x10000", 16), int("0x1ffff", 16))
 
 VALID_DELIMITERS: list[str] = [str(i) for i in range(10)]
+PASSPHRASE_SYMBOLS: str = "!@#$%^&*()_+{}|:<>?"
+
+# bump when the layout of the cached letter tables changes
+LETTER_TABLE_VERSION: int = 1
 
 
 def gen_passphrase(length=TOKEN_SIZE):
@@ -27,19 +37,54 @@ def gen_passphrase(length=TOKEN_SIZE):
   :param length: size in words for the generated passphrase + 1
   :return: passphrase with an all caps word and symbol appended to the end
   """
-  wordfile = xp.locate_wordfile()
-  wordlist = xp.generate_wordlist(wordfile, min_length=TOKEN_SIZE, max_length=KEY_SIZE)
-  pass_complexity_chk: str = "".join(
-    [
-      secrets.choice(string.digits),
-      xp.generate_xkcdpassword(wordlist, numwords=1).upper(),
-      secrets.choice("!@#$%^&*()_+{}|:<>?"),
-    ]
-  )
-  passwd: str = xp.generate_xkcdpassword(
-    wordlist, numwords=int(length), random_delimiters=True, valid_delimiters=VALID_DELIMITERS
-  )
-  return f"{passwd}{pass_complexity_chk}"
+  return gen_passphrases(1, length)[0]
+
+
+def gen_passphrases(count, length=TOKEN_SIZE):
+  """Generate ``count`` passphrases like `gen_passphrase` in one pass.
+
+  Every word, delimiter, digit and symbol of the batch is drawn from one bulk read of
+  ``os.urandom`` each, against the memoized wordlist.
+
+  :param int count: number of passphrases
+  :param length: size in words for each passphrase + 1
+  :return: a list of passphrases, each with an all caps word and symbol appended to the end
+  """
+  length = int(length)
+  words = wordlist()
+  with span("keegen.gen_passphrases", count=count, length=length):
+    word_idx = iter(_random_indexes(len(words), count * (length + 1)))
+    delim_idx = iter(_random_indexes(len(VALID_DELIMITERS), count * max(length - 1, 0)))
+    digit_idx = iter(_random_indexes(len(string.digits), count))
+    symbol_idx = iter(_random_indexes(len(PASSPHRASE_SYMBOLS), count))
+    passphrases = []
+    for _ in range(count):
+      passwd = words[next(word_idx)]
+      for _ in range(length - 1):
+        passwd += VALID_DELIMITERS[next(delim_idx)] + words[next(word_idx)]
+      pass_complexity_chk = "".join(
+        [string.digits[next(digit_idx)], words[next(word_idx)].upper(), PASSPHRASE_SYMBOLS[next(symbol_idx)]]
+      )
+      passphrases.append(f"{passwd}{pass_complexity_chk}")
+  return passphrases
+
+
+def wordlist(wordfile=None, min_length=TOKEN_SIZE, max_length=KEY_SIZE):
+  """Return the filtered xkcdpass wordlist, read from disk once per file and length bounds.
+
+  :param wordfile: a wordfile name or path understood by xkcdpass, defaults to its default list
+  :param int min_length: shortest word
+  :param int max_length: longest word
+  :return: the lowercase words, sorted, as a tuple
+  """
+  return _load_wordlist(xp.locate_wordfile(wordfile), min_length, max_length)
+
+
+@functools.cache
+def _load_wordlist(wordfile, min_length, max_length):
+  """Read and filter one wordfile, memoized by its resolved path and the length bounds."""
+  words = xp.generate_wordlist(wordfile, min_length=min_length, max_length=max_length)
+  return tuple(sorted({word.lower() for word in words}))
 
 
 def gen_utf8(length=KEY_SIZE, smp=True, start=None, separator=""):
@@ -58,13 +103,99 @@ def gen_utf8(length=KEY_SIZE, smp=True, start=None, separator=""):
   . _`RFC 3629`: http://www.rfc-editor.org/rfc/rfc3629.txt
 
   """
-  unicode_letters = list(_unicode_letters_generator(smp))
-  output_string = "".join(secrets.choice(unicode_letters) for _ in range(length))
+  output_string = gen_utf8_many(1, length, smp=smp)[0]
 
   if start:
     output_string = f"{start}{separator}{output_string}"[:length]
   return output_string
 
+def gen_utf8_many(count, length=KEY_SIZE, smp=True):
+  """Return ``count`` random strings of UTF-8 letter characters, drawn in one pass.
+
+  :param int count: Number of strings to generate.
+  :param int length: Length of each string.
+  :param bool smp: Include Supplementary Multilingual Plane (SMP)
+      characters
+  :returns: A list of ``count`` random strings.
+  :rtype: list[str]
+  """
+  letters = unicode_letters(smp)
+  with span("keegen.gen_utf8_many", count=count, length=length):
+    output = "".join(letters[i] for i in _random_indexes(len(letters), count * length))
+    return [output[i:i + length] for i in range(0, count * length, length)]
+
+
+def _random_indexes(n, count):
+  """Draw ``count`` uniform indexes below ``n`` from bulk ``os.urandom`` bytes.
+
+  Every draw is a 32-bit word; words at or above the largest multiple of ``n`` are rejected so
+  that ``word % n`` stays unbiased.
+
+  :param int n: Exclusive upper bound.
+  :param int count: Number of indexes.
+  :return: a list of indexes
+  """
+  limit = (1 << 32) // n * n
+  indexes = []
+  while len(indexes) < count:
+    missing = count - len(indexes)
+    # ask for a few extra words so a rejection rarely costs another round
+    words = array("I")
+    words.frombytes(os.urandom((missing + missing // 64 + 8) * words.itemsize))
+    indexes.extend(w % n for w in words if w < limit)
+  return indexes[:count]
+
+
+def _letter_table_path(smp):
+  """Return where the letter table of this interpreter's Unicode version is cached."""
+  cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+  planes = "smp" if smp else "bmp"
+  return Path(cache_home) / "trapper_keeper" / f"letters-v{LETTER_TABLE_VERSION}-{unicodedata.unidata_version}-{planes}.txt"
+
+
+def _letter_table_checksum(letters):
+  """Return the letter count and SHA-256 recorded next to a cached letter table."""
+  return f"{len(letters)} {hashlib.sha256(letters.encode('utf-8')).hexdigest()}\n"
+
+
+def _write_atomic(fp, text):
+  """Replace ``fp`` with ``text`` through a temporary file."""
+  tmp = fp.with_name(f"{fp.name}.{os.getpid()}.tmp")
+  tmp.write_text(text, "utf-8")
+  tmp.replace(fp)
+
+
+@functools.cache
+def unicode_letters(smp=True):
+  """Return every unicode letter as one string, built once per process and cached on disk.
+
+  The table only depends on the Unicode version of the interpreter, which is part of the cache
+  file name.  Keys are drawn from it, so a cached table is only used when its letter count and
+  SHA-256 match the ones recorded next to it, and is rebuilt otherwise.
+
+  :param bool smp: Include Supplementary Multilingual Plane (SMP)
+      characters
+  :return: the letters, in code point order
+  """
+  fp = _letter_table_path(smp)
+  checksum_fp = fp.with_suffix(".sha256")
+  try:
+    letters = fp.read_text("utf-8")
+    if letters and checksum_fp.read_text("utf-8") == _letter_table_checksum(letters):
+      return letters
+  except (OSError, UnicodeDecodeError):
+    pass
+  with span("keegen.unicode_letters", smp=smp):
+    letters = "".join(_unicode_letters_generator(smp))
+  try:
+    fp.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    _write_atomic(fp, letters)
+    _write_atomic(checksum_fp, _letter_table_checksum(letters))
+  except OSError:
+    pass  # the cache is an optimization only
+  return letters
+
+
 def generate_ed25519_key_pair() -> tuple[str, str]:
     """Generate a valid ed25519 SSH key pair."""
     from cryptography.hazmat.primitives import serialization
@@ -0,0 +1,178 @@
+"""Stream records from one store that `trapper_keeper.tk.get_store` opens into another.
+
+Records flow through generators: the source ``scan`` is cut into batches of ``batch_size`` pairs,
+each pair is converted to the types the target accepts, and every batch is written through the
+bulk API of the target and made durable before the next one is read.  Only one batch is held at a
+time.  After each batch the number of records done is written to a checkpoint file, so an
+interrupted migration skips what it already wrote when it is started again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from trapper_keeper.tk import DbTypes
+
+if TYPE_CHECKING:
+    from trapper_keeper.stores.bolt_kvstore import BoltPool
+
+DEFAULT_BATCH_SIZE: int = 1000
+CHECKPOINT_SUFFIX: str = ".migrate.json"
+
+Record = tuple[Any, Any]
+
+
+@dataclass
+class MigrateStats:
+    """What one migration run did."""
+
+    records: int = 0
+    batches: int = 0
+    resumed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Records written per second."""
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def report(self) -> str:
+        """Return a one line summary."""
+        resumed = f", {self.resumed} already done" if self.resumed else ""
+        return (
+            f"Migrated {self.records} records in {self.batches} batches in {self.seconds:.3f}s "
+            f"({self.rate:,.0f} records/s{resumed})"
+        )
+
+
+def batched(records: Iterable[Record], size: int) -> Iterator[list[Record]]:
+    """Cut ``records`` into lists of at most ``size`` pairs without reading ahead."""
+    it = iter(records)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bytes | bytearray | memoryview):
+        return bytes(value).decode("utf-8")
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _bytes(value: Any) -> bytes:
+    if isinstance(value, bytes | bytearray | memoryview):
+        return bytes(value)
+    return (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")
+
+
+def convert(records: Iterable[Record], dst_type: DbTypes) -> Iterator[Record]:
+    """Convert pairs to the key and value types the target store takes.
+
+    Bolt takes bytes, Keepass takes text titles and passwords.  Sqlite and the key/value store take
+    text keys and keep values as they are, except bytes, which become text for the JSON store.
+
+    Args:
+        records (Iterable[Record]): The ``(key, value)`` pairs.
+        dst_type (DbTypes): The target store type.
+
+    Yields:
+        Record: The converted pairs.
+    """
+    for key, value in records:
+        match dst_type:
+            case DbTypes.BOLT:
+                yield _bytes(key), _bytes(value)
+            case DbTypes.KP:
+                yield _text(key), _text(value)
+            case DbTypes.SQLITE:
+                yield _text(key), value if isinstance(value, bytes | str) else _text(value)
+            case _:
+                yield _text(key), _text(value) if isinstance(value, bytes | bytearray | memoryview) else value
+
+
+def bolt_writer(pool: BoltPool) -> Callable[[list[Record]], int]:
+    """Return a batch writer committing one Bolt transaction per batch."""
+
+    def write(batch: list[Record]) -> int:
+        with pool.writer() as store:
+            return store.put_many(batch)
+
+    return write
+
+
+def store_writer(store: Any) -> Callable[[list[Record]], int]:
+    """Return a batch writer for a store whose ``put_many`` is durable once ``sync`` returns, if it has one."""
+    sync = getattr(store, "sync", None)
+
+    def write(batch: list[Record]) -> int:
+        written = store.put_many(batch)
+        if sync is not None:
+            sync()
+        return written
+
+    return write
+
+
+def _fingerprint(fp: Path) -> list:
+    """Return what tells a checkpoint that the source changed since it was written."""
+    stat = fp.stat()
+    return [str(fp.resolve()), stat.st_size, stat.st_mtime_ns]
+
+
+def _read_checkpoint(checkpoint: Path, source: list) -> int:
+    try:
+        state = json.loads(checkpoint.read_text("utf-8"))
+    except (OSError, ValueError):
+        return 0
+    return state["done"] if state.get("source") == source else 0
+
+
+def _write_checkpoint(checkpoint: Path, source: list, done: int) -> None:
+    part = checkpoint.with_name(f"{checkpoint.name}.part")
+    part.write_text(json.dumps({"source": source, "done": done}), "utf-8")
+    os.replace(part, checkpoint)
+
+
+def migrate(
+    records: Iterable[Record],
+    write: Callable[[list[Record]], int],
+    dst_type: DbTypes,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: tuple[Path, Path] | None = None,
+) -> MigrateStats:
+    """Copy records into a store batch by batch.
+
+    Args:
+        records (Iterable[Record]): The source pairs, in the same order on every run.
+        write (Callable): Writes one batch durably and returns the pairs written, see `store_writer`.
+        dst_type (DbTypes): The target store type, for `convert`.
+        batch_size (int, optional): Pairs per batch. Defaults to 1000.
+        checkpoint (tuple[Path, Path] | None, optional): ``(source file, checkpoint file)`` to resume
+            from and record progress in. The checkpoint is removed once the migration completes.
+
+    Returns:
+        MigrateStats: The counts and timing of this run.
+    """
+    stats = MigrateStats()
+    start = time.perf_counter()
+    source: list = []
+    if checkpoint is not None:
+        source = _fingerprint(checkpoint[0])
+        stats.resumed = _read_checkpoint(checkpoint[1], source)
+    done = stats.resumed
+    for batch in batched(convert(islice(records, stats.resumed, None), dst_type), batch_size):
+        stats.records += write(batch)
+        stats.batches += 1
+        done += len(batch)
+        if checkpoint is not None:
+            _write_checkpoint(checkpoint[1], source, done)
+    if checkpoint is not None:
+        checkpoint[1].unlink(missing_ok=True)
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,169 @@
+"""Bulk credential provisioning for a fleet of hosts.
+
+Each host gets an ed25519 SSH keypair, a passphrase token and a UTF-8 keyfile.  Hosts are split
+into one batch per worker process, and each worker draws the tokens and keyfiles of its whole batch
+with `gen_passphrases` and `gen_utf8_many`.  Workers are started by a fork server, or spawned where
+there is none, and never forked from the caller, whose memory holds the unlocked database.  The
+results are written into a Keepass store inside a single batch, so the database is encrypted and
+saved once however many hosts there are.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from trapper_keeper.keegen import KEY_SIZE, TOKEN_SIZE, gen_passphrases, gen_utf8_many, generate_ed25519_key_pair
+from trapper_keeper.stores.keepass_index import PATH_SEP, group_path
+
+if TYPE_CHECKING:
+    from trapper_keeper.stores.keepass_store import KeepassStore
+
+PROVISION_GROUP: str = "hosts"
+PRIVATE_KEY_PROPERTY: str = "ssh_private_key"
+PUBLIC_KEY_PROPERTY: str = "ssh_public_key"
+KEYFILE_PROPERTY: str = "keyfile"
+WORKER_START_METHOD: str = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+@dataclass(frozen=True)
+class HostCredentials:
+    """The credentials generated for one host."""
+
+    host: str
+    private_key: str
+    public_key: str
+    token: str
+    key: str
+
+
+def read_hosts(fp_hosts: Path) -> list[str]:
+    """Read host names, one per line, skipping blanks, ``#`` comments and duplicates.
+
+    Args:
+        fp_hosts (Path): The hosts file.
+
+    Returns:
+        list[str]: The host names in file order.
+    """
+    hosts: dict[str, None] = {}
+    for line in Path(fp_hosts).read_text("utf-8").splitlines():
+        host = line.split("#", 1)[0].strip()
+        if host:
+            hosts[host] = None
+    return list(hosts)
+
+
+def _generate_batch(hosts: list[str], passphrase_length: int, key_length: int) -> list[HostCredentials]:
+    """Generate the credentials of a batch of hosts in one worker process."""
+    tokens = gen_passphrases(len(hosts), passphrase_length)
+    keys = gen_utf8_many(len(hosts), key_length)
+    return [
+        HostCredentials(host, *generate_ed25519_key_pair(), token=token, key=key)
+        for host, token, key in zip(hosts, tokens, keys, strict=True)
+    ]
+
+
+def generate_credentials(
+    hosts: Iterable[str],
+    passphrase_length: int = TOKEN_SIZE,
+    key_length: int = KEY_SIZE,
+    workers: int | None = None,
+) -> list[HostCredentials]:
+    """Generate credentials for many hosts across a process pool.
+
+    Args:
+        hosts (Iterable[str]): The host names.
+        passphrase_length (int, optional): Words per token. Defaults to 5.
+        key_length (int, optional): Characters per keyfile. Defaults to 190.
+        workers (int | None, optional): Worker processes. Defaults to the CPU count.
+
+    Returns:
+        list[HostCredentials]: The credentials, in host order.
+    """
+    hosts = list(hosts)
+    if not hosts:
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(hosts)))
+    if workers == 1:
+        return _generate_batch(hosts, passphrase_length, key_length)
+    batches = [hosts[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(WORKER_START_METHOD)) as pool:
+        results = list(
+            pool.map(_generate_batch, batches, [passphrase_length] * workers, [key_length] * workers)
+        )
+    by_host = {creds.host: creds for batch in results for creds in batch}
+    return [by_host[host] for host in hosts]
+
+
+def store_credentials(store: KeepassStore, credentials: Iterable[HostCredentials], group: str = PROVISION_GROUP) -> int:
+    """Write host credentials into ``group`` below the bootstrap group with a single save.
+
+    Each host is one entry titled after the host, with the token as its password and the keypair
+    and keyfile as custom properties.  Existing entries are rotated in place.
+
+    Args:
+        store (KeepassStore): The Keepass store.
+        credentials (Iterable[HostCredentials]): The generated credentials.
+        group (str, optional): The group name below the bootstrap group. Defaults to hosts.
+
+    Returns:
+        int: The number of entries written.
+    """
+    written = 0
+    with store.batch():
+        bootstrap = store.get_bootstrap_group()
+        hosts_group = store.index.find_group(path=f"{group_path(bootstrap)}{PATH_SEP}{group}")
+        if hosts_group is None:
+            hosts_group = store.add_group(bootstrap, group)
+        existing = {entry.title: entry for entry in store.lookup_entries(group=hosts_group)}
+        for creds in credentials:
+            entry = existing.get(creds.host)
+            if entry is None:
+                entry = store.add_entry(hosts_group, creds.host, "root", creds.token, force_creation=True)
+            else:
+                entry.password = creds.token
+                entry.touch(modify=True)
+            entry.set_custom_property(PRIVATE_KEY_PROPERTY, creds.private_key, protect=True)
+            entry.set_custom_property(PUBLIC_KEY_PROPERTY, creds.public_key)
+            entry.set_custom_property(KEYFILE_PROPERTY, creds.key, protect=True)
+            store.index.reindex_entry(entry)
+            written += 1
+        store.save()
+    return written
+
+
+def provision(  # noqa: PLR0913 - the generate_credentials options plus the store and group
+    store: KeepassStore,
+    hosts: Iterable[str],
+    *,
+    passphrase_length: int = TOKEN_SIZE,
+    key_length: int = KEY_SIZE,
+    workers: int | None = None,
+    group: str = PROVISION_GROUP,
+) -> dict[str, float]:
+    """Generate and store credentials for many hosts, timing each phase.
+
+    Args:
+        store (KeepassStore): The Keepass store.
+        hosts (Iterable[str]): The host names.
+        passphrase_length (int, optional): Words per token. Defaults to 5.
+        key_length (int, optional): Characters per keyfile. Defaults to 190.
+        workers (int | None, optional): Worker processes. Defaults to the CPU count.
+        group (str, optional): The group name below the bootstrap group. Defaults to hosts.
+
+    Returns:
+        dict[str, float]: ``hosts``, ``generate_seconds`` and ``save_seconds``.
+    """
+    start = time.perf_counter()
+    credentials = generate_credentials(hosts, passphrase_length, key_length, workers)
+    generated = time.perf_counter()
+    store_credentials(store, credentials, group)
+    saved = time.perf_counter()
+    return {"hosts": len(credentials), "generate_seconds": generated - start, "save_seconds": saved - generated}
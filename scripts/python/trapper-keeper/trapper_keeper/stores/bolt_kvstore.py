@@ -1,47 +1,450 @@
-"""BoltDB context manager module."""
+"""Typed BoltDB adapter.
+
+`BoltStore` owns one database file and one transaction for the lifetime of a ``with`` block.  The
+transaction is writable unless the store is opened read only, so every write of the block lands in
+a single commit.  Buckets are addressed by path, ``b"entryState"``, ``"state/entries"`` or
+``(b"state", b"entries")``, and the scans walk a cursor lazily instead of building lists.
+
+`BoltPool` shares one open database between threads: any number of readers each get a snapshot
+transaction while writers take turns.
+"""
 
 from __future__ import annotations
 
+import contextlib
+import mmap
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 from contextlib import AbstractContextManager
+from dataclasses import dataclass
 from pathlib import Path
 
 from boltdb import BoltDB
-from boltdb.tx import Tx
+from boltdb.bucket import Bucket
+from boltdb.cursor import Cursor
+
+from trapper_keeper.stores.protocol import iter_items
+
+DEFAULT_BUCKET: bytes = b"trapper_keeper"
+# separator of nested bucket names in a str bucket path
+BUCKET_SEP: str = "/"
+# pages of headroom a `BoltPool` keeps in the file, 1 MiB with 4 KiB pages
+RESERVE_PAGES: int = 256
+
+BucketPath = bytes | str | Sequence[bytes | str]
+
+
+def bucket_names(path: BucketPath) -> tuple[bytes, ...]:
+  """Split a bucket path into the names of the nested buckets, outermost first.
+
+  A ``bytes`` path is a single bucket name, a ``str`` path is split on ``/`` and a sequence holds
+  one name per level.
+  """
+  if isinstance(path, bytes):
+    names = (path,)
+  elif isinstance(path, str):
+    names = tuple(name.encode() for name in path.split(BUCKET_SEP))
+  else:
+    names = tuple(name.encode() if isinstance(name, str) else bytes(name) for name in path)
+  if not names or not all(names):
+    raise ValueError(f"Invalid bucket path: {path!r}")
+  return names
 
 
 class BoltStore(AbstractContextManager):
-  """Basic context manager for accessing BoltDB."""
+  """Context manager holding one BoltDB transaction, committed on a clean exit."""
 
-  def __entry__(self) -> Tx:
-    """Enters the BoltStore context manager."""
-    return self.tx
+  def __init__(self, bp_fp: Path, readonly: bool, bolt_db: BoltDB | None = None):
+    """Open the database and begin the store transaction.
 
-  def __init__(self, bp_fp: Path, readonly: bool):
-    """Initializes the BoltStore context manager."""
-    self.bolt_db = BoltDB(filename=bp_fp, readonly=readonly)
+    Args:
+        bp_fp (Path): The BoltDB file.
+        readonly (bool): Open a read only transaction instead of a writable one.
+        bolt_db (BoltDB | None): An already open database to begin the transaction on.
+    """
+    # the store keeps a reference to the database, boltdb closes it when it is collected
+    self.bolt_db = bolt_db if bolt_db is not None else BoltDB(filename=bp_fp, readonly=readonly)
     self.tx = self.bolt_db.begin(writable=(not readonly))
     self.readonly = readonly
-    self.bolt_db_methods = [item for item in dir(BoltDB) if not item.startswith("_")]
-    self.tx_methods = [item for item in dir(Tx) if not item.startswith("_")]
     self.bp_fp = bp_fp
 
-  def __getattr__(self, item):
-    """Gets the attribute of the BoltStore context manager."""
-    def method(*args):
-      # boltdb lib calls close on del and that behavior is neither wanted nor desirable
-      if item in self.bolt_db_methods:
-        return getattr(self.bolt_db, item)(*args)
-      if item in self.tx_methods:
-        return getattr(self.tx, item)(*args)
+  def __enter__(self) -> BoltStore:
+    """Enters the BoltStore context manager."""
+    return self
 
-      raise AttributeError
+  def bucket(self, path: BucketPath | None = None, create: bool = False) -> Bucket | None:
+    """Return the bucket at ``path``, or the root bucket when no path is given.
 
-    return method
+    Args:
+        path (BucketPath | None): The bucket path.
+        create (bool): Create missing buckets along the path. Needs a writable store.
 
-  def __exit__(self, __exc_type, __exc_value, __traceback):
-    """Exits the BoltStore context manager."""
-    if not self.readonly:
-      self.tx.write()
-      self.tx.commit()
+    Returns:
+        Bucket | None: The bucket, or None if it does not exist.
+    """
+    found = self.tx.bucket()
+    if path is None:
+      return found
+    for name in bucket_names(path):
+      parent, found = found, found.bucket(name)
+      if found is None:
+        if not create:
+          return None
+        found = parent.create_bucket(name)
+    return found
+
+  def create_bucket(self, path: BucketPath) -> Bucket:
+    """Create the bucket at ``path`` and any missing parent, returning the existing one if present."""
+    return self.bucket(path, create=True)
+
+  def delete_bucket(self, path: BucketPath) -> None:
+    """Delete the bucket at ``path`` and everything in it.
+
+    Raises:
+        KeyError: If the bucket does not exist.
+    """
+    *parents, name = bucket_names(path)
+    parent = self.bucket(parents) if parents else self.tx.bucket()
+    if parent is None or parent.bucket(name) is None:
+      raise KeyError(f"No such bucket: {path!r}")
+    parent.delete_bucket(name)
+
+  def buckets(self, path: BucketPath | None = None) -> Iterator[bytes]:
+    """Iterate over the names of the buckets nested directly in ``path``, in key order."""
+    found = self.bucket(path)
+    if found is None:
+      return
+    cursor = found.cursor()
+    k, v = cursor.first()
+    while k is not None:
+      if v is None:
+        yield k
+      k, v = cursor.next()
+
+  def get(self, key: bytes, bucket: BucketPath = DEFAULT_BUCKET) -> bytes | None:
+    """Return the value of ``key``, or None if the key or the bucket is missing."""
+    found = self.bucket(bucket)
+    return None if found is None else found.get(key)
+
+  def put(self, key: bytes, value: bytes, bucket: BucketPath = DEFAULT_BUCKET) -> None:
+    """Write one pair, creating the bucket if needed."""
+    self.bucket(bucket, create=True).put(key, value)
+
+  def delete(self, key: bytes, bucket: BucketPath = DEFAULT_BUCKET) -> bool:
+    """Delete one key, returning True if it existed."""
+    return self.delete_many((key,), bucket) == 1
+
+  def get_many(self, keys: Iterable[bytes], bucket: BucketPath = DEFAULT_BUCKET) -> dict[bytes, bytes]:
+    """Fetch many keys from one bucket inside the store transaction.
+
+    Args:
+        keys (Iterable[bytes]): The keys to look up.
+        bucket (BucketPath): The bucket holding the keys.
+
+    Returns:
+        dict[bytes, bytes]: The found keys mapped to their values.
+    """
+    found = self.bucket(bucket)
+    if found is None:
+      return {}
+    values = {}
+    for k in keys:
+      v = found.get(k)
+      if v is not None:
+        values[k] = v
+    return values
+
+  def put_many(
+    self, items: Mapping[bytes, bytes] | Iterable[tuple[bytes, bytes]], bucket: BucketPath = DEFAULT_BUCKET
+  ) -> int:
+    """Write many pairs into one bucket. Every put shares the single writable store transaction.
+
+    Args:
+        items (Mapping | Iterable[tuple]): The pairs to write.
+        bucket (BucketPath): The bucket receiving the pairs. Created if missing.
+
+    Returns:
+        int: The number of pairs written.
+    """
+    found = self.bucket(bucket, create=True)
+    written = 0
+    for k, v in iter_items(items):
+      found.put(k, v)
+      written += 1
+    return written
+
+  def delete_many(self, keys: Iterable[bytes], bucket: BucketPath = DEFAULT_BUCKET) -> int:
+    """Delete many keys from one bucket inside the single writable store transaction.
+
+    Args:
+        keys (Iterable[bytes]): The keys to delete.
+        bucket (BucketPath): The bucket holding the keys.
+
+    Returns:
+        int: The number of keys that existed and were removed.
+    """
+    found = self.bucket(bucket)
+    if found is None:
+      return 0
+    removed = 0
+    for k in keys:
+      if found.get(k) is not None:
+        found.delete(k)
+        removed += 1
+    return removed
+
+  def _seek(self, bucket: BucketPath, start: bytes | None) -> tuple[Cursor | None, bytes | None, bytes | None]:
+    """Return a cursor over ``bucket`` positioned on the first key not below ``start``."""
+    found = self.bucket(bucket)
+    if found is None:
+      return None, None, None
+    cursor = found.cursor()
+    k, v = cursor.seek(start) if start else cursor.first()
+    return cursor, k, v
+
+  def range(
+    self, start: bytes | None = None, end: bytes | None = None, bucket: BucketPath = DEFAULT_BUCKET
+  ) -> Iterator[tuple[bytes, bytes]]:
+    """Iterate over the pairs of one bucket with ``start <= key < end``, in key order.
+
+    The cursor seeks straight to ``start`` and stops at the first key not below ``end``, so only
+    the pages of the range are visited.  Nested buckets are skipped.
+
+    Args:
+        start (bytes | None): The first key. ``None`` starts at the first key of the bucket.
+        end (bytes | None): The key past the last one. ``None`` runs to the end of the bucket.
+        bucket (BucketPath): The bucket to scan.
+
+    Yields:
+        tuple[bytes, bytes]: The ``(key, value)`` pairs of the range.
+    """
+    cursor, k, v = self._seek(bucket, start)
+    while k is not None:
+      if end is not None and k >= end:
+        return
+      if v is not None:
+        yield k, v
+      k, v = cursor.next()
+
+  def prefix(self, prefix: bytes, bucket: BucketPath = DEFAULT_BUCKET) -> Iterator[tuple[bytes, bytes]]:
+    """Iterate over the pairs of one bucket whose key starts with ``prefix``, in key order.
 
+    Args:
+        prefix (bytes): The key prefix.
+        bucket (BucketPath): The bucket to scan.
+
+    Yields:
+        tuple[bytes, bytes]: The matching ``(key, value)`` pairs.
+    """
+    cursor, k, v = self._seek(bucket, prefix)
+    while k is not None and k.startswith(prefix):
+      if v is not None:
+        yield k, v
+      k, v = cursor.next()
+
+  def scan(self, prefix: bytes | None = None, bucket: BucketPath = DEFAULT_BUCKET) -> Iterator[tuple[bytes, bytes]]:
+    """Iterate over the pairs of one bucket whose key starts with ``prefix``, see `prefix`.
+
+    Args:
+        prefix (bytes | None): The key prefix. ``None`` yields every pair.
+        bucket (BucketPath): The bucket to scan.
+
+    Yields:
+        tuple[bytes, bytes]: The matching ``(key, value)`` pairs.
+    """
+    return self.prefix(prefix, bucket) if prefix else self.range(bucket=bucket)
+
+  def commit(self) -> None:
+    """Commit the store transaction. A read only transaction is just closed."""
+    self.tx.commit()
+
+  def rollback(self) -> None:
+    """Drop every change of the store transaction."""
+    if not self.readonly:
+      self.bolt_db.freelist.rollback()
     self.tx.close()
+
+  def __exit__(self, __exc_type, __exc_value, __traceback):
+    """Commits the store transaction, or rolls it back if the block raised."""
+    if __exc_type is None and not self.readonly:
+      self.commit()
+    else:
+      self.rollback()
+
+
+@dataclass
+class BoltPoolStats:
+  """Counters of a `BoltPool`, safe to read at any time."""
+
+  readers_open: int = 0
+  writers_open: int = 0
+  readers_total: int = 0
+  writers_total: int = 0
+  read_wait_seconds: float = 0.0
+  write_wait_seconds: float = 0.0
+  # seconds writers spent waiting for readers of older snapshots before committing
+  commit_wait_seconds: float = 0.0
+  # times the file was grown ahead of commits, each one waits for the open readers
+  remaps: int = 0
+
+
+class BoltPool:
+  """One open BoltDB shared by many threads.
+
+  Readers get read only `BoltStore` snapshots and run concurrently with each other and with the
+  writer, writers are serialized by the database write lock.  Two limits of boltdb shape the rest:
+
+  - the pages freed by a commit go back to the freelist at once, so a commit waits until every
+    reader of a snapshot older than the previous commit has finished before it may reuse them;
+  - growing the file remaps it, which waits for every open reader.  The pool keeps
+    ``reserve_pages`` of headroom and only grows the file when a writer begins with less, so
+    commits never remap below an open snapshot.
+
+  A thread holding a reader must therefore not wait for a second writer to finish.
+  """
+
+  def __init__(
+    self, bp_fp: Path, readonly: bool = False, max_readers: int | None = None, reserve_pages: int = RESERVE_PAGES
+  ):
+    """Open the database.
+
+    Args:
+        bp_fp (Path): The BoltDB file.
+        readonly (bool): Open the file read only. Writers are refused. Defaults to False.
+        max_readers (int | None): Readers allowed at once. Defaults to no limit.
+        reserve_pages (int): Free pages kept past the end of the data for commits to grow into.
+    """
+    self.bp_fp = bp_fp
+    self.readonly = readonly
+    self.reserve_pages = reserve_pages
+    self.bolt_db: BoltDB | None = BoltDB(filename=bp_fp, readonly=readonly)
+    self.stats = BoltPoolStats()
+    self._cond = threading.Condition()
+    # snapshot txid -> readers of that snapshot still open
+    self._snapshots: Counter[int] = Counter()
+    self._committed = self.bolt_db.meta().txid
+    self._reader_slots = threading.BoundedSemaphore(max_readers) if max_readers else None
+    if not readonly:
+      with self.bolt_db.lock:
+        self._reserve(self.bolt_db)
+
+  @contextlib.contextmanager
+  def reader(self) -> Iterator[BoltStore]:
+    """Yield a read only store on the latest committed snapshot.
+
+    Yields:
+        BoltStore: The store, valid until the block exits.
+    """
+    db = self._open_db()
+    start = time.perf_counter()
+    if self._reader_slots is not None:
+      self._reader_slots.acquire()
+    try:
+      # register before beginning: the snapshot can only turn out newer than the committed txid
+      with self._cond:
+        snapshot = self._committed
+        self._snapshots[snapshot] += 1
+        self.stats.readers_open += 1
+        self.stats.readers_total += 1
+      try:
+        store = BoltStore(self.bp_fp, readonly=True, bolt_db=db)
+        with self._cond:
+          self._release(snapshot)
+          snapshot = store.tx.meta.txid
+          self._snapshots[snapshot] += 1
+          self.stats.read_wait_seconds += time.perf_counter() - start
+        try:
+          yield store
+        finally:
+          store.rollback()
+      finally:
+        with self._cond:
+          self._release(snapshot)
+          self.stats.readers_open -= 1
+    finally:
+      if self._reader_slots is not None:
+        self._reader_slots.release()
+
+  @contextlib.contextmanager
+  def writer(self) -> Iterator[BoltStore]:
+    """Yield a writable store, committed when the block exits cleanly and rolled back otherwise.
+
+    Yields:
+        BoltStore: The store, valid until the block exits.
+
+    Raises:
+        ValueError: If the pool is read only.
+    """
+    if self.readonly:
+      raise ValueError(f"{self.bp_fp} is open read only")
+    db = self._open_db()
+    start = time.perf_counter()
+    store = BoltStore(self.bp_fp, readonly=False, bolt_db=db)
+    with self._cond:
+      self.stats.writers_open += 1
+      self.stats.writers_total += 1
+    try:
+      try:
+        self._reserve(db)
+        with self._cond:
+          self.stats.write_wait_seconds += time.perf_counter() - start
+        yield store
+      except BaseException:
+        store.rollback()
+        raise
+      start = time.perf_counter()
+      with self._cond:
+        self._cond.wait_for(lambda: all(snapshot >= self._committed for snapshot in self._snapshots))
+        self.stats.commit_wait_seconds += time.perf_counter() - start
+      # readers arriving meanwhile register at least the committed txid, which this commit is safe for
+      store.commit()
+      with self._cond:
+        self._committed = store.tx.txid
+    finally:
+      with self._cond:
+        self.stats.writers_open -= 1
+        self._cond.notify_all()
+
+  def _reserve(self, db: BoltDB) -> None:
+    """Grow the file when less than ``reserve_pages`` are left. Call with the write lock held."""
+    if (db.max_pgid + self.reserve_pages) * db.pagesize <= db.datasz:
+      return
+    db.mmap_lock.w_acquire()
+    try:
+      db.datasz = (db.max_pgid + 2 * self.reserve_pages) * db.pagesize
+      os.ftruncate(db.fd, db.datasz)
+      db.mmap.release()
+      db.mmap = memoryview(mmap.mmap(db.fd, db.datasz, access=mmap.ACCESS_WRITE))
+    finally:
+      db.mmap_lock.w_release()
+    with self._cond:
+      self.stats.remaps += 1
+
+  def _release(self, snapshot: int) -> None:
+    """Forget one reader of ``snapshot`` and wake writers waiting for it. Call with the lock held."""
+    self._snapshots[snapshot] -= 1
+    if not self._snapshots[snapshot]:
+      del self._snapshots[snapshot]
+    self._cond.notify_all()
+
+  def _open_db(self) -> BoltDB:
+    if self.bolt_db is None:
+      raise ValueError(f"The pool of {self.bp_fp} is closed")
+    return self.bolt_db
+
+  def close(self) -> None:
+    """Wait for every open store and drop the database, boltdb closes it once it is collected."""
+    with self._cond:
+      self._cond.wait_for(lambda: not self.stats.readers_open and not self.stats.writers_open)
+      self.bolt_db = None
+
+  def __enter__(self) -> BoltPool:
+    """Enters the BoltPool context manager."""
+    return self
+
+  def __exit__(self, __exc_type, __exc_value, __traceback):
+    """Closes the pool."""
+    self.close()
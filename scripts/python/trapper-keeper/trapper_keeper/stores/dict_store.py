@@ -1,14 +1,319 @@
 """Offer a persistent dictionary with an API compatible with shelve and anydbm."""
 
+from __future__ import annotations
+
 import contextlib
 import csv
+import io
 import json
 import os
 import pickle
 import shutil
+import threading
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from trapper_keeper.stores.protocol import iter_items
+
+# journal records buffered in memory before they are appended and fsync'd as one group commit
+GROUP_COMMIT_SIZE: int = 256
+# compact once the journal grows past this fraction of the snapshot size
+COMPACT_RATIO: float = 0.5
+# never compact a journal smaller than this, so tiny stores do not rewrite on every sync
+COMPACT_MIN_BYTES: int = 64 * 1024
+# changes that wake the background flusher before its interval elapses
+MAX_DIRTY: int = 1024
+
+_SET, _DEL, _CLEAR = "s", "d", "c"
+
+# self-describing first line written by dump, e.g. b"%TKPD 1 json\n"
+HEADER_MAGIC: bytes = b"%TKPD"
+HEADER_VERSION: int = 1
+# the magic, version and format words of the header line
+HEADER_FIELDS: int = 3
+FORMATS: tuple[str, ...] = ("pickle", "json", "csv", "msgpack")
+BINARY_FORMATS: frozenset[str] = frozenset({"pickle", "msgpack"})
+# leading bytes of an `IndexedDict` file, which ``load`` converts
+INDEXED_MAGIC: bytes = b"TKIDX"
+INDEXED: str = "indexed"
+# bytes inspected to sniff files written before the header existed
+SNIFF_SIZE: int = 1024
+# the PROTO opcode opening a pickle, and the protocols it may announce
+PICKLE_PROTO: int = 0x80
+PICKLE_PROTOCOLS: range = range(2, 6)
+CHUNK_SIZE: int = 64 * 1024
+
+
+def _header(file_format: str) -> bytes:
+    """Return the header line ``dump`` writes ahead of the serialized data."""
+    return b"%s %d %s\n" % (HEADER_MAGIC, HEADER_VERSION, file_format.encode())
+
+
+def sniff_format(fileobj) -> str | None:
+    """Detect the format of a store file and position ``fileobj`` at the start of its data.
+
+    Files written by ``dump`` announce their format in a versioned header.  Older files are
+    recognized from their leading bytes: a pickle protocol marker, an opening JSON brace, or
+    anything else as csv.  Files written by `IndexedDict` are reported as ``indexed``.
+
+    Args:
+        fileobj: A binary file object positioned at the start of the store.
+
+    Returns:
+        str | None: One of ``FORMATS``, ``indexed``, or None for an empty file.
+
+    Raises:
+        ValueError: If the header is malformed or written by a newer version.
+    """
+    start = fileobj.tell()
+    head = fileobj.read(SNIFF_SIZE)
+    if head.startswith(HEADER_MAGIC):
+        end = head.find(b"\n")
+        parts = head[:end].split() if end != -1 else []
+        if len(parts) != HEADER_FIELDS or not parts[1].isdigit() or parts[2].decode() not in FORMATS:
+            raise ValueError(f"Malformed store header: {head[:end if end != -1 else 32]!r}")
+        if int(parts[1]) > HEADER_VERSION:
+            raise ValueError(f"Store header version {int(parts[1])} is newer than {HEADER_VERSION}")
+        fileobj.seek(start + end + 1)
+        return parts[2].decode()
+    fileobj.seek(start)
+    if not head:
+        return None
+    if head.startswith(INDEXED_MAGIC):
+        return INDEXED
+    if head[0] == PICKLE_PROTO and len(head) > 1 and head[1] in PICKLE_PROTOCOLS:
+        return "pickle"
+    if head.lstrip()[:1] == b"{":
+        return "json"
+    return "csv"
+
+
+def _iter_json_pairs(fileobj, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[str, Any]]:
+    """Stream the members of a top-level JSON object without materializing the whole object.
+
+    The text is read in chunks and every key and value is decoded as soon as it is complete.
+
+    Args:
+        fileobj: A text file object positioned at the opening brace.
+        chunk_size (int): Characters read per refill.
+
+    Yields:
+        tuple[str, Any]: The ``(key, value)`` members in file order.
+
+    Raises:
+        ValueError: If the text is not a well-formed JSON object.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        chunk = fileobj.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+        return not eof
+
+    def skip_ws() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON store")
+        found = buf[pos]
+        if found not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON store, found {found!r}")
+        pos += 1
+        return found
+
+    def value() -> Any:
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if more():
+                    continue
+                raise
+            # a number cut by the end of the buffer may continue in the next chunk
+            cut = end == len(buf) or (
+                isinstance(obj, int | float) and not isinstance(obj, bool) and buf[end] in ".eE+-"
+            )
+            if cut and not eof and more():
+                continue
+            pos = end
+            return obj
+
+    expect("{")
+    skip_ws()
+    if buf[pos:pos + 1] == "}":
+        return
+    while True:
+        key = value()
+        if not isinstance(key, str):
+            raise ValueError(f"JSON store keys must be strings, found {key!r}")
+        expect(":")
+        yield key, value()
+        if expect(",}") == "}":
+            return
+
+
+class _Journal:
+    """Append-only write-ahead log backing a journaled PersistentDict.
+
+    Records are ``(op, key, value)`` triples, encoded as JSON lines for the json and csv formats
+    and as consecutive pickle frames for the pickle format.  While a compaction runs the active
+    log is renamed to ``<log>.compacting`` so new records land in a fresh log.
+    """
+
+    def __init__(self, filename, file_format: str, mode=None, lock: threading.RLock | None = None):
+        """Initialize the journal that sits next to the snapshot ``filename``."""
+        self.path = f"{filename}.log"
+        self.compacting_path = f"{self.path}.compacting"
+        self.binary = file_format in BINARY_FORMATS
+        self.mode = mode
+        self.pending: list[tuple] = []
+        self.lock = lock or threading.RLock()
+
+    def paths(self) -> tuple[str, str]:
+        """Return the journal files in replay order, oldest first."""
+        return self.compacting_path, self.path
+
+    def record(self, op: str, key=None, value=None) -> None:
+        """Buffer one mutation and flush the group once it is full."""
+        with self.lock:
+            self.pending.append((op, key, value))
+            if len(self.pending) >= GROUP_COMMIT_SIZE:
+                self.flush()
+
+    def flush(self) -> None:
+        """Append every buffered record to the log with a single write and fsync."""
+        with self.lock:
+            if not self.pending:
+                return
+            if self.binary:
+                payload = b"".join(pickle.dumps(rec, 2) for rec in self.pending)
+            else:
+                payload = "".join(json.dumps(rec, separators=(",", ":")) + "\n" for rec in self.pending).encode()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, self.mode or 0o600)
+            try:
+                os.write(fd, payload)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.pending.clear()
+
+    def size(self) -> int:
+        """Return the on-disk size of the active log."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def rotate(self) -> bool:
+        """Move the active log aside for compaction.
+
+        Returns:
+            bool: False if a previous compaction has not finished yet.
+        """
+        with self.lock:
+            if os.path.exists(self.compacting_path):
+                return False
+            self.flush()
+            if os.path.exists(self.path):
+                os.replace(self.path, self.compacting_path)
+            return True
+
+    def replay(self, target: dict, repair: bool = False) -> int:
+        """Apply every record found on disk to ``target``.
+
+        A torn record at the end of a log, left by a crash mid-append, ends the replay of that log.
+
+        Args:
+            target (dict): The dict receiving the records.
+            repair (bool): Truncate a torn tail so later appends are not hidden behind it.
+
+        Returns:
+            int: The number of records applied.
+        """
+        applied = 0
+        for path in self.paths():
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as fileobj:
+                good = 0
+                for op, key, value in self._read(fileobj):
+                    if op == _SET:
+                        dict.__setitem__(target, key, value)
+                    elif op == _DEL:
+                        dict.pop(target, key, None)
+                    elif op == _CLEAR:
+                        dict.clear(target)
+                    applied += 1
+                    good = fileobj.tell()
+                torn = good < os.fstat(fileobj.fileno()).st_size
+            if repair and torn:
+                os.truncate(path, good)
+        return applied
+
+    def _read(self, fileobj) -> Iterator[tuple]:
+        """Decode records until the end of the log or the first torn record."""
+        if self.binary:
+            while True:
+                try:
+                    yield pickle.load(fileobj)
+                except (EOFError, pickle.UnpicklingError):
+                    return
+        else:
+            while line := fileobj.readline():
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+
+    def discard(self, *paths: str) -> None:
+        """Remove journal files whose records are now part of the snapshot."""
+        for path in paths or self.paths():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+def journal_files(filename) -> list[str]:
+    """Return the journal files a journaled PersistentDict left next to the store ``filename``."""
+    return [path for path in _Journal(filename, "json").paths() if os.path.exists(path)]
+
+
+def discard_journal(filename) -> None:
+    """Remove the journal files of the store ``filename`` once its snapshot holds their records."""
+    _Journal(filename, "json").discard()
+
+
+@dataclass
+class FlushStats:
+    """Counters describing the commits a PersistentDict has made to disk."""
+
+    commits: int = 0
+    changes: int = 0
+    skipped: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    last_seconds: float = 0.0
+    last_commit: float | None = None
+    last_error: str | None = None
 
 
-class PersistentDict:
+class PersistentDict(dict):
     """https://code.activestate.com/recipes/576642-persistent-dict-with-multiple-standard-file-format/.
     Persistent dictionary with an API compatible with shelve and anydbm.
 
@@ -16,37 +321,141 @@ class PersistentDict:
     a regular dictionary.
 
     Write to disk is delayed until close or sync (similar to gdbm's fast mode).
+    Changes are tracked, so syncing or closing a clean dict does no I/O.
 
-    Input file format is automatically discovered.
-    Output file format is selectable between pickle, json, and csv.
-    All three serialization formats are backed by fast C implementations.
+    Input file format is discovered from the header written by ``dump``, or sniffed from the
+    leading bytes of older files, and JSON and csv stores are streamed into the dict.  A file
+    written by `IndexedDict` is loaded too and rewritten in ``file_format`` on the next sync.
+    Output file format is selectable between pickle, json, csv, and msgpack (requires the
+    optional ``msgpack`` package).
+
+    With ``journal=True`` mutations are appended to ``<filename>.log`` instead, so a sync costs
+    the size of the changes rather than the size of the store.  Records are fsync'd in group
+    commits and folded into the snapshot by a background compaction once the log outgrows
+    ``compact_ratio`` of the snapshot.  Any journal left behind is replayed when the dict is opened.
+
+    With ``flush_interval`` set, a background thread commits pending changes every
+    ``flush_interval`` seconds, or as soon as ``max_dirty`` changes pile up, coalescing bursts of
+    writes into one atomic commit.  ``stats`` reports what the commits cost.
     """
 
-    def __init__(
-        self, filename, flag="c", mode=None, file_format="pickle", *args, **kwds
+    def __init__(  # noqa: PLR0913 - the shelve compatible signature plus keyword-only tuning options
+        self, filename, flag="c", mode=None, file_format="pickle", *args,
+        journal=False, compact_ratio=COMPACT_RATIO, flush_interval=None, max_dirty=MAX_DIRTY, **kwds
     ):
         """Initialize a persistent dictionary."""
         self.flag = flag  # r=readonly, c=create, or n=new
         self.mode = mode  # None or an octal triple like 0644
-        self.format = file_format  # 'csv', 'json', or 'pickle'
+        self.format = file_format  # 'csv', 'json', 'pickle', or 'msgpack'
         self.filename = filename
+        self.compact_ratio = compact_ratio
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.stats = FlushStats()
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._dirty = 0
+        self._journal: _Journal | None = None
+        self._compactor: threading.Thread | None = None
+        self._flusher: threading.Thread | None = None
+        self._flush_wanted = threading.Event()
+        self._closing = threading.Event()
+        self._converted = False
         if flag != "n" and os.access(filename, os.R_OK):
             # ruff: noqa: SIM115
-            fileobj = open(filename, "rb" if file_format == "pickle" else "r")
+            fileobj = open(filename, "rb")
             with fileobj:
                 self.load(fileobj)
-        dict.__init__(self, *args, **kwds)
+        wal = _Journal(filename, file_format, mode, self._lock)
+        if flag == "n":
+            wal.discard()
+            # starting over still has to replace whatever is on disk
+            self._dirty = int(os.path.exists(filename))
+        else:
+            replayed = wal.replay(self, repair=flag != "r")
+            # records left in a journal are durable already; only a plain snapshot needs rewriting
+            self._dirty = 0 if journal else replayed
+            if self._converted and not journal:
+                self._dirty += 1
+        if journal and flag != "r":
+            self._journal = wal
+        self.update(*args, **kwds)
+        if flush_interval and flag != "r":
+            self._flusher = threading.Thread(target=self._flush_loop, name="persistent-dict-flush", daemon=True)
+            self._flusher.start()
+
+    @property
+    def dirty(self) -> bool:
+        """Return True if the dict holds changes that are not on disk yet."""
+        return self._dirty > 0 or (self._journal is not None and bool(self._journal.pending))
+
+    def _changed(self, op, key=None, value=None):
+        """Record one mutation.  Callers hold ``self._lock``."""
+        self._dirty += 1
+        if self._journal is not None:
+            self._journal.record(op, key, value)
+        if self._flusher is not None and self._dirty >= self.max_dirty:
+            self._flush_wanted.set()
+
+    def _flush_loop(self):
+        """Commit pending changes on an interval or once too many pile up."""
+        while not self._closing.is_set():
+            self._flush_wanted.wait(self.flush_interval)
+            self._flush_wanted.clear()
+            if self._closing.is_set():
+                return
+            # noinspection PyBroadException
+            try:
+                self.sync()
+            except Exception as exc:  # keep flushing; the error is surfaced through stats
+                self.stats.errors += 1
+                self.stats.last_error = repr(exc)
 
     def sync(self):
         """Write dict to disk."""
         if self.flag == "r":
             return
+        with self._sync_lock:
+            with self._lock:
+                changes = self._dirty
+                if not self.dirty:
+                    self.stats.skipped += 1
+                    return
+                started = time.perf_counter()
+                if self._journal is not None:
+                    self._journal.flush()
+                    data = None
+                else:
+                    data = dict(self)
+                self._dirty = 0
+            try:
+                if data is not None:
+                    self._write_snapshot(data)
+                    _Journal(self.filename, self.format).discard()
+                else:
+                    self._maybe_compact()
+            except Exception:
+                with self._lock:
+                    self._dirty += changes
+                raise
+            elapsed = time.perf_counter() - started
+            self.stats.commits += 1
+            self.stats.changes += changes
+            self.stats.last_seconds = elapsed
+            self.stats.total_seconds += elapsed
+            self.stats.last_commit = time.time()
+
+    def _write_snapshot(self, data: dict) -> None:
+        """Serialize ``data`` to a temp file and atomically move it over the snapshot."""
         filename = self.filename
         tempname = f"{filename}.tmp"
-        fileobj = open(tempname, "wb" if self.format == "pickle" else "w")
+        fileobj = open(tempname, "wb" if self.format in BINARY_FORMATS else "w")
         try:
-            self.dump(fileobj)
+            self._dump_data(data, fileobj)
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
         except Exception:
+            fileobj.close()
             os.remove(tempname)
             raise
         finally:
@@ -55,9 +464,104 @@ class PersistentDict:
         if self.mode is not None:
             os.chmod(self.filename, self.mode)
 
+    def _maybe_compact(self) -> None:
+        """Start a background compaction when the journal has outgrown the snapshot."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        try:
+            snapshot_size = os.path.getsize(self.filename)
+        except OSError:
+            snapshot_size = 0
+        if self._journal.size() <= max(snapshot_size * self.compact_ratio, COMPACT_MIN_BYTES):
+            return
+        self.compact(background=True)
+
+    def compact(self, background: bool = False) -> None:
+        """Fold the journal into a fresh snapshot.
+
+        The dict is copied and the log rotated under the lock, so writers only wait for the copy;
+        the snapshot itself is serialized outside the lock.
+
+        Args:
+            background (bool): Run the snapshot write in a daemon thread. Defaults to False.
+        """
+        if self._journal is None:
+            self.sync()
+            return
+        with self._lock:
+            if not self._journal.rotate():
+                return
+            data = dict(self)
+
+        def _run():
+            self._write_snapshot(data)
+            self._journal.discard(self._journal.compacting_path)
+
+        if background:
+            self._compactor = threading.Thread(target=_run, name="persistent-dict-compact", daemon=True)
+            self._compactor.start()
+        else:
+            _run()
+
     def close(self):
-        """Synchronize and close file."""
+        """Synchronize and close file.  A clean dict is closed without any I/O."""
+        if self._flusher is not None:
+            self._closing.set()
+            self._flush_wanted.set()
+            self._flusher.join()
+            self._flusher = None
         self.sync()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def __setitem__(self, key, value):
+        """Set an item and track the change."""
+        with self._lock:
+            dict.__setitem__(self, key, value)
+            self._changed(_SET, key, value)
+
+    def __delitem__(self, key):
+        """Delete an item and track the change."""
+        with self._lock:
+            dict.__delitem__(self, key)
+            self._changed(_DEL, key)
+
+    def update(self, *args, **kwds):
+        """Update from a mapping or pairs and track each change."""
+        with self._lock:
+            for key, value in dict(*args, **kwds).items():
+                dict.__setitem__(self, key, value)
+                self._changed(_SET, key, value)
+
+    def setdefault(self, key, default=None):
+        """Insert ``key`` with ``default`` if missing and return its value."""
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        """Remove ``key`` and return its value, tracking the change."""
+        with self._lock:
+            if key not in self:
+                return dict.pop(self, key, *default)
+            value = dict.pop(self, key)
+            self._changed(_DEL, key)
+            return value
+
+    def popitem(self):
+        """Remove and return the last inserted pair, tracking the change."""
+        with self._lock:
+            key, value = dict.popitem(self)
+            self._changed(_DEL, key)
+            return key, value
+
+    def clear(self):
+        """Remove every item and track the change."""
+        with self._lock:
+            dict.clear(self)
+            self._changed(_CLEAR)
 
     def __enter__(self):
         """Context manager enter."""
@@ -69,21 +573,119 @@ class PersistentDict:
 
     def dump(self, fileobj):
         """Pickle to file."""
+        self._dump_data(self, fileobj)
+
+    def _dump_data(self, data: dict, fileobj):
+        """Serialize ``data`` to ``fileobj`` in the configured format, after the versioned header."""
+        if self.format not in FORMATS:
+            raise NotImplementedError(f"Unknown format: {self.format!r}")
+        header = _header(self.format)
+        fileobj.write(header if self.format in BINARY_FORMATS else header.decode())
         if self.format == "csv":
-            csv.writer(fileobj).writerows(self.items())
+            csv.writer(fileobj).writerows(data.items())
         elif self.format == "json":
-            json.dump(self, fileobj, separators=(",", ":"))
+            json.dump(data, fileobj, separators=(",", ":"))
         elif self.format == "pickle":
-            pickle.dump(dict(self), fileobj, 2)
-        else:
-            raise NotImplementedError(f"Unknown format: {self.format!r}")
+            pickle.dump(dict(data), fileobj, 2)
+        elif self.format == "msgpack":
+            import msgpack  # noqa: PLC0415 - msgpack is an optional dependency
+
+            packer = msgpack.Packer()
+            fileobj.write(packer.pack_map_header(len(data)))
+            for k, v in data.items():
+                fileobj.write(packer.pack(k))
+                fileobj.write(packer.pack(v))
 
     def load(self, fileobj):
-        """Load from file."""
-        # try formats from most restrictive to the least restrictive
-        for loader in (pickle.load, json.load, csv.reader):
-            fileobj.seek(0)
-            # noinspection PyBroadException
-            with contextlib.suppress(Exception):
-                return self.update(loader(fileobj))
-        raise ValueError("File not in a supported format")
+        """Load from file.
+
+        The format is read from the header, or sniffed once from the leading bytes, and the
+        matching loader reads the file a single time.  Errors are not retried with another
+        format, so a corrupt store fails loudly instead of loading as the wrong format.
+        """
+        raw = getattr(fileobj, "buffer", fileobj)
+        file_format = sniff_format(raw)
+        if file_format is None:
+            return
+        if file_format == INDEXED:
+            from trapper_keeper.stores.indexed_dict import IndexedDict  # noqa: PLC0415 - indexed_dict imports this module
+
+            # the journal next to it is replayed by __init__, not by the indexed store
+            with IndexedDict(self.filename, flag="r", read_journal=False) as indexed:
+                dict.update(self, indexed.scan())
+            self._converted = True
+            return
+        try:
+            if file_format == "pickle":
+                dict.update(self, pickle.load(raw))
+            elif file_format == "msgpack":
+                import msgpack  # noqa: PLC0415 - msgpack is an optional dependency
+
+                unpacker = msgpack.Unpacker(raw, raw=False, strict_map_key=False)
+                dict.update(self, ((unpacker.unpack(), unpacker.unpack()) for _ in range(unpacker.read_map_header())))
+            else:
+                text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                try:
+                    if file_format == "json":
+                        dict.update(self, _iter_json_pairs(text))
+                    else:
+                        dict.update(self, (row for row in csv.reader(text) if row))
+                finally:
+                    text.detach()
+        except ImportError:
+            raise
+        except Exception as exc:
+            raise ValueError(f"Corrupt {file_format} store {self.filename}: {exc}") from exc
+
+    def get_many(self, keys: Iterable[Any]) -> dict[Any, Any]:
+        """Fetch the values for ``keys`` from memory.
+
+        Args:
+            keys (Iterable): The keys to look up.
+
+        Returns:
+            dict: The found keys mapped to their values.
+        """
+        return {k: self[k] for k in keys if k in self}
+
+    def put_many(self, items: Mapping[Any, Any] | Iterable[tuple[Any, Any]]) -> int:
+        """Insert or replace many pairs. They reach disk together on the next sync.
+
+        Args:
+            items (Mapping | Iterable[tuple]): The pairs to write.
+
+        Returns:
+            int: The number of pairs written.
+        """
+        pairs = dict(iter_items(items))
+        self.update(pairs)
+        return len(pairs)
+
+    def delete_many(self, keys: Iterable[Any]) -> int:
+        """Delete many keys. The removal reaches disk on the next sync.
+
+        Args:
+            keys (Iterable): The keys to delete.
+
+        Returns:
+            int: The number of keys removed.
+        """
+        removed = 0
+        for k in keys:
+            if k in self:
+                del self[k]
+                removed += 1
+        return removed
+
+    def scan(self, prefix: str | None = None) -> Iterator[tuple[Any, Any]]:
+        """Iterate over the pairs whose key starts with ``prefix``.
+
+        Args:
+            prefix (str | None): The key prefix. ``None`` yields every pair.
+
+        Yields:
+            tuple: The matching ``(key, value)`` pairs.
+        """
+        for k, v in list(self.items()):
+            if prefix is None or str(k).startswith(prefix):
+                yield k, v
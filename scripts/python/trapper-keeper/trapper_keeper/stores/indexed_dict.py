@@ -0,0 +1,395 @@
+"""Read-mostly persistent dictionary backed by a memory-mapped, sorted on-disk key index.
+
+Unlike `PersistentDict`, opening an `IndexedDict` does not read the store into memory.  The file is
+``mmap``ed, keys are found by binary search over a fixed-width index and values are decoded only
+when accessed, so startup time and resident memory stay flat as the store grows.
+
+File layout::
+
+    header | value blobs | key blobs | index table
+
+The header holds a magic string, the value codec, the number of keys and the offset of the index
+table.  Each index slot stores the offset and length of a key and of its value, sorted by the UTF-8
+encoded key.
+
+A `PersistentDict` file, or a journal a journaled `PersistentDict` left next to the file, is read
+into the overlay when the store is opened and written out in this layout on the next sync, so a
+store can be opened lazily or not regardless of which kind wrote it last.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import os
+import pickle
+import shutil
+import struct
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from typing import Any
+
+from trapper_keeper.stores.dict_store import (
+    BINARY_FORMATS,
+    FORMATS,
+    PersistentDict,
+    discard_journal,
+    journal_files,
+    sniff_format,
+)
+from trapper_keeper.stores.protocol import iter_items
+
+MAGIC: bytes = b"TKIDX01"
+HEADER = struct.Struct("<7sBQQ")  # magic, codec, count, index offset
+SLOT = struct.Struct("<QIQI")  # key offset, key length, value offset, value length
+# decoded values kept resident, measured by their encoded size
+MAX_CACHED_BYTES: int = 4 * 1024 * 1024
+
+CODECS: dict[str, int] = {"json": 0, "pickle": 1}
+
+
+def _encode(codec: int, value: Any) -> bytes:
+    """Encode a value with the codec stored in the header."""
+    if codec == CODECS["pickle"]:
+        return pickle.dumps(value, 2)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _decode(codec: int, data: bytes) -> Any:
+    """Decode a value with the codec stored in the header."""
+    if codec == CODECS["pickle"]:
+        return pickle.loads(data)
+    return json.loads(data)
+
+
+class IndexedDict(MutableMapping):
+    """Lazily loaded dictionary with an API compatible with `PersistentDict`.
+
+    Reads are served from the memory-mapped file.  Writes are kept in an in-memory overlay until
+    ``sync`` or ``close`` merges them into a new file, copying untouched values byte for byte
+    without decoding them.
+    """
+
+    def __init__(  # noqa: PLR0913 - mirrors the PersistentDict constructor
+        self, filename, flag="c", mode=None, file_format="json", *, max_cached_bytes=MAX_CACHED_BYTES, read_journal=True
+    ):
+        """Open an indexed dictionary.
+
+        Args:
+            filename: The path of the store file.
+            flag (str): ``r`` for readonly, ``c`` to create if missing or ``n`` to start empty.
+            mode: None or an octal triple like 0o600 applied to the file on sync.
+            file_format (str): The codec for new values, ``json`` or ``pickle``.
+            max_cached_bytes (int): Upper bound for the encoded size of decoded values kept resident.
+            read_journal (bool): Read a `PersistentDict` journal left next to the file. Defaults to True.
+        """
+        if file_format not in CODECS:
+            raise NotImplementedError(f"Unknown format: {file_format!r}")
+        self.flag = flag
+        self.mode = mode
+        self.format = file_format
+        self.filename = filename
+        self.max_cached_bytes = max_cached_bytes
+        self._codec = CODECS[file_format]
+        self._fileobj = None
+        self._mmap: mmap.mmap | None = None
+        self._count = 0
+        self._index_offset = 0
+        self._cache: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._cached_bytes = 0
+        self._overlay: dict[str, Any] = {}
+        self._deleted: set[str] = set()
+        self._len = 0
+        # the file has to be rewritten even without changes: emptied by flag n, or in another layout
+        self._rewrite = flag == "n" and os.path.exists(filename)
+        if flag != "n" and os.access(filename, os.R_OK):
+            if (read_journal and journal_files(filename)) or not self._is_indexed():
+                self._convert()
+            elif os.path.getsize(filename) > 0:
+                self._open()
+        self._len = self._count + len(self._overlay)
+
+    def _is_indexed(self) -> bool:
+        """Return True if the store file is empty or already in the indexed layout."""
+        with open(self.filename, "rb") as fileobj:
+            head = fileobj.read(len(MAGIC))
+        return not head or head == MAGIC
+
+    def _convert(self) -> None:
+        """Read a `PersistentDict` file and its journal into the overlay, to be rewritten on sync."""
+        with open(self.filename, "rb") as fileobj:
+            source_format = sniff_format(fileobj)
+        if source_format in BINARY_FORMATS:
+            # values that only pickle round-trips
+            self._codec = CODECS["pickle"]
+        loaded = PersistentDict(self.filename, flag="r", file_format=source_format if source_format in FORMATS else self.format)
+        self._overlay.update((str(k), v) for k, v in dict.items(loaded))
+        self._rewrite = True
+
+    def _open(self) -> None:
+        """Map the store file and read its header."""
+        self._fileobj = open(self.filename, "rb")  # noqa: SIM115
+        self._mmap = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, codec, self._count, self._index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._unmap()
+            raise ValueError("File not in a supported format")
+        self._codec = codec
+
+    def _unmap(self) -> None:
+        """Release the memory map and the underlying file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+        self._count = 0
+
+    def _slot(self, i: int) -> tuple[int, int, int, int]:
+        """Return the index slot ``i``."""
+        return SLOT.unpack_from(self._mmap, self._index_offset + i * SLOT.size)
+
+    def _key_at(self, i: int) -> bytes:
+        """Return the encoded key stored in slot ``i``."""
+        key_off, key_len, _, _ = self._slot(i)
+        return self._mmap[key_off:key_off + key_len]
+
+    def _bisect(self, key: bytes) -> int:
+        """Return the first slot whose key is not less than ``key``."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key: str) -> int | None:
+        """Return the slot holding ``key`` in the mapped file, if any."""
+        if self._mmap is None:
+            return None
+        encoded = key.encode()
+        i = self._bisect(encoded)
+        if i < self._count and self._key_at(i) == encoded:
+            return i
+        return None
+
+    def _value_at(self, key: str, i: int) -> Any:
+        """Decode the value in slot ``i``, going through the bounded cache."""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+        _, _, val_off, val_len = self._slot(i)
+        value = _decode(self._codec, self._mmap[val_off:val_off + val_len])
+        if val_len <= self.max_cached_bytes:
+            self._cache[key] = (value, val_len)
+            self._cached_bytes += val_len
+            while self._cached_bytes > self.max_cached_bytes:
+                _, (_, size) = self._cache.popitem(last=False)
+                self._cached_bytes -= size
+        return value
+
+    def _in_base(self, key: str) -> bool:
+        """Return True if ``key`` is live in the mapped file."""
+        return key not in self._deleted and self._find(key) is not None
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the value for ``key``, decoding it on first access."""
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        return self._value_at(key, i)
+
+    def __contains__(self, key: object) -> bool:
+        """Return True if ``key`` is present, without decoding its value."""
+        if not isinstance(key, str):
+            return False
+        return key in self._overlay or self._in_base(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        """Stage a value in the overlay until the next sync."""
+        if not isinstance(key, str):
+            raise TypeError(f"IndexedDict keys must be str, not {type(key).__name__}")
+        if key not in self:
+            self._len += 1
+        self._overlay[key] = value
+        self._deleted.discard(key)
+        self._evict(key)
+
+    def __delitem__(self, key: str) -> None:
+        """Stage the removal of ``key`` until the next sync."""
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if self._find(key) is not None:
+            self._deleted.add(key)
+        self._evict(key)
+        self._len -= 1
+
+    def _evict(self, key: str) -> None:
+        """Drop a stale decoded value from the cache."""
+        cached = self._cache.pop(key, None)
+        if cached is not None:
+            self._cached_bytes -= cached[1]
+
+    def __len__(self) -> int:
+        """Return the number of live keys."""
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the live keys in sorted order."""
+        return (k for k, _ in self._merged(None, decode=False))
+
+    def _base_slots(self, prefix: bytes | None) -> Iterator[tuple[str, int]]:
+        """Yield ``(key, slot)`` from the mapped file, starting at ``prefix`` when given."""
+        if self._mmap is None:
+            return
+        i = self._bisect(prefix) if prefix else 0
+        while i < self._count:
+            raw = self._key_at(i)
+            if prefix and not raw.startswith(prefix):
+                return
+            key = raw.decode()
+            if key not in self._deleted and key not in self._overlay:
+                yield key, i
+            i += 1
+
+    def _merged(self, prefix: str | None, decode: bool = True) -> Iterator[tuple[str, Any]]:
+        """Merge the sorted mapped keys with the sorted overlay keys."""
+        encoded = prefix.encode() if prefix else None
+        base = (
+            (k, self._value_at(k, i) if decode else i) for k, i in self._base_slots(encoded)
+        )
+        overlay = sorted(
+            (k, v) for k, v in self._overlay.items() if not prefix or k.startswith(prefix)
+        )
+        yield from heapq.merge(base, overlay, key=lambda kv: kv[0].encode())
+
+    def sync(self) -> None:
+        """Merge the overlay into a new file and remap it.  Does no I/O when nothing changed."""
+        if self.flag == "r" or (not self._overlay and not self._deleted and not self._rewrite):
+            return
+        tempname = f"{self.filename}.tmp"
+        slots: list[tuple[bytes, int, int]] = []
+        try:
+            with open(tempname, "wb") as out:
+                out.write(HEADER.pack(MAGIC, self._codec, 0, 0))
+                offset = HEADER.size
+                for key, data in self._merged_raw():
+                    out.write(data)
+                    slots.append((key.encode(), offset, len(data)))
+                    offset += len(data)
+                key_offsets = []
+                for raw, _, _ in slots:
+                    key_offsets.append(offset)
+                    out.write(raw)
+                    offset += len(raw)
+                index_offset = offset
+                for (raw, val_off, val_len), key_off in zip(slots, key_offsets, strict=True):
+                    out.write(SLOT.pack(key_off, len(raw), val_off, val_len))
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, self._codec, len(slots), index_offset))
+                out.flush()
+                os.fsync(out.fileno())
+        except Exception:
+            os.remove(tempname)
+            raise
+        self._unmap()
+        shutil.move(tempname, self.filename)  # atomic commit
+        if self.mode is not None:
+            os.chmod(self.filename, self.mode)
+        self._overlay.clear()
+        self._deleted.clear()
+        if self._rewrite:
+            # the records of a journal are part of the new file now
+            discard_journal(self.filename)
+            self._rewrite = False
+        self._open()
+
+    def _merged_raw(self) -> Iterator[tuple[str, bytes]]:
+        """Yield sorted ``(key, encoded value)`` pairs, copying untouched values without decoding them."""
+
+        def _raw(i: int) -> bytes:
+            _, _, val_off, val_len = self._slot(i)
+            return self._mmap[val_off:val_off + val_len]
+
+        base = ((k, _raw(i)) for k, i in self._base_slots(None))
+        overlay = ((k, _encode(self._codec, v)) for k, v in sorted(self._overlay.items()))
+        yield from heapq.merge(base, overlay, key=lambda kv: kv[0].encode())
+
+    def close(self) -> None:
+        """Synchronize and release the memory map."""
+        self.sync()
+        self._cache.clear()
+        self._cached_bytes = 0
+        self._unmap()
+
+    def __enter__(self):
+        """Context manager enter."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Context manager exit."""
+        self.close()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        """Fetch the values for ``keys``, decoding only those values.
+
+        Args:
+            keys (Iterable[str]): The keys to look up.
+
+        Returns:
+            dict[str, Any]: The found keys mapped to their values.
+        """
+        return {k: self[k] for k in keys if k in self}
+
+    def put_many(self, items: Mapping[str, Any] | Iterable[tuple[str, Any]]) -> int:
+        """Stage many pairs. They are merged into the file together on the next sync.
+
+        Args:
+            items (Mapping | Iterable[tuple]): The pairs to write.
+
+        Returns:
+            int: The number of pairs written.
+        """
+        written = 0
+        for k, v in iter_items(items):
+            self[k] = v
+            written += 1
+        return written
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Stage the removal of many keys until the next sync.
+
+        Args:
+            keys (Iterable[str]): The keys to delete.
+
+        Returns:
+            int: The number of keys removed.
+        """
+        removed = 0
+        for k in keys:
+            if k in self:
+                del self[k]
+                removed += 1
+        return removed
+
+    def scan(self, prefix: str | None = None) -> Iterator[tuple[str, Any]]:
+        """Iterate over the pairs whose key starts with ``prefix`` in sorted order.
+
+        The mapped index is entered by binary search, so only matching values are decoded.
+
+        Args:
+            prefix (str | None): The key prefix. ``None`` yields every pair.
+
+        Yields:
+            tuple[str, Any]: The matching ``(key, value)`` pairs.
+        """
+        yield from self._merged(prefix)
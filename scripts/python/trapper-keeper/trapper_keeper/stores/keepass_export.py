@@ -0,0 +1,239 @@
+"""Export an open Keepass database and its attachments without keepassxc-cli.
+
+`export_xml` streams the decrypted tree through lxml's incremental writer one entry at a time, in
+the unencrypted KeePass 2.x XML layout ``keepassxc-cli export`` writes: protected values are in
+clear text and marked ``ProtectInMemory``, and KDBX4 attachments are inlined as base64
+``Meta/Binaries``.  `export_jsonl` writes one JSON object per entry.  `export_attachments` writes
+many attachments of the open database concurrently.  Every file is created with 0600 permissions
+under a ``.part`` name and only moved into place once it is complete.
+"""
+
+from __future__ import annotations
+
+import base64
+import copy
+import json
+import os
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from lxml import etree
+
+from trapper_keeper.stores.keepass_index import PATH_SEP, group_path
+from trapper_keeper.tracing import span
+
+if TYPE_CHECKING:
+    from pykeepass.entry import Entry
+
+    from trapper_keeper.stores.keepass_store import KeepassStore
+
+EXPORT_FORMATS: tuple[str, ...] = ("xml", "jsonl")
+FILE_MODE: int = 0o600
+# elements whose children are streamed one by one instead of being serialized whole
+_CONTAINERS = frozenset({"KeePassFile", "Root", "Group"})
+
+
+@dataclass
+class ExportStats:
+    """Counters describing one export."""
+
+    entries: int = 0
+    files: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+
+    def report(self, action: str) -> str:
+        """Return a one line summary of the export."""
+        return f"{action} {self.entries} entries and {self.files} files, {self.bytes_written} bytes in {self.seconds:.3f}s"
+
+
+@contextmanager
+def private_file(out_file: Path, mode: int = FILE_MODE) -> Iterator[BinaryIO]:
+    """Open ``<out_file>.part`` with ``mode`` permissions and move it over ``out_file`` once the block succeeds."""
+    part = out_file.with_name(f"{out_file.name}.part")
+    fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    os.fchmod(fd, mode)
+    try:
+        with os.fdopen(fd, "wb") as fileobj:
+            yield fileobj
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    os.replace(part, out_file)
+
+
+def _unprotected(entry: etree._Element) -> etree._Element:
+    """Return a copy of an entry element with its protected values marked the way unencrypted XML does."""
+    entry = copy.deepcopy(entry)
+    for value in entry.iter("Value"):
+        if value.attrib.pop("Protected", None) == "True":
+            value.set("ProtectInMemory", "True")
+    return entry
+
+
+def _binaries(kp_db: KeepassStore) -> Iterator[etree._Element]:
+    """Yield the attachment binaries of a KDBX4 database as KDBX3 ``Meta/Binaries/Binary`` elements."""
+    for binary_id, data in enumerate(kp_db.binaries):
+        binary = etree.Element("Binary", ID=str(binary_id), Compressed="False")
+        binary.text = base64.b64encode(data).decode("ascii")
+        yield binary
+
+
+def _write_xml(xf, elem: etree._Element, kp_db: KeepassStore, stats: ExportStats) -> None:
+    """Write ``elem`` to the incremental writer, streaming containers child by child."""
+    if elem.tag == "Entry":
+        xf.write(_unprotected(elem), pretty_print=True, with_tail=False)
+        stats.entries += 1
+    elif elem.tag in _CONTAINERS or (elem.tag == "Meta" and kp_db.version >= (4, 0)):
+        with xf.element(elem.tag, dict(elem.attrib)):
+            for child in elem:
+                _write_xml(xf, child, kp_db, stats)
+            if elem.tag == "Meta":
+                with xf.element("Binaries"):
+                    for binary in _binaries(kp_db):
+                        xf.write(binary, pretty_print=True, with_tail=False)
+    else:
+        xf.write(elem, pretty_print=True, with_tail=False)
+
+
+def export_xml(kp_db: KeepassStore, out_file: Path) -> ExportStats:
+    """Stream the decrypted XML of ``kp_db`` to ``out_file``.
+
+    Args:
+        kp_db (KeepassStore): The open database.
+        out_file (Path): The XML file to write.
+
+    Returns:
+        ExportStats: The entries and bytes written.
+    """
+    stats = ExportStats()
+    start = time.perf_counter()
+    with private_file(out_file) as fileobj, etree.xmlfile(fileobj, encoding="utf-8") as xf:
+        xf.write_declaration(standalone=True)
+        _write_xml(xf, kp_db.tree.getroot(), kp_db, stats)
+    stats.files = 1
+    stats.bytes_written = out_file.stat().st_size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def entry_record(entry: Entry, password: bool = True) -> dict:
+    """Return the fields of an entry as a JSON serializable dictionary.
+
+    Args:
+        entry (Entry): The entry.
+        password (bool, optional): Include the password. Defaults to True.
+
+    Returns:
+        dict: The entry, with attachments listed by file name only.
+    """
+    return {
+        "uuid": str(entry.uuid),
+        "path": group_path(entry.parentgroup),
+        "title": entry.title,
+        "username": entry.username,
+        **({"password": entry.password} if password else {}),
+        "url": entry.url,
+        "notes": entry.notes,
+        "tags": entry.tags or [],
+        "properties": entry.custom_properties,
+        "attachments": [attachment.filename for attachment in entry.attachments],
+        "mtime": entry.mtime.isoformat() if entry.mtime else None,
+    }
+
+
+def export_jsonl(kp_db: KeepassStore, out_file: Path, entries: Iterable[Entry] | None = None) -> ExportStats:
+    """Write one JSON object per entry of ``kp_db`` to ``out_file``, see `entry_record`.
+
+    Args:
+        kp_db (KeepassStore): The open database.
+        out_file (Path): The JSON lines file to write.
+        entries (Iterable[Entry] | None, optional): The entries to write. Defaults to every entry.
+
+    Returns:
+        ExportStats: The entries and bytes written.
+    """
+    stats = ExportStats()
+    start = time.perf_counter()
+    with private_file(out_file) as fileobj:
+        for entry in kp_db.index.find_entries() if entries is None else entries:
+            fileobj.write(json.dumps(entry_record(entry), default=str).encode("utf-8") + b"\n")
+            stats.entries += 1
+    stats.files = 1
+    stats.bytes_written = out_file.stat().st_size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def export_kp_db(kp_db: KeepassStore, out_file: Path, fmt: str = "xml") -> ExportStats:
+    """Export ``kp_db`` to ``out_file`` as ``xml`` or ``jsonl``.
+
+    Raises:
+        ValueError: If the format is not one of `EXPORT_FORMATS`.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    with span("keepass.export", fmt=fmt) as traced:
+        stats = export_xml(kp_db, out_file) if fmt == "xml" else export_jsonl(kp_db, out_file)
+        traced.set(bytes=stats.bytes_written, entries=stats.entries)
+    return stats
+
+
+def _write_attachment(job: tuple[Path, bytes]) -> int:
+    dest, data = job
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with private_file(dest) as fileobj:
+        fileobj.write(data)
+    return len(data)
+
+
+def export_attachments(
+    kp_db: KeepassStore, exports: Iterable[tuple[str, str, Path]], max_workers: int | None = None
+) -> ExportStats:
+    """Write many attachments of one open database, each to its own file, on a pool of threads.
+
+    Every attachment is looked up before any file is written, so a missing one fails the whole export.
+
+    Args:
+        kp_db (KeepassStore): The open database.
+        exports (Iterable[tuple[str, str, Path]]): ``(entry path, attachment name, export file)``
+            triples. The entry path is the slash separated group path followed by the entry title.
+        max_workers (int | None, optional): The number of writer threads. Defaults to the executor default.
+
+    Returns:
+        ExportStats: The files and bytes written.
+
+    Raises:
+        ValueError: If an entry or one of its attachments does not exist.
+    """
+    stats = ExportStats()
+    start = time.perf_counter()
+    binaries = kp_db.binaries
+    jobs: list[tuple[Path, bytes]] = []
+    missing: list[str] = []
+    for entry_path, attachment_name, export_file in exports:
+        path, _, title = entry_path.strip(PATH_SEP).rpartition(PATH_SEP)
+        entry = kp_db.index.find_entry(title=title, group=path)
+        attachment = next((a for a in entry.attachments if a.filename == attachment_name), None) if entry else None
+        if attachment is None:
+            missing.append(f"{entry_path}{PATH_SEP}{attachment_name}")
+            continue
+        jobs.append((Path(export_file), binaries[attachment.id]))
+    if missing:
+        raise ValueError(f"Attachments not found: {', '.join(missing)}")
+
+    with (
+        span("keepass.export_attachments", files=len(jobs)) as traced,
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tk-export") as pool,
+    ):
+        for size in pool.map(_write_attachment, jobs):
+            stats.files += 1
+            stats.bytes_written += size
+        traced.set(bytes=stats.bytes_written)
+    stats.seconds = time.perf_counter() - start
+    return stats
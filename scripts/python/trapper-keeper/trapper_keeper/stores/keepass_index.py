@@ -0,0 +1,274 @@
+"""In-memory hash indexes over the entries and groups of an open Keepass database.
+
+pykeepass answers every ``find_entries``/``find_groups`` call with an XPath query over the whole
+XML tree.  `KeepassIndex` walks the tree once and then answers lookups by UUID, title, group path,
+tag and custom property key from dictionaries.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from itertools import islice
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+if TYPE_CHECKING:
+    from pykeepass import PyKeePass
+    from pykeepass.entry import Entry
+    from pykeepass.group import Group
+
+# separator used to render a group path as a single lookup key
+PATH_SEP: str = "/"
+GLOB_CHARS: str = "*?["
+
+
+def group_path(group: Group | None) -> str:
+    """Return the slash separated path of a group, ``""`` for the root group."""
+    if group is None:
+        return ""
+    return PATH_SEP.join(name or "" for name in group.path)
+
+
+class KeepassIndex:
+    """Hash indexes over one Keepass tree.
+
+    Entries are indexed by UUID, title, parent group path, tag and custom property key.  Groups are
+    indexed by UUID, name and path.  The owner keeps the indexes current by calling ``add_*`` and
+    ``remove_*`` as it mutates the tree, and ``reindex_entry`` after changing indexed entry fields.
+    """
+
+    def __init__(self, kp_db: PyKeePass):
+        """Build every index with a single walk over the groups and entries of ``kp_db``."""
+        self.entries: dict[UUID, Entry] = {}
+        self.groups: dict[UUID, Group] = {}
+        self._by_title: dict[str, dict[UUID, Entry]] = defaultdict(dict)
+        self._by_group: dict[str, dict[UUID, Entry]] = defaultdict(dict)
+        self._by_tag: dict[str, dict[UUID, Entry]] = defaultdict(dict)
+        self._by_property: dict[str, dict[UUID, Entry]] = defaultdict(dict)
+        self._groups_by_name: dict[str, dict[UUID, Group]] = defaultdict(dict)
+        self._groups_by_path: dict[str, Group] = {}
+        # the keys each entry was indexed under, so it can be removed after its fields change
+        self._entry_keys: dict[UUID, tuple[str | None, str, tuple[str, ...], tuple[str, ...]]] = {}
+        self._group_keys: dict[UUID, tuple[str | None, str]] = {}
+        for group in kp_db.groups:
+            self.add_group(group)
+        for entry in kp_db.entries:
+            self.add_entry(entry)
+
+    def add_entry(self, entry: Entry) -> None:
+        """Index an entry under its current fields."""
+        uuid = entry.uuid
+        if uuid in self._entry_keys:
+            self.remove_entry(entry)
+        keys = (
+            entry.title,
+            group_path(entry.parentgroup),
+            tuple(entry.tags or ()),
+            tuple(entry.custom_properties),
+        )
+        title, path, tags, props = keys
+        self.entries[uuid] = entry
+        self._entry_keys[uuid] = keys
+        self._by_title[title][uuid] = entry
+        self._by_group[path][uuid] = entry
+        for tag in tags:
+            self._by_tag[tag][uuid] = entry
+        for prop in props:
+            self._by_property[prop][uuid] = entry
+
+    def remove_entry(self, entry: Entry) -> None:
+        """Drop an entry from every index it was added to."""
+        uuid = entry.uuid
+        keys = self._entry_keys.pop(uuid, None)
+        self.entries.pop(uuid, None)
+        if keys is None:
+            return
+        title, path, tags, props = keys
+        self._discard(self._by_title, title, uuid)
+        self._discard(self._by_group, path, uuid)
+        for tag in tags:
+            self._discard(self._by_tag, tag, uuid)
+        for prop in props:
+            self._discard(self._by_property, prop, uuid)
+
+    def reindex_entry(self, entry: Entry) -> None:
+        """Refresh an entry after its title, tags, custom properties or group changed."""
+        self.remove_entry(entry)
+        self.add_entry(entry)
+
+    def add_group(self, group: Group) -> None:
+        """Index a group under its name and path."""
+        uuid = group.uuid
+        if uuid in self._group_keys:
+            self.remove_group(group, recursive=False)
+        keys = (group.name, group_path(group))
+        name, path = keys
+        self.groups[uuid] = group
+        self._group_keys[uuid] = keys
+        self._groups_by_name[name][uuid] = group
+        self._groups_by_path[path] = group
+
+    def remove_group(self, group: Group, recursive: bool = True) -> None:
+        """Drop a group, and by default everything below it, from the indexes."""
+        uuid = group.uuid
+        keys = self._group_keys.pop(uuid, None)
+        self.groups.pop(uuid, None)
+        if keys is None:
+            return
+        name, path = keys
+        self._discard(self._groups_by_name, name, uuid)
+        if self._groups_by_path.get(path) is not None and self._groups_by_path[path].uuid == uuid:
+            del self._groups_by_path[path]
+        if not recursive:
+            return
+        prefix = f"{path}{PATH_SEP}"
+        for entry in list(self._by_group.get(path, {}).values()):
+            self.remove_entry(entry)
+        for sub_uuid, (_, sub_path) in list(self._group_keys.items()):
+            if sub_path.startswith(prefix):
+                self.remove_group(self.groups[sub_uuid], recursive=True)
+
+    def reindex_group(self, group: Group) -> None:
+        """Refresh a group and everything below it after it was renamed or moved."""
+        self.remove_group(group)
+        self.add_group(group)
+        for sub_group in group.subgroups:
+            self.reindex_group(sub_group)
+        for entry in group.entries:
+            self.add_entry(entry)
+
+    @staticmethod
+    def _discard(index: dict[str, dict[UUID, object]], key, uuid: UUID) -> None:
+        """Remove ``uuid`` from one bucket of ``index`` and drop the bucket once it is empty."""
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(uuid, None)
+        if not bucket:
+            del index[key]
+
+    def find_entries(  # noqa: PLR0913 - one optional criterion per index
+        self,
+        *,
+        uuid: UUID | None = None,
+        title: str | None = None,
+        group: str | Group | None = None,
+        tag: str | None = None,
+        prop: str | None = None,
+        recursive: bool = False,
+    ) -> list[Entry]:
+        """Return the entries matching every given criterion.
+
+        Args:
+            uuid (UUID | None): The entry UUID.
+            title (str | None): The exact entry title.
+            group (str | Group | None): The parent group, or its slash separated path.
+            tag (str | None): A tag the entry carries.
+            prop (str | None): A custom property key the entry has.
+            recursive (bool): Also match entries in subgroups of ``group``. Defaults to False.
+
+        Returns:
+            list[Entry]: The matching entries, smallest candidate set first.
+        """
+        candidates: list[dict[UUID, Entry]] = []
+        if uuid is not None:
+            entry = self.entries.get(uuid)
+            candidates.append({uuid: entry} if entry is not None else {})
+        if title is not None:
+            candidates.append(self._by_title.get(title, {}))
+        if group is not None:
+            path = group if isinstance(group, str) else group_path(group)
+            if recursive:
+                prefix = f"{path}{PATH_SEP}" if path else ""
+                merged: dict[UUID, Entry] = {}
+                for sub_path, bucket in self._by_group.items():
+                    if sub_path == path or sub_path.startswith(prefix):
+                        merged.update(bucket)
+                candidates.append(merged)
+            else:
+                candidates.append(self._by_group.get(path, {}))
+        if tag is not None:
+            candidates.append(self._by_tag.get(tag, {}))
+        if prop is not None:
+            candidates.append(self._by_property.get(prop, {}))
+        if not candidates:
+            return list(self.entries.values())
+        smallest, *rest = sorted(candidates, key=len)
+        return [entry for key, entry in smallest.items() if all(key in other for other in rest)]
+
+    def find_entry(self, **criteria) -> Entry | None:
+        """Return the first entry matching ``criteria``, see ``find_entries``."""
+        found = self.find_entries(**criteria)
+        return found[0] if found else None
+
+    def find_groups(
+        self, uuid: UUID | None = None, name: str | None = None, path: str | None = None
+    ) -> list[Group]:
+        """Return the groups matching every given criterion.
+
+        Args:
+            uuid (UUID | None): The group UUID.
+            name (str | None): The group name.
+            path (str | None): The slash separated group path.
+
+        Returns:
+            list[Group]: The matching groups.
+        """
+        if uuid is not None:
+            found = self.groups.get(uuid)
+            groups = [found] if found is not None else []
+        elif path is not None:
+            found = self._groups_by_path.get(path)
+            groups = [found] if found is not None else []
+        elif name is not None:
+            return list(self._groups_by_name.get(name, {}).values())
+        else:
+            return list(self.groups.values())
+        if path is not None:
+            groups = [group for group in groups if self._group_keys[group.uuid][1] == path]
+        if name is not None:
+            groups = [group for group in groups if group.name == name]
+        return groups
+
+    def find_group(self, **criteria) -> Group | None:
+        """Return the first group matching ``criteria``, see ``find_groups``."""
+        found = self.find_groups(**criteria)
+        return found[0] if found else None
+
+
+@dataclass(frozen=True)
+class EntryQuery:
+    """A filter over the entries of a `KeepassIndex`, with paging.
+
+    Every criterion that is set must match.  ``title`` may be a shell style glob, and ``group``
+    matches the entries of that group path and, when ``recursive``, of its subgroups.
+    """
+
+    group: str | None = None
+    title: str | None = None
+    tag: str | None = None
+    prop: str | None = None
+    recursive: bool = True
+    offset: int = 0
+    limit: int | None = None
+    # load the attachment bytes to report their size and digest
+    attachments: bool = False
+
+    def entries(self, index: KeepassIndex) -> Iterator[Entry]:
+        """Yield the matching entries in index order, stable for an unchanged database, skipping ``offset`` and stopping after ``limit``."""
+        glob = self.title if self.title and any(c in self.title for c in GLOB_CHARS) else None
+        found: Iterator[Entry] = iter(
+            index.find_entries(
+                title=None if glob else self.title,
+                group=None if self.group is None else self.group.strip(PATH_SEP),
+                tag=self.tag,
+                prop=self.prop,
+                recursive=self.recursive,
+            )
+        )
+        if glob is not None:
+            found = (entry for entry in found if fnmatchcase(entry.title or "", glob))
+        return islice(found, self.offset, None if self.limit is None else self.offset + self.limit)
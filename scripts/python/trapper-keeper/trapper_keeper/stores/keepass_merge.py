@@ -0,0 +1,284 @@
+"""UUID aware merge of one Keepass group tree into another.
+
+Entries are paired by UUID through the `KeepassIndex` of both stores, and every entry is hashed
+once over the fields a user can change.  A merge is planned first, as a list of `MergeAction`, and
+only then applied, so a dry run prints exactly what a real run would do.  Planning and applying
+are linear in the number of entries on both sides.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from pykeepass.entry import Entry
+
+from trapper_keeper.stores.keepass_index import PATH_SEP, group_path
+
+if TYPE_CHECKING:
+    from pykeepass.group import Group
+
+    from trapper_keeper.stores.keepass_store import KeepassStore
+
+
+class MergePolicy(StrEnum):
+    """Which side wins when an entry changed on both sides."""
+
+    NEWER = "newer"  # the entry modified last wins
+    SOURCE = "source"  # the source always wins
+    TARGET = "target"  # the target is never overwritten
+
+
+class MergeOp(StrEnum):
+    """What a merge does to one entry of the target."""
+
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+    CONFLICT = "conflict"
+
+
+@dataclass(frozen=True)
+class MergeAction:
+    """One planned change to the target tree."""
+
+    op: MergeOp
+    uuid: UUID
+    title: str | None
+    path: str
+    reason: str = ""
+
+    def __str__(self) -> str:
+        """Return the action as one diff line."""
+        marker = {MergeOp.INSERT: "+", MergeOp.UPDATE: "~", MergeOp.DELETE: "-", MergeOp.CONFLICT: "!"}[self.op]
+        name = f"{self.path}{PATH_SEP}{self.title}" if self.path else self.title
+        reason = f" ({self.reason})" if self.reason else ""
+        return f"{marker} {name}{reason}"
+
+
+@dataclass
+class MergePlan:
+    """The actions that bring the target in line with the source."""
+
+    actions: list[MergeAction] = field(default_factory=list)
+    unchanged: int = 0
+
+    def count(self, op: MergeOp) -> int:
+        """Return the number of planned actions of one kind."""
+        return sum(1 for action in self.actions if action.op == op)
+
+    def diff(self) -> str:
+        """Return the plan as a diff, one line per action and a summary line."""
+        lines = [str(action) for action in self.actions]
+        lines.append(
+            f"{self.count(MergeOp.INSERT)} inserted, {self.count(MergeOp.UPDATE)} updated, "
+            f"{self.count(MergeOp.DELETE)} deleted, {self.count(MergeOp.CONFLICT)} conflicts, "
+            f"{self.unchanged} unchanged"
+        )
+        return "\n".join(lines)
+
+
+def _binary_digests(kp_db: KeepassStore) -> list[bytes]:
+    """Return the digest of every binary in the database, by binary ID."""
+    return [hashlib.sha256(data).digest() for data in kp_db.binaries]
+
+
+def _attachment_refs(entry: Entry) -> list[tuple[str, int]]:
+    """Return ``(filename, binary ID)`` for the attachments of an entry without an XPath query."""
+    refs = []
+    for binary in entry._element.findall("Binary"):
+        value = binary.find("Value")
+        if value is not None and "Ref" in value.attrib:
+            refs.append((binary.findtext("Key") or "", int(value.attrib["Ref"])))
+    return refs
+
+
+def content_hash(entry: Entry, binary_digests: list[bytes]) -> bytes:
+    """Hash the user visible content of an entry, ignoring timestamps and history.
+
+    Args:
+        entry (Entry): The entry.
+        binary_digests (list[bytes]): The digests of the binaries of its database, see ``_binary_digests``.
+
+    Returns:
+        bytes: The SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    fields = [entry.title, entry.username, entry.password, entry.url, entry.notes, entry.otp]
+    fields.extend(sorted(entry.tags or ()))
+    for value in fields:
+        digest.update(b"\0" + (value or "").encode())
+    for key, value in sorted(entry.custom_properties.items()):
+        digest.update(b"\1" + key.encode() + b"\0" + (value or "").encode())
+    for filename, ref in sorted(_attachment_refs(entry)):
+        digest.update(b"\2" + filename.encode() + b"\0")
+        digest.update(binary_digests[ref] if ref < len(binary_digests) else b"")
+    return digest.digest()
+
+
+def _relative_path(group: Group, root: Group) -> str:
+    """Return the path of ``group`` below ``root``."""
+    path, root_path = group_path(group), group_path(root)
+    return path[len(root_path):].lstrip(PATH_SEP)
+
+
+def _entries_by_uuid(kp_db: KeepassStore, root: Group, exclude: frozenset[str]) -> dict[UUID, Entry]:
+    return {
+        entry.uuid: entry
+        for entry in kp_db.index.find_entries(group=root, recursive=True)
+        if entry.title not in exclude
+    }
+
+
+class KeepassMerge:
+    """Merge the entries below a group of one store into a group of another."""
+
+    def __init__(  # noqa: PLR0913 - both merge roots plus keyword-only options
+        self,
+        src: KeepassStore,
+        src_group: Group,
+        dst: KeepassStore,
+        dst_group: Group,
+        *,
+        policy: MergePolicy | str = MergePolicy.NEWER,
+        delete: bool = False,
+        exclude_titles: frozenset[str] | set[str] = frozenset(),
+    ):
+        """Initialize the merge.
+
+        Args:
+            src (KeepassStore): The store merged from.
+            src_group (Group): The group of ``src`` whose entries are merged, recursively.
+            dst (KeepassStore): The store merged into.
+            dst_group (Group): The group of ``dst`` receiving the entries.
+            policy (MergePolicy | str, optional): Who wins when both sides changed. Defaults to newer.
+            delete (bool, optional): Delete target entries that are not in the source. Defaults to False.
+            exclude_titles (set[str], optional): Entry titles left alone on both sides.
+        """
+        self.src, self.src_group = src, src_group
+        self.dst, self.dst_group = dst, dst_group
+        self.policy = MergePolicy(policy)
+        self.delete = delete
+        self.exclude_titles = frozenset(exclude_titles)
+        self._src_digests = _binary_digests(src)
+        self._dst_digests = _binary_digests(dst)
+
+    def plan(self) -> MergePlan:
+        """Compare both trees and return the actions a merge would apply."""
+        plan = MergePlan()
+        src_entries = _entries_by_uuid(self.src, self.src_group, self.exclude_titles)
+        dst_entries = _entries_by_uuid(self.dst, self.dst_group, self.exclude_titles)
+        for uuid, src_entry in src_entries.items():
+            path = _relative_path(src_entry.parentgroup, self.src_group)
+            dst_entry = dst_entries.get(uuid)
+            if dst_entry is None:
+                moved = self._outside_root(uuid)
+                if moved is None:
+                    plan.actions.append(MergeAction(MergeOp.INSERT, uuid, src_entry.title, path))
+                else:
+                    plan.actions.append(self._move(src_entry, moved, path))
+                continue
+            if content_hash(src_entry, self._src_digests) == content_hash(dst_entry, self._dst_digests):
+                plan.unchanged += 1
+                continue
+            action = self._resolve(src_entry, dst_entry)
+            plan.actions.append(MergeAction(action[0], uuid, src_entry.title, path, action[1]))
+        if self.delete:
+            for uuid, dst_entry in dst_entries.items():
+                if uuid not in src_entries:
+                    path = _relative_path(dst_entry.parentgroup, self.dst_group)
+                    plan.actions.append(MergeAction(MergeOp.DELETE, uuid, dst_entry.title, path))
+        return plan
+
+    def _outside_root(self, uuid: UUID) -> Entry | None:
+        """Return the target entry with ``uuid`` that is not below the merge root, if there is one."""
+        entry = self.dst.index.entries.get(uuid)
+        return entry if entry is not None and entry.title not in self.exclude_titles else None
+
+    def _move(self, src_entry: Entry, dst_entry: Entry, path: str) -> MergeAction:
+        """Plan moving a target entry found outside the merge root below it, instead of inserting a copy."""
+        moved = f"moved from {group_path(dst_entry.parentgroup) or PATH_SEP}"
+        if content_hash(src_entry, self._src_digests) != content_hash(dst_entry, self._dst_digests):
+            op, reason = self._resolve(src_entry, dst_entry)
+            if op == MergeOp.CONFLICT:
+                return MergeAction(op, dst_entry.uuid, src_entry.title, path, f"{reason}, outside the merge root")
+            moved = f"{moved}, {reason}"
+        return MergeAction(MergeOp.UPDATE, dst_entry.uuid, src_entry.title, path, moved)
+
+    def _resolve(self, src_entry: Entry, dst_entry: Entry) -> tuple[MergeOp, str]:
+        """Decide what happens to an entry whose content differs on both sides."""
+        if self.policy == MergePolicy.SOURCE:
+            return MergeOp.UPDATE, "source wins"
+        if self.policy == MergePolicy.TARGET:
+            return MergeOp.CONFLICT, "target kept"
+        src_mtime, dst_mtime = src_entry.mtime, dst_entry.mtime
+        if dst_mtime is None or (src_mtime is not None and src_mtime > dst_mtime):
+            return MergeOp.UPDATE, "source is newer"
+        return MergeOp.CONFLICT, "target is newer"
+
+    def apply(self, plan: MergePlan | None = None) -> MergePlan:
+        """Apply a plan to the target inside one batch, so it is saved once.
+
+        Args:
+            plan (MergePlan | None, optional): The plan to apply. Defaults to a fresh `plan`.
+
+        Returns:
+            MergePlan: The applied plan.
+        """
+        plan = plan if plan is not None else self.plan()
+        if not any(action.op != MergeOp.CONFLICT for action in plan.actions):
+            return plan
+        dst_binary_ids = {digest: ref for ref, digest in reversed(list(enumerate(self._dst_digests)))}
+        src_binaries = self.src.binaries
+        with self.dst.batch():
+            for action in plan.actions:
+                if action.op == MergeOp.INSERT:
+                    src_entry = self.src.index.entries[action.uuid]
+                    entry = self._copy(src_entry, src_binaries, dst_binary_ids)
+                    self._group(action.path)._element.append(entry._element)
+                    self.dst.index.add_entry(entry)
+                elif action.op == MergeOp.UPDATE:
+                    src_entry = self.src.index.entries[action.uuid]
+                    dst_entry = self.dst.index.entries[action.uuid]
+                    entry = self._copy(src_entry, src_binaries, dst_binary_ids)
+                    self.dst.index.remove_entry(dst_entry)
+                    group = self._group(action.path)
+                    if dst_entry._element.getparent() is group._element:
+                        group._element.replace(dst_entry._element, entry._element)
+                    else:
+                        dst_entry._element.getparent().remove(dst_entry._element)
+                        group._element.append(entry._element)
+                    self.dst.index.add_entry(entry)
+                elif action.op == MergeOp.DELETE:
+                    self.dst.delete_entry(self.dst.index.entries[action.uuid])
+            self.dst.save()
+        return plan
+
+    def _copy(self, src_entry: Entry, src_binaries: list[bytes], dst_binary_ids: dict[bytes, int]) -> Entry:
+        """Copy an entry, UUID, times and history included, pointing its attachments at target binaries."""
+        element = copy.deepcopy(src_entry._element)
+        for value in element.iter("Value"):
+            ref = value.attrib.get("Ref")
+            if ref is None or value.getparent().tag != "Binary":
+                continue
+            digest = self._src_digests[int(ref)]
+            if digest not in dst_binary_ids:
+                dst_binary_ids[digest] = self.dst.add_binary(src_binaries[int(ref)])
+            value.attrib["Ref"] = str(dst_binary_ids[digest])
+        return Entry(element=element, kp=self.dst)
+
+    def _group(self, path: str) -> Group:
+        """Return the target group at ``path`` below the merge root, creating missing groups."""
+        group = self.dst_group
+        if not path:
+            return group
+        full_path = group_path(group)
+        for name in path.split(PATH_SEP):
+            full_path = f"{full_path}{PATH_SEP}{name}" if full_path else name
+            found = self.dst.index.find_group(path=full_path)
+            group = found if found is not None else self.dst.add_group(group, name)
+        return group
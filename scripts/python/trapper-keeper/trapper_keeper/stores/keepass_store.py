@@ -4,23 +4,64 @@ trapper-keeper and all other stores can (and should) be embedded within this sto
 
 from __future__ import annotations
 
-from contextlib import AbstractContextManager
+import functools
+import hashlib
+import json
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 from uuid import UUID
 
 from homeops_utils.file import get_file_bytes, pathify
 from homeops_utils.paths import SkipPaths
-from pykeepass import PyKeePass, create_database
+from lxml import etree
+from pykeepass import PyKeePass
 from pykeepass.entry import Entry
 from pykeepass.group import Group
+from pykeepass.pykeepass import BLANK_DATABASE_LOCATION, BLANK_DATABASE_PASSWORD
 from resources.configs.tk_conf import TkSettings
 
 from trapper_keeper.keegen import gen_passphrase, gen_utf8
+from trapper_keeper.stores.keepass_export import entry_record
+from trapper_keeper.stores.keepass_index import PATH_SEP, EntryQuery, KeepassIndex, group_path
+from trapper_keeper.stores.keepass_merge import KeepassMerge, MergePlan, MergePolicy
+from trapper_keeper.stores.protocol import iter_items
+from trapper_keeper.tracing import span
 
-settings = TkSettings.get_instance("trapper_keeper", xdg_config=True, auto_create=True)
+VIEW_FORMATS: tuple[str, ...] = ("text", "jsonl")
 
-BOOTSTRAP = settings.get("bootstrap_uuid")
-BOOTSTRAP_ENTRY = settings.get("bootstrap_entry")
+
+@functools.cache
+def tk_settings() -> TkSettings:
+    """Return the trapper_keeper settings, loaded on first use instead of when this module is imported."""
+    return TkSettings.get_instance("trapper_keeper", xdg_config=True, auto_create=True)
+
+
+def bootstrap_group_name():
+    """Return the name of the bootstrap group."""
+    return tk_settings().get("bootstrap_uuid")
+
+
+def bootstrap_entry_title():
+    """Return the title of the bootstrap entry."""
+    return tk_settings().get("bootstrap_entry")
+
+
+def _find_bootstrap_group(kp_db: PyKeePass) -> Group | None:
+    """Find the bootstrap group, through the store index when ``kp_db`` has one.
+
+    Args:
+        kp_db (PyKeePass): The Keepass database instance.
+
+    Returns:
+        Group | None: The bootstrap group if found, otherwise None.
+    """
+    if isinstance(kp_db, KeepassStore):
+        return kp_db.get_bootstrap_group()
+    return kp_db.find_groups(name=f"{bootstrap_group_name()}", first=True)
 
 
 def _create_kp_db_bootstrap_group(kp_db: PyKeePass) -> None:
@@ -29,7 +70,7 @@ def _create_kp_db_bootstrap_group(kp_db: PyKeePass) -> None:
     Args:
         kp_db (PyKeePass): The Keepass database instance.
     """
-    kp_db.add_group(group_name=f"{BOOTSTRAP}", destination_group=kp_db.root_group)
+    kp_db.add_group(group_name=f"{bootstrap_group_name()}", destination_group=kp_db.root_group)
     kp_db.save()
 
 
@@ -43,49 +84,119 @@ def _create_kp_db_bootstrap_entries(kp_db: PyKeePass) -> None:
         ValueError: If the source database path is the current working directory.
         ValueError: If the bootstrap group is not found in the database.
     """
-    src_db_path = settings.get("src_db")
+    src_db_path = tk_settings().get("src_db")
     if src_db_path == Path.cwd():
         raise ValueError(
             "The source database path cannot be the current working directory."
         )
 
-    if not kp_db.find_groups(name=f"{BOOTSTRAP}", first=True):
-        raise ValueError(f"Bootstrap group {BOOTSTRAP} not found in the database.")
-
-    group: Group = kp_db.find_groups(name=f"{BOOTSTRAP}", first=True)
+    group: Group | None = _find_bootstrap_group(kp_db)
+    if not group:
+        raise ValueError(f"Bootstrap group {bootstrap_group_name()} not found in the database.")
 
     entry: Entry = kp_db.add_entry(
         destination_group=group,
-        title=f"{BOOTSTRAP_ENTRY}",
+        title=f"{bootstrap_entry_title()}",
         username="",
         password="",
     )
 
     src_files = SkipPaths.get_files(
-        *pathify(*settings.get("src_files")[BOOTSTRAP_ENTRY])
+        *pathify(*tk_settings().get("src_files")[bootstrap_entry_title()])
     )
 
     store_attachments(entry, kp_db, src_files)
     store_env_vars(entry, kp_db)
+    if isinstance(kp_db, KeepassStore):
+        # the attachments and env vars added custom properties
+        kp_db.index.reindex_entry(entry)
+
+
+@dataclass
+class IngestStats:
+    """Counters describing one `store_attachments` run."""
+
+    files: int = 0
+    skipped: int = 0
+    bytes_read: int = 0
+    binaries_added: int = 0
+    binaries_reused: int = 0
+    seconds: float = 0.0
+
+
+def _binary_ids(kp_db: PyKeePass) -> dict[bytes, int]:
+    """Map the digest of every binary already in the database to its ID."""
+    ids: dict[bytes, int] = {}
+    for binary_id, data in enumerate(kp_db.binaries):
+        ids.setdefault(hashlib.sha256(data).digest(), binary_id)
+    return ids
 
 
-def store_attachments(entry, kp_db, src_files: iter[Path]):
+def _read_and_hash(src_file: Path) -> tuple[bytes | None, bytes | None]:
+    """Read a source file once and hash it, on a worker thread."""
+    data: bytes | None = get_file_bytes(src_file)
+    if not data:
+        return None, None
+    return data, hashlib.sha256(data).digest()
+
+
+def _file_size(filename) -> int:
+    """Return the size of a database file, or 0 for a stream or a file that is not there."""
+    try:
+        return Path(filename).stat().st_size
+    except (OSError, TypeError):
+        return 0
+
+
+def store_attachments(
+    entry, kp_db, src_files: Iterable[Path], compressed: bool = False, max_workers: int | None = None
+) -> IngestStats:
     """Store attachments in the Keepass database.
 
+    Files are read and hashed concurrently. Identical content is stored as one binary shared by
+    every attachment, including binaries that were already in the database.
+
     Args:
         entry (Entry): The entry to which attachments will be added.
         kp_db (PyKeePass): The Keepass database instance.
         src_files (Iterable[Path]): The source files to be attached.
+        compressed (bool, optional): Compress new binaries. Only KDBX3 files store them compressed. Defaults to False.
+        max_workers (int | None, optional): The number of reader threads. Defaults to the executor default.
+
+    Returns:
+        IngestStats: What was read, added and reused.
     """
-    for idx, src_file in enumerate(src_files):
-        data: bytes | None = get_file_bytes(src_file)
-        if data:
-            kp_db.add_binary(data=get_file_bytes(src_file), compressed=False)
-            entry.add_attachment(idx, src_file.name)
-            entry.set_custom_property(f"file_{idx}", f"{src_file}")
-            print(f"Added attachment {src_file} to {entry.title}")
-        else:
-            print(f"Skipping {src_file} as there is a problem.")
+    with span("keepass.store_attachments", entry=entry.title) as traced:
+        stats = IngestStats()
+        start = time.perf_counter()
+        src_files = list(src_files)
+        binary_ids = _binary_ids(kp_db)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tk-ingest") as pool:
+            # map keeps the source order, so attachment numbering is stable
+            for idx, (src_file, (data, digest)) in enumerate(zip(src_files, pool.map(_read_and_hash, src_files), strict=True)):
+                stats.files += 1
+                if data is None:
+                    stats.skipped += 1
+                    print(f"Skipping {src_file} as there is a problem.")
+                    continue
+                stats.bytes_read += len(data)
+                binary_id = binary_ids.get(digest)
+                if binary_id is None:
+                    binary_id = kp_db.add_binary(data=data, compressed=compressed)
+                    binary_ids[digest] = binary_id
+                    stats.binaries_added += 1
+                else:
+                    stats.binaries_reused += 1
+                entry.add_attachment(binary_id, src_file.name)
+                entry.set_custom_property(f"file_{idx}", f"{src_file}")
+                print(f"Added attachment {src_file} to {entry.title}")
+        traced.set(bytes=stats.bytes_read, files=stats.files, binaries_added=stats.binaries_added)
+    stats.seconds = time.perf_counter() - start
+    print(
+        f"Ingested {stats.bytes_read} bytes from {stats.files - stats.skipped} files in {stats.seconds:.3f}s "
+        f"({stats.binaries_added} new binaries, {stats.binaries_reused} reused)"
+    )
+    return stats
 
 
 def store_env_vars(entry, kp_db):
@@ -96,39 +207,76 @@ def store_env_vars(entry, kp_db):
         kp_db (PyKeePass): The Keepass database instance.
     """
     src_env: dict[str, str] = {
-        k: v for k, v in settings.get("src_env").items() if v and v.isprintable()
+        k: v for k, v in tk_settings().get("src_env").items() if v and v.isprintable()
     }
     [entry.set_custom_property(k, v) for k, v in src_env.items()]
     kp_db.save()
 
 
-def view_kp_db(fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None) -> None:
-    """View the contents of the Keepass database.
+def _attachment_view(attachment, binaries: list[bytes] | None) -> dict:
+    """Describe an attachment, with the size and digest of its bytes when ``binaries`` are loaded."""
+    view = {"id": attachment.id, "name": attachment.filename}
+    if binaries is not None:
+        data = binaries[attachment.id]
+        view.update(size=len(data), sha256=hashlib.sha256(data).hexdigest())
+    return view
+
+
+def view_kp_db(
+    fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None, query: EntryQuery | None = None, fmt: str = "text"
+) -> int:
+    """Print the entries of the Keepass database matching ``query``, one at a time as they are found.
+
+    Passwords are never printed.  Attachment bytes are only loaded when ``query.attachments`` is set.
 
     Args:
         fp_kp_db (Path): The path to the Keepass database file.
         fp_token (Path): The path to the token file.
         fp_key (Path | None, optional): The path to the key file. Defaults to None.
+        query (EntryQuery | None, optional): The filter and page. Defaults to every entry.
+        fmt (str, optional): ``text`` for an indented listing, ``jsonl`` for one JSON object per entry. Defaults to text.
+
+    Returns:
+        int: The number of entries printed.
+
+    Raises:
+        ValueError: If the format is not one of `VIEW_FORMATS`.
     """
+    if fmt not in VIEW_FORMATS:
+        raise ValueError(f"Unknown view format {fmt!r}, expected one of {', '.join(VIEW_FORMATS)}")
+    query = query or EntryQuery()
+    printed = 0
+    # a plain PyKeePass, so viewing never adds the bootstrap group to a database lacking it
     kp_db: PyKeePass = PyKeePass(
         filename=fp_kp_db,
-        password=fp_token.read_text(settings.get("encoding")),
+        password=fp_token.read_text(tk_settings().get("encoding")),
         keyfile=fp_key,
     )
-    for group in kp_db.groups:
-        print(f"Group: {group.name}")
-        for entry in group.entries:
+    binaries = kp_db.binaries if query.attachments else None
+    last_path = None
+    for entry in query.entries(KeepassIndex(kp_db)):
+        attachments = [_attachment_view(attachment, binaries) for attachment in entry.attachments]
+        if fmt == "jsonl":
+            print(json.dumps({**entry_record(entry, password=False), "attachments": attachments}, default=str))
+        else:
+            path = group_path(entry.parentgroup)
+            if path != last_path:
+                print(f"Group: {path or PATH_SEP}")
+                last_path = path
             print(f"  Entry: {entry.title}")
             for k, v in entry.custom_properties.items():
                 print(f"    {k}: {v}")
-            for attachment in entry.attachments:
-                print(f"    Attachment: {attachment.id}: {attachment.filename}")
+            for attachment in attachments:
+                detail = f" ({attachment['size']} bytes, sha256 {attachment['sha256']})" if "size" in attachment else ""
+                print(f"    Attachment: {attachment['id']}: {attachment['name']}{detail}")
+        printed += 1
+    return printed
 
 
 def create_kp_db(
     fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None
 ) -> PyKeePass:
-    """Create a new Keepass database.
+    """Create a new Keepass database, bootstrapped and written to disk with a single save.
 
     Args:
         fp_kp_db (Path): The path to the Keepass database file.
@@ -140,60 +288,225 @@ def create_kp_db(
     """
     print(f"Creating new Keepass database at {fp_kp_db}")
     if not fp_kp_db.is_file():
-        dir_mode = int(settings.get("user_dir_mode"))
+        dir_mode = int(tk_settings().get("user_dir_mode"))
         fp_kp_db.parent.mkdir(mode=dir_mode, exist_ok=True, parents=True)
     if not fp_token.is_file():
         fp_token.parent.mkdir(
-            mode=settings.get("user_dir_mode"), exist_ok=True, parents=True
+            mode=tk_settings().get("user_dir_mode"), exist_ok=True, parents=True
         )
         fp_token.write_text(
-            gen_passphrase(length=settings.get("passphrase_length")),
-            settings.get("encoding"),
+            gen_passphrase(length=tk_settings().get("passphrase_length")),
+            tk_settings().get("encoding"),
         )
         print(f"Token file created at {fp_token}")
     if fp_key is not None and not fp_key.is_file():
         fp_key.parent.mkdir(
-            mode=settings.get("user_dir_mode"), exist_ok=True, parents=True
+            mode=tk_settings().get("user_dir_mode"), exist_ok=True, parents=True
         )
         fp_key.write_text(
-            gen_utf8(length=settings.get("key_length")), settings.get("encoding")
+            gen_utf8(length=tk_settings().get("key_length")), tk_settings().get("encoding")
         )
-    kp_db: PyKeePass = create_database(
-        fp_kp_db,
-        password=fp_token.read_text(settings.get("encoding")),
-        keyfile=fp_key,
-    )
+    return KeepassStore(fp_kp_db, fp_token, fp_key, new=True)
+
+
+def read_kp_payload(fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None) -> tuple[bytes, list[bytes]]:
+    """Return the decrypted XML of a KDBX4 database and its binaries, each led by its protected flag byte.
+
+    Unlike the file, whose seeds and ciphertext change on every save, the payload only changes with
+    its entries, so two copies of a database under different credentials have the same payload.
+
+    Args:
+        fp_kp_db (Path): The path to the Keepass database file.
+        fp_token (Path): The path to the token file.
+        fp_key (Path | None, optional): The path to the key file. Defaults to None.
+
+    Returns:
+        tuple[bytes, list[bytes]]: The XML and the inner header binaries.
+
+    Raises:
+        ValueError: If the database is not KDBX4.
+    """
+    kp_db = PyKeePass(fp_kp_db, fp_token.read_text(tk_settings().get("encoding")), keyfile=fp_key)
+    if kp_db.version < (4, 0):
+        raise ValueError(f"{fp_kp_db} is KDBX {kp_db.version[0]}, only KDBX 4 payloads can be read")
+    return etree.tostring(kp_db.tree), [binary.data for binary in kp_db.payload.inner_header.binary]
 
-    _create_kp_db_bootstrap_group(kp_db)
-    _create_kp_db_bootstrap_entries(kp_db)
-    kp_db.save()
 
-    return kp_db
+def write_kp_payload(
+    fp_kp_db: Path, fp_token: Path, fp_key: Path | None, xml: bytes, binaries: Iterable[bytes]
+) -> None:
+    """Encrypt a payload read by `read_kp_payload` into a new KDBX4 database with the given credentials.
+
+    Args:
+        fp_kp_db (Path): The database file to write.
+        fp_token (Path): The path to the token file.
+        fp_key (Path | None): The path to the key file.
+        xml (bytes): The decrypted XML.
+        binaries (Iterable[bytes]): The binaries, each led by its protected flag byte.
+    """
+    kp_db = KeepassStore(fp_kp_db, fp_token, fp_key, new=True)
+    kp_db.payload.xml = etree.ElementTree(etree.fromstring(xml, etree.XMLParser(resolve_entities=False, huge_tree=True)))
+    for data in binaries:
+        kp_db.add_binary(data[1:], protected=data[:1] == b"\x01")
+    kp_db.save()
 
 
 class KeepassStore(PyKeePass):
-    """Keepass store for trapper-keeper."""
+    """Keepass store for trapper-keeper.
 
-    def __init__(self, fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None):
+    Lookups go through a `KeepassIndex` built on first use after each read of the database.  The
+    add/move/delete helpers below keep it current; call ``index.reindex_entry`` after changing the
+    title, tags or custom properties of an entry directly.
+
+    Every save re-runs the KDF and re-encrypts the whole file, so related changes should be made
+    inside ``with store.batch():``, which turns the saves of every helper into a single commit.
+    """
+
+    def __init__(self, fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None, new: bool = False):
         """Initialize the KeepassStore.
 
+        A database that does not exist yet is built in memory and first written by the bootstrap commit.
+
         Args:
             fp_kp_db (Path): The path to the Keepass database file.
             fp_token (Path): The path to the token file.
             fp_key (Path | None, optional): The path to the key file. Defaults to None.
+            new (bool, optional): Start from an empty database even if ``fp_kp_db`` exists. Defaults to False.
         """
-        if not fp_kp_db:
-            super().__init__(fp_kp_db, fp_token.read_text(settings.get("encoding")))
+        self._batch_depth = 0
+        self._save_pending = False
+        if new or (fp_kp_db and not Path(fp_kp_db).exists()):
+            self._read_blank(fp_kp_db, fp_token.read_text(tk_settings().get("encoding")), fp_key)
+        elif not fp_kp_db:
+            super().__init__(fp_kp_db, fp_token.read_text(tk_settings().get("encoding")))
         else:
             super().__init__(
                 fp_kp_db,
-                fp_token.read_text(settings.get("encoding")),
+                fp_token.read_text(tk_settings().get("encoding")),
                 keyfile=fp_key,
             )
 
-        if not self.find_groups(name=BOOTSTRAP, first=True):
-            _create_kp_db_bootstrap_group(self)
-            _create_kp_db_bootstrap_entries(self)
+        if not self.get_bootstrap_group():
+            with self.batch():
+                _create_kp_db_bootstrap_group(self)
+                _create_kp_db_bootstrap_entries(self)
+
+    def _read_blank(self, fp_kp_db: Path, password: str, fp_key: Path | None) -> None:
+        """Load the empty template database in memory and point it at ``fp_kp_db`` without writing it."""
+        self.read(BLANK_DATABASE_LOCATION, BLANK_DATABASE_PASSWORD)
+        self.filename = fp_kp_db
+        self.password = password
+        self.keyfile = fp_key
+
+    def read(self, *args, **kwargs):
+        """Read the database and drop any index built from the previous tree."""
+        with span("keepass.read") as traced:
+            super().read(*args, **kwargs)
+            traced.set(path=str(self.filename), bytes=_file_size(self.filename))
+        self._index: KeepassIndex | None = None
+
+    def save(self, *args, **kwargs):
+        """Save the database, or only mark it for the commit when inside a batch."""
+        if self._batch_depth:
+            if args or kwargs:
+                raise ValueError("Saving to another file is not supported inside a batch.")
+            self._save_pending = True
+            return
+        with span("keepass.save") as traced:
+            super().save(*args, **kwargs)
+            filename = args[0] if args else kwargs.get("filename", self.filename)
+            traced.set(path=str(filename), bytes=_file_size(filename))
+
+    @contextmanager
+    def batch(self):
+        """Group changes into one transaction that is saved once, when the outermost batch exits.
+
+        If the block raises, nothing is written and the in-memory tree is rolled back to the file on
+        disk, or to an empty database if it was never written.  Batches nest; only the outermost one
+        commits or rolls back.
+
+        Yields:
+            KeepassStore: This store.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._rollback()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth and self._save_pending:
+            self._save_pending = False
+            self.save()
+
+    def _rollback(self) -> None:
+        """Discard uncommitted changes by reading the last committed state back."""
+        self._save_pending = False
+        if Path(self.filename).exists():
+            self.reload()
+        else:
+            self._read_blank(self.filename, self.password, self.keyfile)
+
+    @property
+    def index(self) -> KeepassIndex:
+        """Return the lookup index, walking the tree once to build it on first use."""
+        if self._index is None:
+            self._index = KeepassIndex(self)
+        return self._index
+
+    def lookup_entries(self, **criteria) -> list[Entry]:
+        """Find entries through the index, see `KeepassIndex.find_entries`."""
+        return self.index.find_entries(**criteria)
+
+    def lookup_groups(self, **criteria) -> list[Group]:
+        """Find groups through the index, see `KeepassIndex.find_groups`."""
+        return self.index.find_groups(**criteria)
+
+    def add_entry(self, destination_group, title, username, password, *args, force_creation=False, **kwargs):
+        """Add an entry, checking for duplicates and indexing it without an XPath query."""
+        if not force_creation:
+            for entry in self.index.find_entries(title=title, group=destination_group):
+                if entry.username == username:
+                    raise Exception(f'An entry "{title}" already exists in "{destination_group}"')
+        entry = super().add_entry(
+            destination_group, title, username, password, *args, force_creation=True, **kwargs
+        )
+        if self._index is not None:
+            self._index.add_entry(entry)
+        return entry
+
+    def delete_entry(self, entry):
+        """Delete an entry and drop it from the index."""
+        if self._index is not None:
+            self._index.remove_entry(entry)
+        super().delete_entry(entry)
+
+    def move_entry(self, entry, destination_group):
+        """Move an entry and reindex it under its new group."""
+        super().move_entry(entry, destination_group)
+        if self._index is not None:
+            self._index.reindex_entry(entry)
+
+    def add_group(self, destination_group, group_name, *args, **kwargs):
+        """Add a group and index it."""
+        group = super().add_group(destination_group, group_name, *args, **kwargs)
+        if self._index is not None:
+            self._index.add_group(group)
+        return group
+
+    def delete_group(self, group):
+        """Delete a group and drop it and its contents from the index."""
+        if self._index is not None:
+            self._index.remove_group(group)
+        super().delete_group(group)
+
+    def move_group(self, group, destination_group):
+        """Move a group and reindex it and its contents under the new path."""
+        super().move_group(group, destination_group)
+        if self._index is not None:
+            self._index.reindex_group(group)
 
     def __enter__(self) -> AbstractContextManager:
         """Context manager enter.
@@ -213,7 +526,7 @@ class KeepassStore(PyKeePass):
         Returns:
             Entry: The entry found by UUID.
         """
-        return self.find_entries(group=self.root_group, name=uuid, first=True)
+        return self.index.find_entry(uuid=uuid)
 
     def __exit__(self, __exc_type, __exc_value, __traceback):
         """Context manager exit.
@@ -225,45 +538,85 @@ class KeepassStore(PyKeePass):
         """
         super().__exit__(__exc_type, __exc_value, __traceback)
 
-    def copy_group(self, src: KeepassStore, src_group: Group, dest_group: Group):
+    def merge_from(  # noqa: PLR0913 - the merge roots plus keyword-only options
+        self,
+        src: KeepassStore,
+        src_group: Group | None = None,
+        dest_group: Group | None = None,
+        *,
+        policy: MergePolicy | str = MergePolicy.NEWER,
+        delete: bool = False,
+        dry_run: bool = False,
+        exclude_titles: Iterable[str] = (),
+    ) -> MergePlan:
+        """Merge the entries below a group of another store into this one, pairing them by UUID.
+
+        Args:
+            src (KeepassStore): The source Keepass store.
+            src_group (Group | None, optional): The source group. Defaults to the source bootstrap group.
+            dest_group (Group | None, optional): The destination group. Defaults to the bootstrap group.
+            policy (MergePolicy | str, optional): Who wins when an entry differs on both sides. Defaults to newer.
+            delete (bool, optional): Delete entries that are not in the source. Defaults to False.
+            dry_run (bool, optional): Only plan the merge. Defaults to False.
+            exclude_titles (Iterable[str], optional): Entry titles left alone on both sides.
+
+        Returns:
+            MergePlan: The planned, or applied, inserts, updates, deletes and conflicts.
+        """
+        merge = KeepassMerge(
+            src,
+            src_group or src.get_bootstrap_group(),
+            self,
+            dest_group or self.get_bootstrap_group(),
+            policy=policy,
+            delete=delete,
+            exclude_titles=frozenset(exclude_titles),
+        )
+        plan = merge.plan()
+        return plan if dry_run else merge.apply(plan)
+
+    def copy_group(self, src: KeepassStore, src_group: Group, dest_group: Group) -> MergePlan:
         """Copy a group from the source database to the destination database.
 
+        Entries keep their UUIDs, so copying again only updates what changed.
+
         Args:
             src (KeepassStore): The source Keepass store.
             src_group (Group): The source group.
             dest_group (Group): The destination group.
+
+        Returns:
+            MergePlan: The applied changes.
         """
-        for entry in src.find_entries(group=src_group):
-            self.add_entry(
-                destination_group=dest_group,
-                title=entry.title,
-                username=entry.username,
-                password=entry.password,
-                url=entry.url,
-                notes=entry.notes,
-                expiry_time=entry.expiry_time,
-                tags=entry.tags,
-                otp=entry.otp,
-                icon=entry.icon,
-                force_creation=True,
-            )
+        return self.merge_from(src, src_group, dest_group, policy=MergePolicy.SOURCE)
+
+    def copy_bootstrap_entries(
+        self,
+        src: KeepassStore,
+        invert: bool = False,
+        policy: MergePolicy | str = MergePolicy.NEWER,
+        delete: bool = False,
+        dry_run: bool = False,
+    ) -> MergePlan:
+        """Merge the additional entries of the source database bootstrap group into this one.
 
-    def copy_bootstrap_entries(self, src: KeepassStore, invert: bool = False):
-        """Copy additional entries from the source database bootstrap group.
+        The bootstrap entry itself is specific to each database and is never merged.
 
         Args:
             src (KeepassStore): The source Keepass store.
-            invert (bool, optional): Invert the copy. Defaults to False.
+            invert (bool, optional): Merge this store into ``src`` instead. Defaults to False.
+            policy (MergePolicy | str, optional): Who wins when an entry differs on both sides. Defaults to newer.
+            delete (bool, optional): Delete entries that are not in the source. Defaults to False.
+            dry_run (bool, optional): Only plan the merge. Defaults to False.
+
+        Returns:
+            MergePlan: The planned, or applied, changes.
         """
-        tgt_group: Group = self.get_bootstrap_group()
-        src_group: Group = src.get_bootstrap_group()
-        additional_entries = [
-            entry
-            for entry in src.find_entries(group=src_group)
-            if entry.title != BOOTSTRAP_ENTRY
-        ]
-        tgt_group.append(additional_entries)
-        self.save()
+        source, target = (self, src) if invert else (src, self)
+        with span("keepass.copy_bootstrap_entries", invert=invert, dry_run=dry_run):
+            return target.merge_from(
+                source, policy=policy, delete=delete, dry_run=dry_run, exclude_titles={bootstrap_entry_title()}
+            )
 
     def get_bootstrap_group(self) -> Group | None:
         """Get the bootstrap group. The bootstrap group contains entries with key/values and
@@ -272,4 +625,93 @@ class KeepassStore(PyKeePass):
         Returns:
             Group | None: The bootstrap group if found, otherwise None.
         """
-        return self.find_groups(name=f"{BOOTSTRAP}", first=True)
+        return self.index.find_group(name=f"{bootstrap_group_name()}")
+
+    def _bulk_group(self, group: Group | str | None) -> Group:
+        """Resolve the group used by the bulk API from a group or its path, defaulting to the bootstrap group."""
+        if group is None:
+            return self.get_bootstrap_group()
+        if isinstance(group, str):
+            found = self.index.find_group(path=group)
+            if found is None:
+                raise KeyError(f"Group {group!r} not found in the database.")
+            return found
+        return group
+
+    def _bulk_entries(self, group: Group | None) -> dict[str, Entry]:
+        """Index the direct entries of a group by title with a single tree query."""
+        return {entry.title: entry for entry in self.index.find_entries(group=self._bulk_group(group))}
+
+    def get_many(self, keys: Iterable[str], group: Group | str | None = None) -> dict[str, str]:
+        """Fetch the passwords of many entries, keyed by entry title.
+
+        Args:
+            keys (Iterable[str]): The entry titles to look up.
+            group (Group | str | None, optional): The group holding the entries, or its path. Defaults to the bootstrap group.
+
+        Returns:
+            dict[str, str]: The found titles mapped to their passwords.
+        """
+        entries = self._bulk_entries(group)
+        return {k: entries[k].password for k in keys if k in entries}
+
+    def put_many(self, items: Mapping[str, str] | Iterable[tuple[str, str]], group: Group | str | None = None) -> int:
+        """Create or update many entries, then save the database once.
+
+        Args:
+            items (Mapping | Iterable[tuple]): Entry titles mapped to passwords.
+            group (Group | str | None, optional): The group holding the entries, or its path. Defaults to the bootstrap group.
+
+        Returns:
+            int: The number of entries written.
+        """
+        dest_group = self._bulk_group(group)
+        entries = self._bulk_entries(dest_group)
+        written = 0
+        for title, password in iter_items(items):
+            if title in entries:
+                entries[title].password = password
+            else:
+                entries[title] = self.add_entry(
+                    destination_group=dest_group, title=title, username="", password=password, force_creation=True
+                )
+            written += 1
+        if written:
+            self.save()
+        return written
+
+    def delete_many(self, keys: Iterable[str], group: Group | str | None = None) -> int:
+        """Delete many entries by title, then save the database once.
+
+        Args:
+            keys (Iterable[str]): The entry titles to delete.
+            group (Group | str | None, optional): The group holding the entries, or its path. Defaults to the bootstrap group.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        entries = self._bulk_entries(group)
+        removed = 0
+        for k in keys:
+            entry = entries.pop(k, None)
+            if entry is not None:
+                self.delete_entry(entry)
+                removed += 1
+        if removed:
+            self.save()
+        return removed
+
+    def scan(self, prefix: str | None = None, group: Group | str | None = None) -> Iterator[tuple[str, str]]:
+        """Iterate over the entries whose title starts with ``prefix``.
+
+        Args:
+            prefix (str | None): The title prefix. ``None`` yields every entry.
+            group (Group | str | None, optional): The group holding the entries, or its path. Defaults to the bootstrap group.
+
+        Yields:
+            tuple[str, str]: The matching ``(title, password)`` pairs.
+        """
+        for entry in self.index.find_entries(group=self._bulk_group(group)):
+            title = entry.title or ""
+            if prefix is None or title.startswith(prefix):
+                yield title, entry.password
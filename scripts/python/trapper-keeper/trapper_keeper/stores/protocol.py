@@ -0,0 +1,73 @@
+"""Common data API shared by every store that `trapper_keeper.tk.get_store` can open."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Any, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class BulkStore(Protocol):
+    """Batched key/value access implemented natively by each DbTypes backend.
+
+    Every method works on many keys at once so a backend can pay its per-call overhead
+    (transaction, statement, KeePass save) a single time per batch rather than once per key.
+    """
+
+    def get_many(self, keys: Iterable[Any]) -> dict[Any, Any]:
+        """Fetch the values for ``keys``.
+
+        Args:
+            keys (Iterable): The keys to look up.
+
+        Returns:
+            dict: The found keys mapped to their values. Missing keys are omitted.
+        """
+        ...
+
+    def put_many(self, items: Mapping[Any, Any] | Iterable[tuple[Any, Any]]) -> int:
+        """Insert or replace many key/value pairs in one batch.
+
+        Args:
+            items (Mapping | Iterable[tuple]): The pairs to write.
+
+        Returns:
+            int: The number of pairs written.
+        """
+        ...
+
+    def delete_many(self, keys: Iterable[Any]) -> int:
+        """Delete many keys in one batch.
+
+        Args:
+            keys (Iterable): The keys to delete.
+
+        Returns:
+            int: The number of keys that existed and were removed.
+        """
+        ...
+
+    def scan(self, prefix: Any = None) -> Iterator[tuple[Any, Any]]:
+        """Iterate over the key/value pairs whose key starts with ``prefix``.
+
+        Args:
+            prefix: The key prefix to match. ``None`` yields every pair.
+
+        Yields:
+            tuple: The matching ``(key, value)`` pairs.
+        """
+        ...
+
+
+def iter_items(items: Mapping[Any, Any] | Iterable[tuple[Any, Any]]) -> Iterable[tuple[Any, Any]]:
+    """Normalize the ``items`` argument of ``put_many`` into ``(key, value)`` pairs.
+
+    Args:
+        items (Mapping | Iterable[tuple]): A mapping or an iterable of pairs.
+
+    Returns:
+        Iterable[tuple]: The pairs.
+    """
+    if isinstance(items, Mapping):
+        return items.items()
+    return items
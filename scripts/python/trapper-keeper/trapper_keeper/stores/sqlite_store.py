@@ -1,14 +1,165 @@
-"""This module contains the SqliteStore class."""
+"""This module contains the SqliteStore class.
+
+Besides the key/value table of the bulk API, a store carries a catalog of secret metadata: entry
+path, title, tags, custom property keys and attachment hashes, never the secret values.  The
+catalog is indexed for exact lookups and mirrored into an FTS5 table for search, so questions about
+a Keepass database can be answered without decrypting it.
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import queue
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from sqlite_utils import Database
 
+from trapper_keeper.stores.keepass_index import group_path
+from trapper_keeper.stores.protocol import iter_items
+
+if TYPE_CHECKING:
+  from pykeepass.entry import Entry
+
+  from trapper_keeper.stores.keepass_store import KeepassStore
+
+KV_TABLE: str = "kv"
+# stay below SQLITE_MAX_VARIABLE_NUMBER on older sqlite builds
+MAX_VARIABLES: int = 900
+BUSY_TIMEOUT_MS: int = 5000
+POOL_SIZE: int = 4
+# applied to every connection, journal_mode=WAL is persistent and only set by writers
+PRAGMAS: dict[str, str | int] = {
+  "synchronous": "NORMAL",
+  "temp_store": "MEMORY",
+  "cache_size": -16000,
+  "mmap_size": 256 * 1024 * 1024,
+  "foreign_keys": "ON",
+}
+SCHEMA_VERSION: int = 1
+SCHEMA: str = f"""
+CREATE TABLE IF NOT EXISTS [{KV_TABLE}] ([key] TEXT PRIMARY KEY, [value] BLOB);
+CREATE TABLE IF NOT EXISTS [secrets] (
+  [uuid] TEXT PRIMARY KEY,
+  [path] TEXT NOT NULL,
+  [title] TEXT,
+  [username] TEXT,
+  [url] TEXT,
+  [mtime] TEXT
+);
+CREATE INDEX IF NOT EXISTS [idx_secrets_path] ON [secrets] ([path]);
+CREATE INDEX IF NOT EXISTS [idx_secrets_title] ON [secrets] ([title]);
+CREATE TABLE IF NOT EXISTS [secret_tags] (
+  [uuid] TEXT NOT NULL REFERENCES [secrets] ([uuid]) ON DELETE CASCADE,
+  [tag] TEXT NOT NULL,
+  PRIMARY KEY ([uuid], [tag])
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS [idx_secret_tags_tag] ON [secret_tags] ([tag]);
+CREATE TABLE IF NOT EXISTS [secret_properties] (
+  [uuid] TEXT NOT NULL REFERENCES [secrets] ([uuid]) ON DELETE CASCADE,
+  [key] TEXT NOT NULL,
+  PRIMARY KEY ([uuid], [key])
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS [idx_secret_properties_key] ON [secret_properties] ([key]);
+CREATE TABLE IF NOT EXISTS [secret_attachments] (
+  [uuid] TEXT NOT NULL REFERENCES [secrets] ([uuid]) ON DELETE CASCADE,
+  [filename] TEXT NOT NULL,
+  [sha256] TEXT NOT NULL,
+  PRIMARY KEY ([uuid], [filename])
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS [idx_secret_attachments_sha256] ON [secret_attachments] ([sha256]);
+CREATE VIRTUAL TABLE IF NOT EXISTS [secrets_fts] USING fts5 (
+  [uuid] UNINDEXED, [path], [title], [username], [url], [tags], [properties]
+);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+@dataclass(frozen=True)
+class SecretMeta:
+  """The searchable metadata of one Keepass entry, without its secret values."""
+
+  uuid: str
+  path: str
+  title: str | None
+  username: str | None = None
+  url: str | None = None
+  mtime: str | None = None
+  tags: tuple[str, ...] = ()
+  properties: tuple[str, ...] = ()
+  # (filename, sha256 hex digest)
+  attachments: tuple[tuple[str, str], ...] = ()
+
+  @classmethod
+  def from_entry(cls, entry: Entry, binary_digests: list[str]) -> SecretMeta:
+    """Build the metadata of an entry.
+
+    Args:
+        entry (Entry): The Keepass entry.
+        binary_digests (list[str]): The hex digest of every binary of its database, by binary ID.
+
+    Returns:
+        SecretMeta: The metadata.
+    """
+    return cls(
+      uuid=str(entry.uuid),
+      path=group_path(entry.parentgroup),
+      title=entry.title,
+      username=entry.username,
+      url=entry.url,
+      mtime=entry.mtime.isoformat() if entry.mtime else None,
+      tags=tuple(sorted(entry.tags or ())),
+      properties=tuple(sorted(entry.custom_properties)),
+      attachments=tuple(
+        sorted((a.filename, binary_digests[a.id]) for a in entry.attachments if a.id < len(binary_digests))
+      ),
+    )
+
+
+def connect(sp_fp: Path | str, readonly: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+  """Open a tuned connection, in WAL mode unless it is read only.
+
+  Args:
+      sp_fp (Path | str): The database file, or ``:memory:``.
+      readonly (bool): Open the file read only. Defaults to False.
+      check_same_thread (bool): Refuse use from other threads. Pools turn this off. Defaults to True.
+
+  Returns:
+      sqlite3.Connection: The connection.
+  """
+  if readonly:
+    conn = sqlite3.connect(
+      f"{Path(sp_fp).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=check_same_thread
+    )
+  else:
+    conn = sqlite3.connect(str(sp_fp), check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode = WAL")
+  conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+  for pragma, value in PRAGMAS.items():
+    conn.execute(f"PRAGMA {pragma} = {value}")
+  return conn
+
 
 class SqliteStore(Database):
   """Basic context manager for accessing Sqlite databases."""
-  def __init__(self, sp_fp: Path):
-    """Initializes the SqliteStore context manager."""
-    super().__init__()
+  def __init__(self, sp_fp: Path, readonly: bool = False, check_same_thread: bool = True):
+    """Initializes the SqliteStore context manager.
+
+    Args:
+        sp_fp (Path): The database file. Created with the store schema if missing.
+        readonly (bool): Open the file read only. Defaults to False.
+        check_same_thread (bool): Refuse use from other threads. Defaults to True.
+    """
+    super().__init__(connect(sp_fp, readonly=readonly, check_same_thread=check_same_thread))
+    self.sp_fp = sp_fp
+    self.readonly = readonly
+    if not readonly and self.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+      self.conn.executescript(SCHEMA)
 
   def __enter__(self) -> Database:
     """Enters the SqliteStore context manager."""
@@ -17,3 +168,255 @@ class SqliteStore(Database):
   def __exit__(self, __exc_type, __exc_value, __traceback):
     """Exits the SqliteStore context manager."""
     self.close()
+
+  def get_many(self, keys: Iterable[str]) -> dict[str, bytes | str]:
+    """Fetch many keys with one ``IN`` query per chunk of bound parameters.
+
+    Args:
+        keys (Iterable[str]): The keys to look up.
+
+    Returns:
+        dict[str, bytes | str]: The found keys mapped to their values.
+    """
+    it = iter(keys)
+    values = {}
+    while chunk := list(islice(it, MAX_VARIABLES)):
+      placeholders = ",".join("?" * len(chunk))
+      values.update(
+        self.execute(f"SELECT [key], [value] FROM [{KV_TABLE}] WHERE [key] IN ({placeholders})", chunk).fetchall()
+      )
+    return values
+
+  def put_many(self, items: Mapping[str, bytes | str] | Iterable[tuple[str, bytes | str]]) -> int:
+    """Upsert many pairs with a single ``executemany`` inside one transaction.
+
+    Args:
+        items (Mapping | Iterable[tuple]): The pairs to write.
+
+    Returns:
+        int: The number of pairs written.
+    """
+    pairs = list(iter_items(items))
+    with self.conn:
+      self.conn.executemany(
+        f"INSERT INTO [{KV_TABLE}] ([key], [value]) VALUES (?, ?) "
+        "ON CONFLICT([key]) DO UPDATE SET [value] = excluded.[value]",
+        pairs,
+      )
+    return len(pairs)
+
+  def delete_many(self, keys: Iterable[str]) -> int:
+    """Delete many keys with a single ``executemany`` inside one transaction.
+
+    Args:
+        keys (Iterable[str]): The keys to delete.
+
+    Returns:
+        int: The number of keys removed.
+    """
+    with self.conn:
+      cursor = self.conn.executemany(f"DELETE FROM [{KV_TABLE}] WHERE [key] = ?", ((k,) for k in keys))
+    return cursor.rowcount
+
+  def scan(self, prefix: str | None = None) -> Iterator[tuple[str, bytes | str]]:
+    """Iterate over the pairs whose key starts with ``prefix``, in key order.
+
+    The prefix is turned into a half-open key range so the primary key index is used.
+
+    Args:
+        prefix (str | None): The key prefix. ``None`` yields every pair.
+
+    Yields:
+        tuple[str, bytes | str]: The matching ``(key, value)`` pairs.
+    """
+    if not prefix:
+      yield from self.execute(f"SELECT [key], [value] FROM [{KV_TABLE}] ORDER BY [key]")
+      return
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    yield from self.execute(
+      f"SELECT [key], [value] FROM [{KV_TABLE}] WHERE [key] >= ? AND [key] < ? ORDER BY [key]",
+      [prefix, upper],
+    )
+
+  def upsert_secrets(self, secrets: Iterable[SecretMeta]) -> int:
+    """Insert or replace the catalog rows of many entries in one transaction.
+
+    Every table is written with one ``executemany``, and the child rows and search rows of the
+    given entries are replaced rather than merged.
+
+    Args:
+        secrets (Iterable[SecretMeta]): The entry metadata.
+
+    Returns:
+        int: The number of entries written.
+    """
+    secrets = list(secrets)
+    uuids = [(s.uuid,) for s in secrets]
+    with self.conn:
+      self.conn.executemany(
+        "INSERT INTO [secrets] ([uuid], [path], [title], [username], [url], [mtime]) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT([uuid]) DO UPDATE SET [path] = excluded.[path], [title] = excluded.[title], "
+        "[username] = excluded.[username], [url] = excluded.[url], [mtime] = excluded.[mtime]",
+        [(s.uuid, s.path, s.title, s.username, s.url, s.mtime) for s in secrets],
+      )
+      for table in ("secret_tags", "secret_properties", "secret_attachments", "secrets_fts"):
+        self.conn.executemany(f"DELETE FROM [{table}] WHERE [uuid] = ?", uuids)
+      self.conn.executemany(
+        "INSERT INTO [secret_tags] ([uuid], [tag]) VALUES (?, ?)",
+        [(s.uuid, tag) for s in secrets for tag in s.tags],
+      )
+      self.conn.executemany(
+        "INSERT INTO [secret_properties] ([uuid], [key]) VALUES (?, ?)",
+        [(s.uuid, key) for s in secrets for key in s.properties],
+      )
+      self.conn.executemany(
+        "INSERT INTO [secret_attachments] ([uuid], [filename], [sha256]) VALUES (?, ?, ?)",
+        [(s.uuid, filename, digest) for s in secrets for filename, digest in s.attachments],
+      )
+      self.conn.executemany(
+        "INSERT INTO [secrets_fts] ([uuid], [path], [title], [username], [url], [tags], [properties]) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+          (s.uuid, s.path, s.title, s.username, s.url, " ".join(s.tags), " ".join(s.properties))
+          for s in secrets
+        ],
+      )
+    return len(secrets)
+
+  def delete_secrets(self, uuids: Iterable[str]) -> int:
+    """Remove entries and their child and search rows from the catalog.
+
+    Args:
+        uuids (Iterable[str]): The entry UUIDs.
+
+    Returns:
+        int: The number of entries removed.
+    """
+    rows = [(uuid,) for uuid in uuids]
+    with self.conn:
+      self.conn.executemany("DELETE FROM [secrets_fts] WHERE [uuid] = ?", rows)
+      cursor = self.conn.executemany("DELETE FROM [secrets] WHERE [uuid] = ?", rows)
+    return cursor.rowcount
+
+  def catalog(self, kp_db: KeepassStore) -> dict[str, int]:
+    """Bring the catalog in line with an open Keepass store.
+
+    Args:
+        kp_db (KeepassStore): The Keepass store.
+
+    Returns:
+        dict[str, int]: ``written`` and ``deleted`` entry counts.
+    """
+    digests = [hashlib.sha256(data).hexdigest() for data in kp_db.binaries]
+    secrets = [SecretMeta.from_entry(entry, digests) for entry in kp_db.index.entries.values()]
+    live = {s.uuid for s in secrets}
+    stale = [uuid for (uuid,) in self.execute("SELECT [uuid] FROM [secrets]") if uuid not in live]
+    return {"written": self.upsert_secrets(secrets), "deleted": self.delete_secrets(stale)}
+
+  def find_secrets(
+    self, path: str | None = None, tag: str | None = None, prop: str | None = None, sha256: str | None = None
+  ) -> list[tuple[str, str, str | None]]:
+    """Return the catalog entries matching every given criterion through the indexes.
+
+    Args:
+        path (str | None): The exact group path.
+        tag (str | None): A tag the entry carries.
+        prop (str | None): A custom property key the entry has.
+        sha256 (str | None): The hex digest of one of its attachments.
+
+    Returns:
+        list[tuple[str, str, str | None]]: ``(uuid, path, title)`` rows ordered by path and title.
+    """
+    clauses, params = [], []
+    if path is not None:
+      clauses.append("s.[path] = ?")
+      params.append(path)
+    if tag is not None:
+      clauses.append("s.[uuid] IN (SELECT [uuid] FROM [secret_tags] WHERE [tag] = ?)")
+      params.append(tag)
+    if prop is not None:
+      clauses.append("s.[uuid] IN (SELECT [uuid] FROM [secret_properties] WHERE [key] = ?)")
+      params.append(prop)
+    if sha256 is not None:
+      clauses.append("s.[uuid] IN (SELECT [uuid] FROM [secret_attachments] WHERE [sha256] = ?)")
+      params.append(sha256)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return self.execute(
+      f"SELECT s.[uuid], s.[path], s.[title] FROM [secrets] s {where} ORDER BY s.[path], s.[title]", params
+    ).fetchall()
+
+  def search_secrets(self, query: str, limit: int = 50) -> list[tuple[str, str, str | None]]:
+    """Full text search over the catalog, best match first.
+
+    Args:
+        query (str): An FTS5 query, e.g. ``web*`` or ``path:prod AND tags:db``.
+        limit (int): The most rows returned. Defaults to 50.
+
+    Returns:
+        list[tuple[str, str, str | None]]: ``(uuid, path, title)`` rows.
+    """
+    return self.execute(
+      "SELECT [uuid], [path], [title] FROM [secrets_fts] WHERE [secrets_fts] MATCH ? ORDER BY rank LIMIT ?",
+      [query, limit],
+    ).fetchall()
+
+
+class SqlitePool:
+  """A fixed size pool of `SqliteStore` connections to one file, shared between threads.
+
+  WAL mode lets the readers of every pooled connection run alongside one writer.  Connections are
+  opened on demand up to ``size`` and reused afterwards.
+  """
+
+  def __init__(self, sp_fp: Path, size: int = POOL_SIZE, readonly: bool = False):
+    """Initialize the pool.
+
+    Args:
+        sp_fp (Path): The database file.
+        size (int): The most connections open at once. Defaults to 4.
+        readonly (bool): Open every connection read only. Defaults to False.
+    """
+    self.sp_fp = sp_fp
+    self.size = size
+    self.readonly = readonly
+    self._idle: queue.LifoQueue[SqliteStore] = queue.LifoQueue()
+    self._slots = threading.BoundedSemaphore(size)
+    self._stores: list[SqliteStore] = []
+
+  @contextlib.contextmanager
+  def store(self) -> Iterator[SqliteStore]:
+    """Borrow a connection, waiting for one to be returned when all ``size`` are in use.
+
+    Yields:
+        SqliteStore: The store, returned to the pool when the block exits.
+    """
+    self._slots.acquire()
+    try:
+      try:
+        store = self._idle.get_nowait()
+      except queue.Empty:
+        store = SqliteStore(self.sp_fp, readonly=self.readonly, check_same_thread=False)
+        self._stores.append(store)
+      try:
+        yield store
+      finally:
+        if store.conn.in_transaction:
+          store.conn.rollback()
+        self._idle.put(store)
+    finally:
+      self._slots.release()
+
+  def close(self) -> None:
+    """Close every connection the pool opened."""
+    for store in self._stores:
+      store.close()
+    self._stores.clear()
+    self._idle = queue.LifoQueue()
+
+  def __enter__(self) -> SqlitePool:
+    """Enters the SqlitePool context manager."""
+    return self
+
+  def __exit__(self, __exc_type, __exc_value, __traceback):
+    """Closes the pool."""
+    self.close()
@@ -1,4 +1,8 @@
-"""Trapper Keeper interface to various DB Stores noted by class DbTypes."""
+"""Trapper Keeper interface to various DB Stores noted by class DbTypes.
+
+Every backend module is imported by the opener of its store type, so a process only loads
+pykeepass, sqlite_utils or boltdb once it opens a store of that type.
+"""
 
 from __future__ import annotations
 
@@ -6,10 +10,8 @@ import contextlib
 from enum import StrEnum, auto
 from pathlib import Path
 
-from trapper_keeper.stores.bolt_kvstore import BoltStore
-from trapper_keeper.stores.dict_store import PersistentDict
-from trapper_keeper.stores.keepass_store import KeepassStore, create_kp_db
-from trapper_keeper.stores.sqlite_store import SqliteStore
+from trapper_keeper.agent import AgentClient, AgentKeepassStore
+from trapper_keeper.tracing import span
 
 
 class DbTypes(StrEnum):
@@ -28,18 +30,36 @@ class DbTypes(StrEnum):
 
 def _get_tk_store(fp_kp_db: Path, fp_token: Path, fp_key: Path | None = None) -> contextlib.AbstractContextManager:
   """Open a Trapper Keeper store based on the db_type."""
+  from trapper_keeper.stores.keepass_store import KeepassStore  # noqa: PLC0415 - backends load on first use
+
   return KeepassStore(fp_kp_db, fp_token, fp_key)
 
-def _get_kv_store(db_fp: Path) -> contextlib.AbstractContextManager:
-  """Open a key/value store."""
-  return PersistentDict(filename=db_fp, flag="c", format="json", mode=0o600, encoding="utf-8", errors="strict", indent=2)
+def _get_kv_store(
+  db_fp: Path, readonly: bool = False, lazy: bool = False, journal: bool = False
+) -> contextlib.AbstractContextManager:
+  """Open a key/value store.  A lazy store is memory-mapped and decodes values on access.
+
+  A journaled store appends every sync to a log instead of rewriting the whole file.  Lazy and eager
+  stores read each other's files and journals, and rewrite them in their own layout on the next sync.
+  """
+  if lazy:
+    from trapper_keeper.stores.indexed_dict import IndexedDict  # noqa: PLC0415 - backends load on first use
+
+    return IndexedDict(filename=db_fp, flag="r" if readonly else "c", mode=0o600, file_format="json")
+  from trapper_keeper.stores.dict_store import PersistentDict  # noqa: PLC0415 - backends load on first use
+
+  return PersistentDict(filename=db_fp, flag="r" if readonly else "c", mode=0o600, file_format="json", journal=journal)
 
-def _get_sqlite_store(db_fp: Path) -> contextlib.AbstractContextManager:
+def _get_sqlite_store(db_fp: Path, readonly: bool = False) -> contextlib.AbstractContextManager:
   """Open a sqlite store."""
-  return SqliteStore(db_fp)
+  from trapper_keeper.stores.sqlite_store import SqliteStore  # noqa: PLC0415 - backends load on first use
+
+  return SqliteStore(db_fp, readonly=readonly)
 
 def _get_bolt_store(db_fp: Path, readonly: bool = True) -> contextlib.AbstractContextManager:
   """Open the boltdb store."""
+  from trapper_keeper.stores.bolt_kvstore import BoltStore  # noqa: PLC0415 - backends load on first use
+
   return BoltStore(db_fp, readonly)
 
 
@@ -49,34 +69,47 @@ def get_store(db_type: DbTypes, **kwargs) -> contextlib.AbstractContextManager:
 
   Args:
       db_type (DbTypes): Type of store to open.
-      **kwargs: Additional arguments required for the specific store type.
+      **kwargs: Additional arguments required for the specific store type.  A Keepass store opened
+          with ``agent=True`` is served by a running unlock agent when there is one.  That store only
+          has the bulk API, so only callers using nothing else pass it.
 
   Returns:
-      contextlib.AbstractContextManager: Store instance.
+      contextlib.AbstractContextManager: Store instance. Every store also implements the batched
+      `trapper_keeper.stores.protocol.BulkStore` API.
 
   Raises:
       ValueError: If the db_type is unsupported.
   """
-  match db_type:
-    case DbTypes.BOLT:
-      db_fp: Path = kwargs["db_fp"]
-      readonly: bool = kwargs["readonly"]
-      return _get_bolt_store(db_fp=db_fp, readonly=readonly)
-    case DbTypes.KP:
-      fp_kp_db: Path = kwargs["fp_kp_db"]
-      fp_token: Path = kwargs["fp_token"]
-      fp_key: Path | None = kwargs.get("fp_key")
-      if fp_kp_db is None or fp_token is None:
-        raise ValueError("fp_kp_db and fp_token are required for KeepassStore.")
-      if not fp_kp_db.exists():
-        create_kp_db(fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key)
-      return _get_tk_store(fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key)
-    case DbTypes.SQLITE:
-      db_fp: Path = kwargs["db_fp"]
-      return _get_sqlite_store(db_fp=db_fp)
-    case DbTypes.KV:
-      db_fp: Path = kwargs["db_fp"]
-      readonly: bool = kwargs["readonly"]
-      return _get_kv_store(db_fp=db_fp, readonly=readonly)
-    case _:
-      raise ValueError(f"Unsupported db_type: {db_type}")
+  with span("tk.get_store", db_type=str(db_type)):
+    match db_type:
+      case DbTypes.BOLT:
+        db_fp: Path = kwargs["db_fp"]
+        readonly: bool = kwargs["readonly"]
+        return _get_bolt_store(db_fp=db_fp, readonly=readonly)
+      case DbTypes.KP:
+        fp_kp_db: Path = kwargs["fp_kp_db"]
+        fp_token: Path = kwargs["fp_token"]
+        fp_key: Path | None = kwargs.get("fp_key")
+        if fp_kp_db is None or fp_token is None:
+          raise ValueError("fp_kp_db and fp_token are required for KeepassStore.")
+        if not fp_kp_db.exists():
+          from trapper_keeper.stores.keepass_store import create_kp_db  # noqa: PLC0415 - backends load on first use
+
+          create_kp_db(fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key)
+        if kwargs.get("agent", False):
+          client = AgentClient()
+          if client.available():
+            return AgentKeepassStore(client, fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key)
+        return _get_tk_store(fp_kp_db=fp_kp_db, fp_token=fp_token, fp_key=fp_key)
+      case DbTypes.SQLITE:
+        db_fp: Path = kwargs["db_fp"]
+        readonly: bool = kwargs.get("readonly", False)
+        return _get_sqlite_store(db_fp=db_fp, readonly=readonly)
+      case DbTypes.KV:
+        db_fp: Path = kwargs["db_fp"]
+        readonly: bool = kwargs.get("readonly", False)
+        lazy: bool = kwargs.get("lazy", False)
+        journal: bool = kwargs.get("journal", False)
+        return _get_kv_store(db_fp=db_fp, readonly=readonly, lazy=lazy, journal=journal)
+      case _:
+        raise ValueError(f"Unsupported db_type: {db_type}")
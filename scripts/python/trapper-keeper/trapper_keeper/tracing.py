@@ -0,0 +1,193 @@
+"""Opt-in timing spans around the hot paths of trapper-keeper.
+
+Tracing is off unless ``TK_TRACE`` names an output file when this module is first imported, or
+`enable` is called, e.g. by the ``--trace`` flag of the CLI.  While it is off `span` hands back one
+shared no-op context manager, so instrumented code only pays a function call and a global lookup.
+
+Spans are written when tracing is disabled or the process exits: in the Chrome trace event format,
+readable by ``chrome://tracing`` and Perfetto, when the file name ends in ``.json``, and as one JSON
+object per line otherwise.  A span carrying a ``bytes`` attribute counts towards the throughput
+`Tracer.summary` reports.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+TRACE_ENV: str = "TK_TRACE"
+CHROME: str = "chrome"
+JSONL: str = "jsonl"
+
+
+@dataclass
+class Span:
+    """One timed operation."""
+
+    name: str
+    start: float
+    seconds: float = 0.0
+    thread: int = 0
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        """Attach attributes, e.g. ``bytes``, to the span."""
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    """The span handed out while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        """Drop the attributes."""
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects the spans of one process and writes them out."""
+
+    def __init__(self, out: Path | None = None, fmt: str | None = None):
+        """Initialize the tracer.
+
+        Args:
+            out (Path | None, optional): The trace file. Defaults to None, keeping spans in memory only.
+            fmt (str | None, optional): ``chrome`` or ``jsonl``. Defaults to the one matching the suffix of ``out``.
+        """
+        self.out = out
+        self.fmt = fmt or (CHROME if out is not None and out.suffix == ".json" else JSONL)
+        # list.append is atomic, so threads record spans without a lock
+        self.spans: list[Span] = []
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.epoch = time.time()
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        """Time the body of the ``with`` statement as a span named ``name``."""
+        current = Span(name, time.perf_counter(), thread=threading.get_ident(), attrs=attrs)
+        try:
+            yield current
+        except BaseException as exc:
+            current.attrs["error"] = type(exc).__name__
+            raise
+        finally:
+            current.seconds = time.perf_counter() - current.start
+            self.spans.append(current)
+
+    def summary(self) -> list[str]:
+        """Return a table of the spans grouped by name, the slowest total first."""
+        totals: dict[str, list] = {}
+        for s in self.spans:
+            calls, seconds, longest, size = totals.get(s.name, (0, 0.0, 0.0, 0))
+            totals[s.name] = [calls + 1, seconds + s.seconds, max(longest, s.seconds), size + s.attrs.get("bytes", 0)]
+        lines = [f"{'span':<36} {'calls':>6} {'total s':>10} {'mean ms':>10} {'max ms':>10} {'bytes':>14} {'MiB/s':>8}"]
+        for name, (calls, seconds, longest, size) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            rate = f"{size / (1024 * 1024) / seconds:>8.1f}" if size and seconds else f"{'':>8}"
+            lines.append(
+                f"{name:<36} {calls:>6} {seconds:>10.3f} {seconds / calls * 1000:>10.2f} {longest * 1000:>10.2f} "
+                f"{size or '':>14} {rate}"
+            )
+        return lines
+
+    def events(self) -> Iterator[dict]:
+        """Yield the spans as dictionaries in the output format."""
+        for s in self.spans:
+            offset = s.start - self.origin
+            if self.fmt == CHROME:
+                yield {
+                    "name": s.name,
+                    "cat": "trapper_keeper",
+                    "ph": "X",
+                    "ts": round(offset * 1e6, 3),
+                    "dur": round(s.seconds * 1e6, 3),
+                    "pid": self.pid,
+                    "tid": s.thread,
+                    "args": s.attrs,
+                }
+            else:
+                yield {"name": s.name, "ts": self.epoch + offset, "seconds": s.seconds, "thread": s.thread, **s.attrs}
+
+    def write(self, out: Path | None = None) -> Path | None:
+        """Write the spans to ``out``, or the tracer file, returning the file written."""
+        out = out or self.out
+        if out is None:
+            return None
+        with open(out, "w", encoding="utf-8") as fileobj:
+            if self.fmt == CHROME:
+                json.dump({"traceEvents": list(self.events()), "displayTimeUnit": "ms"}, fileobj, default=str)
+            else:
+                for event in self.events():
+                    fileobj.write(json.dumps(event, default=str) + "\n")
+        return out
+
+
+_tracer: Tracer | None = None
+
+
+def active() -> Tracer | None:
+    """Return the running tracer, or None while tracing is off."""
+    return _tracer
+
+
+def enable(out: Path | None = None, fmt: str | None = None) -> Tracer:
+    """Start tracing, replacing any running tracer.  The spans are written when the process exits.
+
+    Args:
+        out (Path | None, optional): The trace file. Defaults to None, keeping spans in memory only.
+        fmt (str | None, optional): ``chrome`` or ``jsonl``. Defaults to the one matching the suffix of ``out``.
+
+    Returns:
+        Tracer: The new tracer.
+    """
+    global _tracer  # noqa: PLW0603 - the tracer is process wide on purpose
+    disable()
+    _tracer = Tracer(Path(out) if out else None, fmt)
+    return _tracer
+
+
+def disable() -> Tracer | None:
+    """Stop tracing and write the spans of the running tracer, which is returned."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.write()
+    return tracer
+
+
+def span(name: str, **attrs: Any):
+    """Return a context manager timing its body as ``name``, or a no-op one while tracing is off.
+
+    Args:
+        name (str): The span name, ``<area>.<operation>`` by convention.
+        **attrs: Attributes recorded with the span. ``bytes`` feeds the throughput of the summary.
+
+    Returns:
+        A context manager yielding the span, whose ``set`` adds attributes once they are known.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, **attrs)
+
+
+atexit.register(disable)
+if os.environ.get(TRACE_ENV):
+    enable(Path(os.environ[TRACE_ENV]))